@@ -0,0 +1,99 @@
+"""
+Benchmark of the colour jitter functions ``tl.prepro.rgb_to_hsv``, ``tl.prepro.hsv_to_rgb``
+and ``tl.prepro.adjust_hue``.
+
+The previous implementations are copied below as ``*_reference`` functions,
+this script checks that the current ones give the same results and compares
+their speed and peak memory allocation on a batch of images.
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+import tensorlayer as tl
+
+batch_size = 32
+n_repeat = 10
+images = np.random.randint(0, 256, (batch_size, 224, 224, 3)).astype(np.uint8)
+
+
+def rgb_to_hsv_reference(rgb):
+    rgb = rgb.astype('float')
+    hsv = np.zeros_like(rgb)
+    hsv[..., 3:] = rgb[..., 3:]
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = np.max(rgb[..., :3], axis=-1)
+    minc = np.min(rgb[..., :3], axis=-1)
+    hsv[..., 2] = maxc
+    mask = maxc != minc
+    hsv[mask, 1] = (maxc - minc)[mask] / maxc[mask]
+    rc = np.zeros_like(r)
+    gc = np.zeros_like(g)
+    bc = np.zeros_like(b)
+    rc[mask] = (maxc - r)[mask] / (maxc - minc)[mask]
+    gc[mask] = (maxc - g)[mask] / (maxc - minc)[mask]
+    bc[mask] = (maxc - b)[mask] / (maxc - minc)[mask]
+    hsv[..., 0] = np.select([r == maxc, g == maxc], [bc - gc, 2.0 + rc - bc], default=4.0 + gc - rc)
+    hsv[..., 0] = (hsv[..., 0] / 6.0) % 1.0
+    return hsv
+
+
+def hsv_to_rgb_reference(hsv):
+    rgb = np.empty_like(hsv)
+    rgb[..., 3:] = hsv[..., 3:]
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    i = (h * 6.0).astype('uint8')
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i % 6
+    conditions = [s == 0.0, i == 1, i == 2, i == 3, i == 4, i == 5]
+    rgb[..., 0] = np.select(conditions, [v, q, p, p, t, v], default=v)
+    rgb[..., 1] = np.select(conditions, [v, v, v, q, p, p], default=t)
+    rgb[..., 2] = np.select(conditions, [v, p, t, v, v, q], default=p)
+    return rgb.astype('uint8')
+
+
+def adjust_hue_reference(im, hout):
+    hsv = rgb_to_hsv_reference(im)
+    hsv[..., 0] += hout
+    hsv[..., 0] = np.clip(hsv[..., 0], 0, np.inf)
+    return hsv_to_rgb_reference(hsv)
+
+
+def benchmark(name, fn):
+    tracemalloc.start()
+    st = time.time()
+    for _ in range(n_repeat):
+        result = fn()
+    took = (time.time() - st) / n_repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-40s %8.2f ms/batch  peak allocation %8.1f MB" % (name, took * 1000, peak / 2.**20))
+    return result
+
+
+hsv = tl.prepro.rgb_to_hsv(images)
+if not np.array_equal(hsv, rgb_to_hsv_reference(images)):
+    raise RuntimeError("rgb_to_hsv gives different results")
+if not np.array_equal(tl.prepro.hsv_to_rgb(hsv), hsv_to_rgb_reference(hsv)):
+    raise RuntimeError("hsv_to_rgb gives different results")
+if not np.array_equal(tl.prepro.adjust_hue(images, 0.1), adjust_hue_reference(images, 0.1)):
+    raise RuntimeError("adjust_hue gives different results")
+
+benchmark("rgb_to_hsv (previous)", lambda: rgb_to_hsv_reference(images))
+benchmark("rgb_to_hsv", lambda: tl.prepro.rgb_to_hsv(images))
+hsv_buffer = np.empty(images.shape, dtype=np.float32)
+benchmark("rgb_to_hsv (float32, out=)", lambda: tl.prepro.rgb_to_hsv(images, out=hsv_buffer))
+
+benchmark("hsv_to_rgb (previous)", lambda: hsv_to_rgb_reference(hsv))
+benchmark("hsv_to_rgb", lambda: tl.prepro.hsv_to_rgb(hsv))
+rgb_buffer = np.empty(images.shape, dtype=np.uint8)
+benchmark("hsv_to_rgb (float32, out=)", lambda: tl.prepro.hsv_to_rgb(hsv_buffer, out=rgb_buffer))
+
+benchmark("adjust_hue (previous)", lambda: adjust_hue_reference(images, 0.1))
+benchmark("adjust_hue", lambda: tl.prepro.adjust_hue(images, 0.1))
+images_float = images.astype(np.float32)
+benchmark("adjust_hue (float32, in-place)", lambda: tl.prepro.adjust_hue(images_float, 0.1, out=images_float))
@@ -208,13 +208,9 @@ class Worker(object):
                     else:
                         v_s_ = sess.run(self.AC.v, {self.AC.s: s_[np.newaxis, :]})[0, 0]
 
-                    buffer_v_target = []
-
-                    for r in buffer_r[::-1]:  # reverse buffer r
-                        v_s_ = r + GAMMA * v_s_
-                        buffer_v_target.append(v_s_)
-
-                    buffer_v_target.reverse()
+                    # discounted returns bootstrapped by the value of the last state
+                    buffer_v_target = tl.rein.discount_episode_rewards(np.append(buffer_r, v_s_), GAMMA, mode=1)
+                    buffer_v_target = buffer_v_target[:-1, np.newaxis]
 
                     buffer_s, buffer_a, buffer_v_target = (
                         np.vstack(buffer_s), np.vstack(buffer_a), np.vstack(buffer_v_target)
@@ -9,7 +9,7 @@ def private_method(func):
 
     def func_wrapper(*args, **kwargs):
         """Decorator wrapper function."""
-        outer_frame = inspect.stack()[1][0]
+        outer_frame = inspect.currentframe().f_back
         if 'self' not in outer_frame.f_locals or outer_frame.f_locals['self'] is not args[0]:
             raise RuntimeError('%s.%s is a private method' % (args[0].__class__.__name__, func.__name__))
 
@@ -23,7 +23,7 @@ def protected_method(func):
 
     def func_wrapper(*args, **kwargs):
         """Decorator wrapper function."""
-        outer_frame = inspect.stack()[1][0]
+        outer_frame = inspect.currentframe().f_back
 
         caller = inspect.getmro(outer_frame.f_locals['self'].__class__)[:-1]
         target = inspect.getmro(args[0].__class__)[:-1]
@@ -44,11 +44,13 @@ __all__ = [
     'load_wmt_en_fr_dataset',
 
     # Util Functions
+    'AsyncSaver',
     'assign_params',
     'del_file',
     'del_folder',
     'download_file_from_google_drive',
     'exists_or_mkdir',
+    'export_inference_graph',
     'file_exists',
     'folder_exists',
     'load_and_assign_npz',
@@ -59,6 +61,8 @@ __all__ = [
     'load_folder_list',
     'load_npy_to_any',
     'load_npz',
+    'load_sharded_params',
+    'load_and_assign_sharded_params',
     'maybe_download_and_extract',
     'natural_keys',
     'npz_to_W_pdf',
@@ -67,6 +71,7 @@ __all__ = [
     'save_ckpt',
     'save_npz',
     'save_npz_dict',
+    'save_sharded_params',
     #'save_graph',
     #'load_graph',
     #'save_graph_and_params',
@@ -10,12 +10,14 @@ import numpy as np
 
 from tensorlayer import logging
 
+from tensorlayer.files.utils import _load_cached_arrays
+from tensorlayer.files.utils import _shape_to_str
 from tensorlayer.files.utils import maybe_download_and_extract
 
 __all__ = ['load_cifar10_dataset']
 
 
-def load_cifar10_dataset(shape=(-1, 32, 32, 3), path='data', plotable=False):
+def load_cifar10_dataset(shape=(-1, 32, 32, 3), path='data', plotable=False, mmap_cache=False):
     """Load CIFAR-10 dataset.
 
     It consists of 60000 32x32 colour images in 10 classes, with
@@ -35,6 +37,10 @@ def load_cifar10_dataset(shape=(-1, 32, 32, 3), path='data', plotable=False):
         The path that the data is downloaded to, defaults is ``data/cifar10/``.
     plotable : boolean
         Whether to plot some image examples, False as default.
+    mmap_cache : boolean
+        If True, the arrays are saved as ``.npy`` files next to the download on the first call,
+        and the later calls return read-only ``numpy.memmap`` of these files instead of decoding the dataset again.
+        The memory is then shared by all the processes that load the dataset. Default is False.
 
     Examples
     --------
@@ -47,6 +53,12 @@ def load_cifar10_dataset(shape=(-1, 32, 32, 3), path='data', plotable=False):
     - `<https://teratail.com/questions/28932>`__
 
     """
+    if mmap_cache:
+        return _load_cached_arrays(
+            os.path.join(path, 'cifar10'), 'cifar10.%s' % _shape_to_str(shape),
+            ['X_train', 'y_train', 'X_test', 'y_test'], lambda: load_cifar10_dataset(shape, path, plotable)
+        )
+
     path = os.path.join(path, 'cifar10')
     logging.info("Load or Download cifar10 > {}".format(path))
 
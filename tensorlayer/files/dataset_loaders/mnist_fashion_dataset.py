@@ -6,7 +6,7 @@ from tensorlayer.files.utils import _load_mnist_dataset
 __all__ = ['load_fashion_mnist_dataset']
 
 
-def load_fashion_mnist_dataset(shape=(-1, 784), path='data'):
+def load_fashion_mnist_dataset(shape=(-1, 784), path='data', mmap_cache=False):
     """Load the fashion mnist.
 
     Automatically download fashion-MNIST dataset and return the training, validation and test set with 50000, 10000 and 10000 fashion images respectively, `examples <http://marubon-ds.blogspot.co.uk/2017/09/fashion-mnist-exploring.html>`__.
@@ -17,6 +17,10 @@ def load_fashion_mnist_dataset(shape=(-1, 784), path='data'):
         The shape of digit images (the default is (-1, 784), alternatively (-1, 28, 28, 1)).
     path : str
         The path that the data is downloaded to.
+    mmap_cache : boolean
+        If True, the arrays are saved as ``.npy`` files next to the download on the first call,
+        and the later calls return read-only ``numpy.memmap`` of these files instead of decoding the dataset again.
+        The memory is then shared by all the processes that load the dataset. Default is False.
 
     Returns
     -------
@@ -29,5 +33,6 @@ def load_fashion_mnist_dataset(shape=(-1, 784), path='data'):
     >>> X_train, y_train, X_val, y_val, X_test, y_test = tl.files.load_fashion_mnist_dataset(shape=(-1, 28, 28, 1))
     """
     return _load_mnist_dataset(
-        shape, path, name='fashion_mnist', url='http://fashion-mnist.s3-website.eu-central-1.amazonaws.com/'
+        shape, path, name='fashion_mnist', url='http://fashion-mnist.s3-website.eu-central-1.amazonaws.com/',
+        mmap_cache=mmap_cache
     )
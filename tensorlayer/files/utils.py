@@ -5,6 +5,7 @@ import os
 # import ast
 import sys
 import gzip
+import json
 import math
 import pickle
 import progressbar
@@ -12,12 +13,15 @@ import re
 import requests
 import shutil
 import tarfile
+import threading
 import time
+import weakref
 import zipfile
 import importlib
 from tqdm import tqdm
 
 from six.moves import cPickle
+from six.moves import queue
 # from six.moves import zip
 
 from lxml import etree
@@ -49,11 +53,13 @@ from tensorlayer import utils
 from tensorlayer import visualize
 
 __all__ = [
+    'AsyncSaver',
     'assign_params',
     'del_file',
     'del_folder',
     'download_file_from_google_drive',
     'exists_or_mkdir',
+    'export_inference_graph',
     'file_exists',
     'folder_exists',
     'load_and_assign_npz',
@@ -64,6 +70,8 @@ __all__ = [
     'load_folder_list',
     'load_npy_to_any',
     'load_npz',
+    'load_sharded_params',
+    'load_and_assign_sharded_params',
     'maybe_download_and_extract',
     'natural_keys',
     'npz_to_W_pdf',
@@ -72,6 +80,7 @@ __all__ = [
     'save_ckpt',
     'save_npz',
     'save_npz_dict',
+    'save_sharded_params',
     #'save_graph',
     #'load_graph',
     #'save_graph_and_params',
@@ -79,6 +88,42 @@ __all__ = [
 ]
 
 
+def _load_cached_arrays(path, prefix, names, load_fn):
+    """Return the arrays saved in ``path`` as ``.npy`` files as read-only memory maps.
+
+    The arrays are decoded by ``load_fn`` and saved on the first call only, the later calls,
+    including the ones of other processes, map the same files and share their pages in memory.
+
+    Parameters
+    ----------
+    path : str
+        The folder of the ``.npy`` files, usually the folder of the downloaded dataset.
+    prefix : str
+        The prefix of the file names, e.g. the dataset name and the arguments that change the arrays.
+    names : list of str
+        The names of the arrays returned by ``load_fn``.
+    load_fn : function
+        A function that returns the decoded arrays in the order of ``names``.
+
+    """
+    filepaths = [os.path.join(path, '%s.%s.npy' % (prefix, name)) for name in names]
+    if not all(file_exists(filepath) for filepath in filepaths):
+        arrays = load_fn()
+        exists_or_mkdir(path, verbose=False)
+        for filepath, array in zip(filepaths, arrays):
+            # write to a temporary file first, so that other processes never map a partial file
+            tmp_filepath = '%s.%d.tmp' % (filepath, os.getpid())
+            with open(tmp_filepath, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.rename(tmp_filepath, filepath)
+        logging.info("Saved the decoded arrays to %s" % ', '.join(filepaths))
+    return tuple(np.load(filepath, mmap_mode='r') for filepath in filepaths)
+
+
+def _shape_to_str(shape):
+    return 'x'.join(str(d) for d in shape)
+
+
 # Load dataset functions
 def load_mnist_dataset(shape=(-1, 784), path='data'):
     """Load the original mnist.
@@ -132,7 +177,7 @@ def load_fashion_mnist_dataset(shape=(-1, 784), path='data'):
     )
 
 
-def _load_mnist_dataset(shape, path, name='mnist', url='http://yann.lecun.com/exdb/mnist/'):
+def _load_mnist_dataset(shape, path, name='mnist', url='http://yann.lecun.com/exdb/mnist/', mmap_cache=False):
     """A generic function to load mnist-like dataset.
 
     Parameters:
@@ -145,8 +190,16 @@ def _load_mnist_dataset(shape, path, name='mnist', url='http://yann.lecun.com/ex
         The dataset name you want to use(the default is 'mnist').
     url : str
         The url of dataset(the default is 'http://yann.lecun.com/exdb/mnist/').
+    mmap_cache : boolean
+        If True, return read-only memory maps of ``.npy`` files saved next to the download, see ``load_mnist_dataset``.
     """
     path = os.path.join(path, name)
+    if mmap_cache:
+        prefix = '%s.%s' % (name, _shape_to_str(shape))
+        names = ['X_train', 'y_train', 'X_val', 'y_val', 'X_test', 'y_test']
+        return _load_cached_arrays(
+            path, prefix, names, lambda: _load_mnist_dataset(shape, os.path.dirname(path), name, url)
+        )
 
     # Define functions for loading mnist-like data's images and labels.
     # For convenience, they also download the requested files if needed.
@@ -313,7 +366,7 @@ def load_cifar10_dataset(shape=(-1, 32, 32, 3), path='data', plotable=False):
     return X_train, y_train, X_test, y_test
 
 
-def load_cropped_svhn(path='data', include_extra=True):
+def load_cropped_svhn(path='data', include_extra=True, mmap_cache=False):
     """Load Cropped SVHN.
 
     The Cropped Street View House Numbers (SVHN) Dataset contains 32x32x3 RGB images.
@@ -325,6 +378,10 @@ def load_cropped_svhn(path='data', include_extra=True):
         The path that the data is downloaded to.
     include_extra : boolean
         If True (default), add extra images to the training set.
+    mmap_cache : boolean
+        If True, the arrays are saved as ``.npy`` files next to the download on the first call,
+        and the later calls return read-only ``numpy.memmap`` of these files instead of decoding the dataset again.
+        The memory is then shared by all the processes that load the dataset. Default is False.
 
     Returns
     -------
@@ -337,6 +394,12 @@ def load_cropped_svhn(path='data', include_extra=True):
     >>> tl.vis.save_images(X_train[0:100], [10, 10], 'svhn.png')
 
     """
+    if mmap_cache:
+        return _load_cached_arrays(
+            os.path.join(path, 'cropped_svhn'), 'cropped_svhn.extra' if include_extra else 'cropped_svhn',
+            ['X_train', 'y_train', 'X_test', 'y_test'], lambda: load_cropped_svhn(path, include_extra)
+        )
+
     start_time = time.time()
 
     path = os.path.join(path, 'cropped_svhn')
@@ -1649,13 +1712,46 @@ def load_npz(path='', name='model.npz'):
     return d['params']
 
 
+# cached (placeholder, assign op) of every variable, per graph
+_assign_ops_cache = weakref.WeakKeyDictionary()
+_assign_ops_cache_lock = threading.Lock()
+
+
+def _get_assign_op(var):
+    """Return the (placeholder, assign op) of a variable, creating them once per graph."""
+    graph = var.graph
+    with _assign_ops_cache_lock:
+        graph_cache = _assign_ops_cache.setdefault(graph, {})
+        if var.name not in graph_cache:
+            with graph.as_default(), graph.name_scope(None), graph.control_dependencies(None):
+                with tf.name_scope('assign_params'):
+                    placeholder = tf.placeholder(var.dtype.base_dtype, shape=var.get_shape())
+                    graph_cache[var.name] = (placeholder, var.assign(placeholder))
+        return graph_cache[var.name]
+
+
+def _assign_values(sess, var_list, values):
+    """Assign the values to the variables with the cached assign ops, in a single ``sess.run``."""
+    ops = []
+    feed_dict = {}
+    for var, value in zip(var_list, values):
+        placeholder, op = _get_assign_op(var)
+        ops.append(op)
+        feed_dict[placeholder] = value
+    sess.run(ops, feed_dict=feed_dict)
+    return ops
+
+
 def assign_params(sess, params, network):
     """Assign the given parameters to the TensorLayer network.
 
+    The placeholder and assign op of every parameter are created once per graph and reused,
+    so that loading parameters repeatedly does not grow the graph.
+
     Parameters
     ----------
     sess : Session
-        TensorFlow Session.
+        TensorFlow Session. If None, the ops are not run.
     params : list of array
         A list of parameters (array) in order.
     network : :class:`Layer`
@@ -1664,7 +1760,10 @@ def assign_params(sess, params, network):
     Returns
     --------
     list of operations
-        A list of tf ops in order that assign params. Support sess.run(ops) manually.
+        A list of tf ops in order that assign params.
+        If ``sess`` is None, they assign the given parameters as constants and can be run manually by ``sess.run(ops)``,
+        otherwise they are the cached assign ops which are already run. The cached ops read the values from
+        placeholders, running them again without feeding the placeholders fails.
 
     Examples
     --------
@@ -1675,12 +1774,9 @@ def assign_params(sess, params, network):
     - `Assign value to a TensorFlow variable <http://stackoverflow.com/questions/34220532/how-to-assign-value-to-a-tensorflow-variable>`__
 
     """
-    ops = []
-    for idx, param in enumerate(params):
-        ops.append(network.all_params[idx].assign(param))
-    if sess is not None:
-        sess.run(ops)
-    return ops
+    if sess is None:
+        return [network.all_params[idx].assign(param) for idx, param in enumerate(params)]
+    return _assign_values(sess, [network.all_params[idx] for idx in range(len(params))], params)
 
 
 def load_and_assign_npz(sess=None, name=None, network=None):
@@ -1771,7 +1867,8 @@ def load_and_assign_npz_dict(name='model.npz', sess=None):
     params = np.load(name)
     if len(params.keys()) != len(set(params.keys())):
         raise Exception("Duplication in model npz_dict %s" % name)
-    ops = list()
+    var_list = []
+    values = []
     for key in params.keys():
         try:
             # tensor = tf.get_default_graph().get_tensor_by_name(key)
@@ -1782,15 +1879,392 @@ def load_and_assign_npz_dict(name='model.npz', sess=None):
             elif len(varlist) == 0:
                 raise KeyError
             else:
-                ops.append(varlist[0].assign(params[key]))
+                var_list.append(varlist[0])
+                values.append(params[key])
                 logging.info("[*] params restored: %s" % key)
         except KeyError:
             logging.info("[!] Warning: Tensor named %s not found in network." % key)
 
-    sess.run(ops)
+    _assign_values(sess, var_list, values)
     logging.info("[*] Model restored from npz_dict %s" % name)
 
 
+_SHARDED_PARAMS_INDEX = 'index.json'
+_SHARDED_PARAMS_ALIGNMENT = 64
+
+
+def save_sharded_params(save_list=None, name='model', sess=None, max_shard_bytes=2**30):
+    """Save parameters into a folder of raw binary shards and a JSON index.
+
+    Use ``tl.files.load_sharded_params`` to restore. Every tensor is written as its raw buffer, without pickling, at an
+    aligned offset of a shard file, so that it can be memory-mapped when loading. The index ``index.json`` records the
+    name, dtype, shape, shard and offset of every tensor in order. The folder is written as ``name + '.tmp'`` and
+    renamed to ``name`` once complete, so that a crash never leaves a partially written folder, and the memory maps
+    of a previous save of the same folder stay valid.
+
+    Parameters
+    ----------
+    save_list : list of tensor
+        A list of parameters (tensor) to be saved.
+    name : str
+        The folder to save the shards and index into.
+    sess : Session
+        TensorFlow Session.
+    max_shard_bytes : int
+        The maximum size of a shard file, a tensor larger than this is written into a shard of its own.
+
+    Examples
+    --------
+    Save model
+
+    >>> tl.files.save_sharded_params(network.all_params, name='model', sess=sess)
+
+    Load all parameters as memory maps, in order
+
+    >>> params = tl.files.load_sharded_params(name='model')
+    >>> tl.files.assign_params(sess, params, network)
+
+    Load and assign a subset of the parameters by name
+
+    >>> tl.files.load_and_assign_sharded_params(sess, name='model', names=['conv1/W:0', 'conv1/b:0'])
+
+    """
+    if sess is None:
+        raise ValueError("session is None.")
+    if save_list is None:
+        save_list = []
+
+    values = sess.run(save_list)
+    _write_sharded_params(name, [tensor.name for tensor in save_list], values, max_shard_bytes)
+
+
+def _write_shards(folder, names, values, max_shard_bytes):
+    """Write the arrays into the shards and index of the folder."""
+    shards = []
+    tensors = []
+    f = None
+    shard_bytes = 0
+    try:
+        for tensor_name, value in zip(names, values):
+            value = np.asarray(value, order='C')
+            if f is None or (shard_bytes > 0 and shard_bytes + value.nbytes > max_shard_bytes):
+                if f is not None:
+                    f.close()
+                shards.append('params-%05d.bin' % len(shards))
+                f = open(os.path.join(folder, shards[-1]), 'wb')
+                shard_bytes = 0
+            padding = -shard_bytes % _SHARDED_PARAMS_ALIGNMENT
+            f.write(b'\0' * padding)
+            shard_bytes += padding
+            tensors.append(
+                {
+                    'name': tensor_name,
+                    'dtype': value.dtype.str,
+                    'shape': list(value.shape),
+                    'shard': len(shards) - 1,
+                    'offset': shard_bytes,
+                }
+            )
+            value.tofile(f)
+            shard_bytes += value.nbytes
+    finally:
+        if f is not None:
+            f.close()
+
+    with open(os.path.join(folder, _SHARDED_PARAMS_INDEX), 'w') as f:
+        json.dump({'shards': shards, 'tensors': tensors}, f, indent=1)
+    return shards, tensors
+
+
+def _write_sharded_params(name, names, values, max_shard_bytes=2**30):
+    """Write the arrays into the shards and index of a temporary folder, then rename it to ``name``."""
+    # the temporary folders are siblings of the folder, also for a name like 'model/'
+    name = os.path.normpath(name)
+    tmp_name = name + '.tmp'
+    if os.path.isdir(tmp_name):
+        shutil.rmtree(tmp_name)
+    exists_or_mkdir(tmp_name, verbose=False)
+    try:
+        shards, tensors = _write_shards(tmp_name, names, values, max_shard_bytes)
+    except Exception:
+        shutil.rmtree(tmp_name, ignore_errors=True)
+        raise
+
+    # the shards of the previous save are unlinked, not overwritten, so their memory maps stay valid
+    old_name = name + '.old'
+    if os.path.isdir(old_name):
+        shutil.rmtree(old_name)
+    if os.path.isdir(name):
+        os.rename(name, old_name)
+    os.rename(tmp_name, name)
+    if os.path.isdir(old_name):
+        shutil.rmtree(old_name)
+    logging.info("[*] Saved %d params into %d shards in %s" % (len(tensors), len(shards), name))
+
+
+def _load_sharded_index(name):
+    with open(os.path.join(name, _SHARDED_PARAMS_INDEX)) as f:
+        return json.load(f)
+
+
+def load_sharded_params(name='model', names=None, mmap=True):
+    """Load the parameters saved by ``tl.files.save_sharded_params``.
+
+    Parameters
+    ----------
+    name : str
+        The folder of the shards and index.
+    names : list of str or None
+        The names of the parameters to load, e.g. ``['conv1/W:0']``. If None, load all the parameters.
+    mmap : boolean
+        If True (default), return read-only memory maps of the shards, the data is only read when it is used.
+        If False, read the parameters into memory.
+
+    Returns
+    --------
+    list of array
+        The parameters in the saved order, or in the order of ``names``.
+
+    Examples
+    --------
+    - See ``tl.files.save_sharded_params``
+
+    """
+    index = _load_sharded_index(name)
+    tensors = index['tensors']
+    if names is not None:
+        tensors_by_name = {t['name']: t for t in tensors}
+        for n in names:
+            if n not in tensors_by_name:
+                raise KeyError("Tensor named %s not found in %s" % (n, name))
+        tensors = [tensors_by_name[n] for n in names]
+
+    shard_buffers = {}
+    params = []
+    for t in tensors:
+        dtype = np.dtype(t['dtype'])
+        size = int(np.prod(t['shape'])) * dtype.itemsize
+        if size == 0:
+            params.append(np.zeros(t['shape'], dtype=dtype))
+            continue
+        shard_file = os.path.join(name, index['shards'][t['shard']])
+        if mmap:
+            if t['shard'] not in shard_buffers:
+                shard_buffers[t['shard']] = np.memmap(shard_file, dtype=np.uint8, mode='r')
+            value = shard_buffers[t['shard']][t['offset']:t['offset'] + size].view(dtype).reshape(t['shape'])
+        else:
+            with open(shard_file, 'rb') as f:
+                f.seek(t['offset'])
+                value = np.fromfile(f, dtype=dtype, count=size // dtype.itemsize).reshape(t['shape'])
+        params.append(value)
+    return params
+
+
+def load_and_assign_sharded_params(sess=None, name='model', network=None, names=None):
+    """Restore the parameters saved by ``tl.files.save_sharded_params()`` by their names.
+
+    Parameters
+    ----------
+    sess : Session
+        TensorFlow Session.
+    name : str
+        The folder of the shards and index.
+    network : :class:`Layer` or None
+        The network to be assigned. If None, the parameters are matched with all the global variables.
+    names : list of str or None
+        The names of the parameters to restore. If None, restore all the parameters found in the graph.
+
+    Returns
+    --------
+    list of str
+        The names of the restored parameters.
+
+    Examples
+    --------
+    - See ``tl.files.save_sharded_params``
+
+    """
+    if sess is None:
+        raise ValueError("session is None.")
+
+    var_list = network.all_params if network is not None else tf.global_variables()
+    var_by_name = {v.name: v for v in var_list}
+    saved_names = [t['name'] for t in _load_sharded_index(name)['tensors']]
+    if names is None:
+        names = saved_names
+    for n in names:
+        if n not in var_by_name:
+            logging.info("[!] Warning: Tensor named %s not found in network." % n)
+    names = [n for n in names if n in var_by_name]
+
+    params = load_sharded_params(name, names=names)
+    _assign_values(sess, [var_by_name[n] for n in names], params)
+    logging.info("[*] Model restored %d params from %s" % (len(names), name))
+    return names
+
+
+class AsyncSaver(object):
+    """Save checkpoints in a background thread.
+
+    The training loop is only blocked while the parameters are fetched. Each ``save`` fetches the values of the
+    parameters with a single ``sess.run``, then a background thread serializes and writes them into a temporary file,
+    which is renamed to the checkpoint name once complete, so that a checkpoint on disk is never partially written.
+    Only the last ``max_to_keep`` checkpoints are kept.
+
+    Parameters
+    ----------
+    save_dir : str
+        The folder to save the checkpoints into.
+    name : str
+        The prefix of the checkpoint names, the step is appended, e.g. ``model-1000.npz``.
+    max_to_keep : int or None
+        The number of recent checkpoints to keep, older ones are deleted. If None, keep all the checkpoints.
+    file_format : str
+        The format of the checkpoints:
+            - `npz`, a list of parameters, restored by ``tl.files.load_and_assign_npz``;
+            - `npz_dict`, a dictionary of parameters by name, restored by ``tl.files.load_and_assign_npz_dict``;
+            - `sharded`, a folder of binary shards, restored by ``tl.files.load_and_assign_sharded_params``.
+    compress : boolean
+        If True, compress the `npz` and `npz_dict` checkpoints by ``np.savez_compressed``.
+
+    Examples
+    --------
+    >>> saver = tl.files.AsyncSaver(save_dir='checkpoint', name='model', max_to_keep=3)
+    >>> for step in range(n_step):
+    >>>     sess.run(train_op)
+    >>>     if step % 1000 == 0:
+    >>>         saver.save(sess, network.all_params, step=step)
+    >>> saver.close()
+    >>> tl.files.load_and_assign_npz_dict(name=saver.last_checkpoint, sess=sess)
+
+    """
+
+    def __init__(self, save_dir='checkpoint', name='model', max_to_keep=5, file_format='npz_dict', compress=False):
+        if file_format not in ['npz', 'npz_dict', 'sharded']:
+            raise ValueError("Unknown file_format %s, should be one of npz, npz_dict or sharded" % file_format)
+        self.save_dir = save_dir
+        self.name = name
+        self.max_to_keep = max_to_keep
+        self.file_format = file_format
+        self.compress = compress
+        self.checkpoints = []
+        self._error = None
+        # at most one snapshot waits while another is being written
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+
+    @property
+    def last_checkpoint(self):
+        """The path of the last checkpoint written, or None."""
+        return self.checkpoints[-1] if self.checkpoints else None
+
+    def save(self, sess, save_list, step=None):
+        """Fetch the parameters and schedule the writing of a checkpoint.
+
+        Parameters
+        ----------
+        sess : Session
+            TensorFlow Session.
+        save_list : list of tensor
+            A list of parameters (tensor) to be saved.
+        step : int or None
+            The global step, appended to the checkpoint name.
+
+        Returns
+        --------
+        str
+            The path of the checkpoint to be written.
+
+        """
+        self._raise_error()
+        if sess is None:
+            raise ValueError("session is None.")
+
+        names = [tensor.name for tensor in save_list]
+        values = sess.run(save_list)
+
+        path = os.path.join(self.save_dir, self.name if step is None else '%s-%d' % (self.name, step))
+        if self.file_format != 'sharded':
+            path += '.npz'
+        if self._thread is None:
+            exists_or_mkdir(self.save_dir, verbose=False)
+            self._thread = threading.Thread(target=self._write_loop)
+            self._thread.daemon = True
+            self._thread.start()
+        self._queue.put((path, names, values))
+        return path
+
+    def wait(self):
+        """Block until all the scheduled checkpoints are written, and raise the error of a failed write if any."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Wait for the scheduled checkpoints to be written and stop the background thread.
+
+        The background thread is a daemon, the checkpoints still scheduled when the interpreter exits are lost unless
+        ``close`` or ``wait`` is called. Raise the error of a failed write if any. A later ``save`` starts a new thread.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            path, names, values = item
+            try:
+                self._write(path, names, values)
+            except Exception as e:
+                logging.error("[!] Failed to save checkpoint %s: %s" % (path, e))
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, names, values):
+        if self.file_format == 'sharded':
+            _write_sharded_params(path, names, values)
+        else:
+            tmp_path = path + '.tmp'
+            savez = np.savez_compressed if self.compress else np.savez
+            try:
+                with open(tmp_path, 'wb') as f:
+                    if self.file_format == 'npz':
+                        params = np.empty(len(values), dtype=object)
+                        for idx, value in enumerate(values):
+                            params[idx] = value
+                        savez(f, params=params)
+                    else:
+                        savez(f, **dict(zip(names, values)))
+                os.rename(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        logging.info("[*] Checkpoint saved in %s" % path)
+
+        if path in self.checkpoints:
+            self.checkpoints.remove(path)
+        self.checkpoints.append(path)
+        if self.max_to_keep is not None:
+            while len(self.checkpoints) > self.max_to_keep:
+                old_path = self.checkpoints.pop(0)
+                if os.path.isdir(old_path):
+                    shutil.rmtree(old_path)
+                elif os.path.exists(old_path):
+                    os.remove(old_path)
+
+
 def save_ckpt(
         sess=None, mode_name='model.ckpt', save_dir='checkpoint', var_list=None, global_step=None, printable=False
 ):
@@ -1899,6 +2373,130 @@ def load_ckpt(sess=None, mode_name='model.ckpt', save_dir='checkpoint', var_list
         logging.info("[*] load ckpt fail ...")
 
 
+def _time_graph(sess, fetches, feed_dict, n_runs):
+    """Return the mean time of ``n_runs`` runs of ``fetches`` after a warmup run."""
+    sess.run(fetches, feed_dict=feed_dict)
+    start_time = time.time()
+    for _ in range(n_runs):
+        sess.run(fetches, feed_dict=feed_dict)
+    return (time.time() - start_time) / n_runs
+
+
+def export_inference_graph(
+        network, inputs, outputs, sess=None, name='model.pb', fold_batch_norms=True, feed_dict=None, n_runs=10
+):
+    """Export the inference graph of a network into a single frozen and optimized GraphDef file.
+
+    The keeping probabilities of ``network.all_drop`` are folded to 1 and the dropout ops are removed,
+    the variables are converted to constants, the batch normalizations are folded into the preceding
+    ``Conv2d`` / ``Dense`` layers as in :func:`tl.layers.fold_batch_norms` and all the nodes not used to
+    compute the outputs, such as the update ops of the moving averages or the training-only branches,
+    are stripped.
+
+    Parameters
+    ----------
+    network : TensorLayer layer
+        The network to export, its dropout layers are disabled in the exported graph.
+    inputs : Tensor or list of Tensor
+        The input placeholders.
+    outputs : Tensor or list of Tensor
+        The output tensors, usually ``network.outputs``.
+    sess : Session
+        TensorFlow Session with the trained parameters.
+    name : str
+        The name of the ``.pb`` file.
+    fold_batch_norms : boolean
+        If True, fold the scales and shifts of the batch normalizations into the weights and biases of the
+        convolutions or matmuls of the layers they directly follow. Only the ``BatchNorm`` layers built with
+        ``is_train=False`` are folded.
+    feed_dict : dictionary or None
+        The input values used to measure the latency, random values for a batch of 1 if None.
+    n_runs : int
+        The number of runs to measure the latency, 0 to skip the measure.
+
+    Returns
+    -------
+    dictionary
+        The report with the number of nodes ``n_nodes``, the size ``size_bytes`` and the latency in seconds ``latency``
+        of the exported graph, the same values of the original graph prefixed by ``original_``,
+        and the number of folded batch normalizations ``n_folded_batch_norms``.
+
+    Examples
+    --------
+    A network of a convolution followed by the ops of a batch normalization in inference mode, see
+    :func:`tl.layers.fold_batch_norms`
+
+    >>> net = tl.layers.Layer(prev_layer=None, name='net')
+    >>> net.outputs = bn
+    >>> net.all_layers = [conv, bn]
+    >>> ...
+    >>> report = tl.files.export_inference_graph(net, x, net.outputs, sess=sess, name='model.pb')
+
+    Load the exported graph
+
+    >>> graph_def = tf.GraphDef()
+    >>> with tf.gfile.GFile('model.pb', 'rb') as f:
+    ...     graph_def.ParseFromString(f.read())
+    >>> y, = tf.import_graph_def(graph_def, return_elements=[net.outputs.name], name='')
+
+    """
+    # imported here, tl.files is imported before tl.layers
+    from tensorlayer.layers.folding import _inference_graph_def
+
+    if sess is None:
+        raise ValueError("session is None.")
+    inputs = inputs if isinstance(inputs, (list, tuple)) else [inputs]
+    outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+    output_names = [t.op.name for t in outputs]
+
+    original_graph_def = sess.graph.as_graph_def()
+    original_n_nodes = len(tf.graph_util.extract_sub_graph(original_graph_def, output_names).node)
+    original_size = original_graph_def.ByteSize() + sum(
+        p.get_shape().num_elements() * p.dtype.base_dtype.size for p in network.all_params
+    )
+
+    graph_def, folded = _inference_graph_def(sess, network, inputs, outputs, fold_batch_norms)
+    n_folded = len(folded)
+
+    with gfile.GFile(name, 'wb') as f:
+        f.write(graph_def.SerializeToString())
+
+    report = {
+        'n_nodes': len(graph_def.node),
+        'size_bytes': graph_def.ByteSize(),
+        'latency': None,
+        'original_n_nodes': original_n_nodes,
+        'original_size_bytes': original_size,
+        'original_latency': None,
+        'n_folded_batch_norms': n_folded,
+    }
+
+    if n_runs > 0:
+        if feed_dict is None:
+            feed_dict = {}
+            for t in inputs:
+                shape = [1 if d is None else d for d in t.get_shape().as_list()]
+                feed_dict[t] = np.random.random(shape).astype(t.dtype.as_numpy_dtype)
+        feed_dict = dict((t, value) for t, value in feed_dict.items() if t not in network.all_drop)
+        original_feed_dict = dict(feed_dict)
+        original_feed_dict.update(utils.dict_to_one(network.all_drop))
+        report['original_latency'] = _time_graph(sess, outputs, original_feed_dict, n_runs)
+        with tf.Graph().as_default() as graph:
+            tf.import_graph_def(graph_def, name='')
+            with tf.Session(graph=graph) as export_sess:
+                report['latency'] = _time_graph(
+                    export_sess, [t.name for t in outputs], dict((t.name, v) for t, v in feed_dict.items()), n_runs
+                )
+
+    logging.info(
+        "[*] Exported inference graph into %s: %d => %d nodes, %d => %d bytes, %d batch norms folded" %
+        (name, original_n_nodes, report['n_nodes'], original_size, report['size_bytes'], n_folded)
+    )
+    if n_runs > 0:
+        logging.info("[*] Latency: %.3f => %.3f ms" % (report['original_latency'] * 1000, report['latency'] * 1000))
+    return report
+
+
 '''
 def save_graph(network=None, name='graph.pkl'):
     """Save the architecture of TL model into a pickle file. No parameters be saved.
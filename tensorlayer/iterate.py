@@ -1,14 +1,22 @@
 #! /usr/bin/python
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+import threading
+import traceback
+
 import numpy as np
+from six.moves import queue
 from six.moves import xrange
 
 __all__ = [
     'minibatches',
+    'DataLoader',
+    'bucket_minibatches',
     'seq_minibatches',
     'seq_minibatches2',
     'ptb_iterator',
+    'PTBIterator',
 ]
 
 
@@ -72,6 +80,347 @@ def minibatches(inputs=None, targets=None, batch_size=None, allow_dynamic_batch_
             yield inputs[excerpt], targets[excerpt]
 
 
+def _get_example(inputs, targets, transform, idx):
+    """Return the fields of an example as a tuple, e.g. (input, target)."""
+    example = inputs[idx] if targets is None else (inputs[idx], targets[idx])
+    if transform is not None:
+        example = transform(example)
+    return example if isinstance(example, tuple) else (example, )
+
+
+def _fill_batch(inputs, targets, transform, buffers, indices):
+    n = len(indices)
+    if transform is None and isinstance(inputs, np.ndarray) and (targets is None or isinstance(targets, np.ndarray)):
+        # gather straight into the buffers, without the copy of fancy indexing
+        np.take(inputs, indices, axis=0, out=buffers[0][:n])
+        if targets is not None:
+            np.take(targets, indices, axis=0, out=buffers[1][:n])
+    else:
+        for j, idx in enumerate(indices):
+            for buf, field in zip(buffers, _get_example(inputs, targets, transform, idx)):
+                buf[j] = field
+
+
+def _wrap_raw_buffer(raw, dtype, shape):
+    return np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def _data_loader_worker(inputs, targets, transform, slot_buffers, task_queue, result_queue, is_process):
+    if is_process:
+        # the raw shared arrays are wrapped again in the worker process
+        np.random.seed()
+        slot_buffers = [[_wrap_raw_buffer(*raw) for raw in buffers] for buffers in slot_buffers]
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, slot, indices = task
+        try:
+            _fill_batch(inputs, targets, transform, slot_buffers[slot], indices)
+            result_queue.put((task_id, None))
+        except Exception:
+            result_queue.put((task_id, traceback.format_exc()))
+
+
+class DataLoader(object):
+    """Load minibatches in background workers, while the training step runs in the main thread.
+
+    The examples of a batch are gathered, and optionally transformed, into buffers that are allocated once
+    and reused, and up to ``prefetch`` batches are prepared in advance. It has the same shuffling and
+    ``allow_dynamic_batch_size`` semantics as ``tl.iterate.minibatches``.
+
+    Parameters
+    ----------
+    inputs : numpy.array or dataset
+        The input features, every row is a example, or any object that supports ``len`` and indexing,
+        e.g. a ``numpy.memmap`` or a dataset class that reads the examples from files.
+    targets : numpy.array or None
+        The labels of inputs, every row is a example. If None, ``inputs[i]`` is a example and
+        it can be a tuple of fields, e.g. (image, label).
+    batch_size : int
+        The batch size.
+    allow_dynamic_batch_size: boolean
+        Allow the use of the last data batch in case the number of examples is not a multiple of batch_size.
+    shuffle : boolean
+        Indicating whether to shuffle the dataset at every epoch.
+    transform : function or None
+        A function applied on every example, i.e. ``inputs[i]`` or ``(inputs[i], targets[i])``,
+        that returns the processed example with the same structure, e.g. the data augmentation.
+        All the examples must have the same shape after transformation.
+    num_workers : int
+        The number of workers.
+    prefetch : int or None
+        The maximum number of batches prepared in advance. If None, 2 per worker.
+    backend : str
+        - `thread`, the workers are threads, fits NumPy, OpenCV and other functions that release the GIL.
+        - `process`, the workers are processes writing into shared memory,
+          ``inputs``, ``targets`` and ``transform`` must be picklable on platforms that do not fork.
+
+    Examples
+    --------
+    >>> loader = tl.iterate.DataLoader(X_train, y_train, batch_size=128, shuffle=True, num_workers=4)
+    >>> for epoch in range(n_epoch):
+    >>>     for X_batch, y_batch in loader:
+    >>>         sess.run(train_op, feed_dict={x: X_batch, y_: y_batch})
+
+    With a data augmentation function running in 4 processes.
+
+    >>> def distort(example):
+    >>>     x, y = example
+    >>>     return tl.prepro.crop(x, 24, 24, is_random=True), y
+    >>> loader = tl.iterate.DataLoader(
+    >>>     X_train, y_train, 128, shuffle=True, transform=distort, num_workers=4, backend='process'
+    >>> )
+
+    Notes
+    -----
+    The yielded arrays are views of the reused buffers and are overwritten once the iteration goes on,
+    copy them if they need to be kept after the next batch is requested.
+    Call ``close`` to stop the workers when the loader is not used anymore.
+
+    """
+
+    def __init__(
+            self, inputs, targets=None, batch_size=32, allow_dynamic_batch_size=False, shuffle=False, transform=None,
+            num_workers=1, prefetch=None, backend='thread'
+    ):
+        if targets is not None and len(inputs) != len(targets):
+            raise AssertionError("The length of inputs and targets should be equal")
+        if backend not in ('thread', 'process'):
+            raise ValueError("backend should be 'thread' or 'process', but got %s" % backend)
+        if len(inputs) == 0:
+            raise ValueError("inputs is empty")
+
+        self.inputs = inputs
+        self.targets = targets
+        self.batch_size = batch_size
+        self.allow_dynamic_batch_size = allow_dynamic_batch_size
+        self.shuffle = shuffle
+        self.transform = transform
+        self.num_workers = num_workers
+        self.prefetch = prefetch or 2 * num_workers
+        self.backend = backend
+
+        # the buffers are allocated from the (transformed) shapes and dtypes of the first example
+        fields = [np.asarray(field) for field in _get_example(inputs, targets, transform, 0)]
+        self._is_tuple = targets is not None or len(fields) > 1
+        self._slot_buffers = []
+        self._raw_buffers = []
+        for _ in range(self.prefetch + 1):
+            buffers, raw_buffers = [], []
+            for field in fields:
+                shape = (batch_size, ) + field.shape
+                if backend == 'process':
+                    nbytes = max(1, int(np.prod(shape)) * field.dtype.itemsize)
+                    raw = (multiprocessing.RawArray('b', nbytes), field.dtype, shape)
+                    buffers.append(_wrap_raw_buffer(*raw))
+                    raw_buffers.append(raw)
+                else:
+                    buffers.append(np.empty(shape, dtype=field.dtype))
+            self._slot_buffers.append(buffers)
+            self._raw_buffers.append(raw_buffers)
+        self._workers = None
+
+    def __len__(self):
+        if self.allow_dynamic_batch_size:
+            return (len(self.inputs) + self.batch_size - 1) // self.batch_size
+        return len(self.inputs) // self.batch_size
+
+    def _start_workers(self):
+        if self.backend == 'process':
+            self._task_queue = multiprocessing.Queue()
+            self._result_queue = multiprocessing.Queue()
+            worker_class, slot_buffers = multiprocessing.Process, self._raw_buffers
+        else:
+            self._task_queue = queue.Queue()
+            self._result_queue = queue.Queue()
+            worker_class, slot_buffers = threading.Thread, self._slot_buffers
+        self._workers = []
+        for _ in range(self.num_workers):
+            worker = worker_class(
+                target=_data_loader_worker, args=(
+                    self.inputs, self.targets, self.transform, slot_buffers, self._task_queue, self._result_queue,
+                    self.backend == 'process'
+                )
+            )
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _get_result(self):
+        while True:
+            try:
+                return self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    raise RuntimeError("A worker of DataLoader exited unexpectedly")
+
+    def __iter__(self):
+        if self._workers is None:
+            self._start_workers()
+
+        indices = np.arange(len(self.inputs))
+        if self.shuffle:
+            np.random.shuffle(indices)
+        n_batches = len(self)
+
+        def submit(task_id, slot):
+            start_idx = task_id * self.batch_size
+            self._task_queue.put((task_id, slot, indices[start_idx:start_idx + self.batch_size]))
+
+        n_submitted = min(len(self._slot_buffers), n_batches)
+        for task_id in range(n_submitted):
+            submit(task_id, task_id)
+        ready = {}
+        n_received = 0
+        try:
+            for task_id in range(n_batches):
+                while task_id not in ready:
+                    done_id, error = self._get_result()
+                    n_received += 1
+                    if error is not None:
+                        raise RuntimeError("DataLoader worker failed:\n%s" % error)
+                    ready[done_id] = True
+                del ready[task_id]
+
+                slot = task_id % len(self._slot_buffers)
+                n = min(self.batch_size, len(self.inputs) - task_id * self.batch_size)
+                batch = tuple(buf[:n] for buf in self._slot_buffers[slot])
+                yield batch if self._is_tuple else batch[0]
+
+                # the consumer is done with this slot, reuse it for a later batch
+                if n_submitted < n_batches:
+                    submit(n_submitted, slot)
+                    n_submitted += 1
+        finally:
+            # wait for the batches in flight, so that no worker writes into the buffers of the next epoch
+            while n_received < n_submitted:
+                self._get_result()
+                n_received += 1
+
+    def close(self):
+        """Stop the workers."""
+        if self._workers is not None:
+            for _ in self._workers:
+                self._task_queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = None
+
+
+def _pad_batch(sequences, lengths, pad_value, dtype):
+    """Pad a list of sequences into a [batch_size, max_length] array."""
+    max_length = lengths.max() if len(lengths) > 0 else 0
+    mask = np.arange(max_length) < lengths[:, None]
+    x = np.full((len(sequences), max_length), pad_value, dtype=dtype)
+    if max_length > 0:
+        x[mask] = np.concatenate([np.asarray(seq, dtype=dtype).reshape(-1) for seq in sequences])
+    return x, mask
+
+
+def bucket_minibatches(
+        sequences, targets=None, batch_size=32, bucket_boundaries=None, allow_dynamic_batch_size=True, shuffle=False,
+        pad_value=0, dtype=np.int32
+):
+    """Generate a generator that groups sequences of similar lengths into batches, and returns them padded into arrays
+    with their lengths and masks, so that ``DynamicRNNLayer`` does not compute over long paddings.
+
+    Parameters
+    ----------
+    sequences : list of list or list of numpy.array
+        The sequences, e.g. of word IDs, with different lengths.
+    targets : list or numpy.array or None
+        The labels of the sequences. If they are sequences, e.g. for sequence labelling, they are padded as the inputs.
+    batch_size : int
+        The batch size.
+    bucket_boundaries : list of int or None
+        The upper length boundaries of the buckets, e.g. ``[10, 20, 40]`` puts the sequences shorter than 10
+        into the first bucket, the ones from 10 to 19 into the second one and so on. If None, the batches are taken
+        from the sequences sorted by length, which minimizes the padding.
+    allow_dynamic_batch_size: boolean
+        Allow the use of the last batch of each bucket, which has less than batch_size sequences (default).
+    shuffle : boolean
+        Indicating whether to shuffle the sequences within the buckets, and the order of the batches.
+    pad_value : int
+        The value to pad the sequences with.
+    dtype : numpy.dtype
+        The dtype of the padded arrays, default is int32.
+
+    Returns
+    --------
+    generator of tuple
+        ``(x, sequence_length, mask)``, or ``(x, y, sequence_length, mask)`` if ``targets`` is given, where
+            - x : array of shape [batch_size, max_length], the padded sequences, max_length is the longest one
+              of the batch;
+            - y : the targets, padded as x if they are sequences;
+            - sequence_length : int32 array of shape [batch_size], the lengths of the sequences;
+            - mask : int32 array of shape [batch_size, max_length], 1 for the elements of the sequences and 0
+              for the padding, as ``tl.prepro.sequences_get_mask``.
+
+    Examples
+    --------
+    >>> sequences = [[1, 2, 3], [4], [5, 6], [7, 8, 9, 10], [11, 12]]
+    >>> for x, sequence_length, mask in tl.iterate.bucket_minibatches(sequences, batch_size=2):
+    >>>     print(x, sequence_length)
+    [[4 0]
+     [5 6]] [1 2]
+    [[11 12  0]
+     [ 1  2  3]] [2 3]
+    [[ 7  8  9 10]] [4]
+
+    Feed the lengths to ``DynamicRNNLayer`` or ``BiDynamicRNNLayer``
+
+    >>> for x, y, sequence_length, mask in tl.iterate.bucket_minibatches(X_train, y_train, batch_size=64, shuffle=True):
+    >>>     sess.run(train_op, feed_dict={input_seqs: x, target_seqs: y, seq_len: sequence_length, target_mask: mask})
+
+    """
+    if targets is not None and len(sequences) != len(targets):
+        raise AssertionError("The length of sequences and targets should be equal")
+
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    if bucket_boundaries is None:
+        buckets = np.zeros(len(sequences), dtype=np.int64)
+    else:
+        buckets = np.searchsorted(np.asarray(bucket_boundaries), lengths, side='right')
+
+    # sort by bucket, then by length if there are no boundaries, then randomly if shuffle
+    keys = [np.random.random_sample(len(sequences))] if shuffle else []
+    if bucket_boundaries is None:
+        keys.append(lengths)
+    order = np.lexsort(keys + [buckets]) if len(sequences) > 0 else np.zeros(0, dtype=np.int64)
+
+    batches = []
+    sorted_buckets = buckets[order]
+    bucket_starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]) if len(order) > 0 else []
+    for start, end in zip(bucket_starts, list(bucket_starts[1:]) + [len(order)]):
+        for batch_start in range(start, end, batch_size):
+            batch_end = min(batch_start + batch_size, end)
+            if batch_end - batch_start < batch_size and not allow_dynamic_batch_size:
+                break
+            batches.append(order[batch_start:batch_end])
+    if shuffle:
+        np.random.shuffle(batches)
+
+    sequences_are_array = isinstance(sequences, np.ndarray)
+    targets_are_sequences = targets is not None and len(targets) > 0 and np.ndim(targets[0]) > 0
+    for excerpt in batches:
+        batch_sequences = sequences[excerpt] if sequences_are_array else [sequences[i] for i in excerpt]
+        x, mask = _pad_batch(batch_sequences, lengths[excerpt], pad_value, dtype)
+        sequence_length = lengths[excerpt].astype(np.int32)
+        if targets is None:
+            yield x, sequence_length, mask.astype(np.int32)
+            continue
+        if targets_are_sequences:
+            batch_targets = [targets[i] for i in excerpt]
+            target_lengths = np.fromiter(map(len, batch_targets), dtype=np.int64, count=len(excerpt))
+            y, _ = _pad_batch(batch_targets, target_lengths, pad_value, dtype)
+        elif isinstance(targets, np.ndarray):
+            y = targets[excerpt]
+        else:
+            y = np.asarray([targets[i] for i in excerpt])
+        yield x, y, sequence_length, mask.astype(np.int32)
+
+
 def seq_minibatches(inputs, targets, batch_size, seq_length, stride=1):
     """Generate a generator that return a batch of sequence inputs and targets.
     If `batch_size=100` and `seq_length=5`, one return will have 500 rows (examples).
@@ -268,9 +617,7 @@ def ptb_iterator(raw_data, batch_size, num_steps):
 
     data_len = len(raw_data)
     batch_len = data_len // batch_size
-    data = np.zeros([batch_size, batch_len], dtype=np.int32)
-    for i in range(batch_size):
-        data[i] = raw_data[batch_len * i:batch_len * (i + 1)]
+    data = raw_data[:batch_size * batch_len].reshape(batch_size, batch_len)
 
     epoch_size = (batch_len - 1) // num_steps
 
@@ -281,3 +628,90 @@ def ptb_iterator(raw_data, batch_size, num_steps):
         x = data[:, i * num_steps:(i + 1) * num_steps]
         y = data[:, i * num_steps + 1:(i + 1) * num_steps + 1]
         yield (x, y)
+
+
+class PTBIterator(object):
+    """Iterate on a stream of word IDs as ``tl.iterate.ptb_iterator``, with views of the stream instead of copies.
+
+    The stream is reshaped into ``[batch_size, batch_len]`` without copying, so that it can be a memory-mapped array,
+    e.g. of ``tl.nlp.load_token_ids``, and the batches are views of it with the dtype of the stream.
+    The iterator keeps its position, an interrupted epoch is resumed by the next iteration.
+
+    Parameters
+    ----------
+    raw_data : numpy.array or list
+        The stream of word IDs, an array or a memory map is used without copy, a list is converted to int32.
+    batch_size : int
+        The batch size.
+    num_steps : int
+        The number of unrolls. i.e. sequence_length
+    random_offset : boolean
+        If True, the stream is shifted by a random offset smaller than ``num_steps`` at each epoch,
+        so that the sequences are not cut at the same positions at every epoch.
+    num_shards : int
+        The number of workers sharing the stream, each of them iterates on a contiguous part of it.
+    shard_index : int
+        The index of the part of this worker, from 0 to ``num_shards - 1``.
+
+    Attributes
+    ----------
+    epoch : int
+        The number of finished epochs.
+    step : int
+        The number of batches returned in the current epoch.
+
+    Examples
+    --------
+    >>> train_data, _ = tl.nlp.load_token_ids('ptb.train.ids.npy')
+    >>> train_iterator = tl.iterate.PTBIterator(train_data, batch_size=20, num_steps=35, random_offset=True)
+    >>> for epoch in range(max_max_epoch):
+    >>>     state = sess.run(initial_state)
+    >>>     for x, y in train_iterator:
+    >>>         feed_dict = {input_data: x, targets: y, initial_state: state}
+    >>>         _, state = sess.run([train_op, final_state], feed_dict=feed_dict)
+
+    Raises
+    ------
+    ValueError : if batch_size or num_steps are too high.
+
+    """
+
+    def __init__(self, raw_data, batch_size, num_steps, random_offset=False, num_shards=1, shard_index=0):
+        if not isinstance(raw_data, np.ndarray):
+            raw_data = np.asarray(raw_data, dtype=np.int32)
+        if not 0 <= shard_index < num_shards:
+            raise ValueError("shard_index should be in [0, %d), but got %d" % (num_shards, shard_index))
+        shard_len = len(raw_data) // num_shards
+        self.data = raw_data[shard_index * shard_len:(shard_index + 1) * shard_len]
+        self.batch_size = batch_size
+        self.num_steps = num_steps
+        self.random_offset = random_offset
+
+        # keep the same number of batches whatever the offset
+        max_offset = num_steps - 1 if random_offset else 0
+        self.batch_len = (len(self.data) - max_offset) // batch_size
+        self.epoch_size = (self.batch_len - 1) // num_steps
+        if self.epoch_size <= 0:
+            raise ValueError("epoch_size == 0, decrease batch_size or num_steps")
+
+        self.epoch = 0
+        self.step = 0
+        self._view = None
+
+    def __len__(self):
+        return self.epoch_size
+
+    def __iter__(self):
+        if self._view is None:
+            offset = np.random.randint(self.num_steps) if self.random_offset else 0
+            end = offset + self.batch_size * self.batch_len
+            self._view = self.data[offset:end].reshape(self.batch_size, self.batch_len)
+
+        while self.step < self.epoch_size:
+            start = self.step * self.num_steps
+            self.step += 1
+            yield self._view[:, start:start + self.num_steps], self._view[:, start + 1:start + self.num_steps + 1]
+
+        self.epoch += 1
+        self.step = 0
+        self._view = None
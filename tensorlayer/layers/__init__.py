@@ -16,6 +16,7 @@ from .dense import *
 from .dropout import *
 from .deprecated import *
 from .extend import *
+from .folding import *
 # from .flow_control import * # remove for TF 2.0
 from .image_resampling import *
 from .importer import *
@@ -27,6 +28,7 @@ from .normalization import *
 from .object_detection import *
 from .padding import *
 from .pooling import *
+from .profiling import *
 from .quantize import *
 # from .reconstruction import * # remove for TF 2.0
 from .recurrent import *
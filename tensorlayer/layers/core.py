@@ -10,8 +10,6 @@ import numpy as np
 
 import tensorflow as tf
 
-from tensorlayer.layers.utils import list_remove_repeat
-
 from tensorlayer import logging
 
 from tensorlayer.decorators import deprecated_alias
@@ -39,6 +37,97 @@ class LayersConfig(object):
 TF_GRAPHKEYS_VARIABLES = tf.GraphKeys.GLOBAL_VARIABLES
 
 
+def _count_params(params):
+    """Return the number of elements of the parameters, unknown dimensions count as 1."""
+    n_params = 0
+    for p in params:
+        n = 1
+        # for s in p.eval().shape:
+        for s in p.get_shape():
+            try:
+                s = int(s)
+            except Exception:
+                s = 1
+            if s:
+                n = n * s
+        n_params = n_params + n
+    return n_params
+
+
+class _Prefix(object):
+    """A reference to the first `stop` entries of the `entries` of a :class:`_SharedOrderedSet`."""
+
+    __slots__ = ('entries', 'stop')
+
+    def __init__(self, entries, stop):
+        self.entries = entries
+        self.stop = stop
+
+
+class _SharedOrderedSet(object):
+    """The layer outputs or the parameters of a network, in order and without repeats.
+
+    Instead of a copy of the list of every previous layer, the entries of a layer are its own items and references to
+    the entries of its previous layers, as they were when the layer was built, so that building a network is linear
+    in its depth. The list is flattened on first access and cached, the cache is the list seen by the user.
+    """
+
+    __slots__ = ('_entries', '_items')
+
+    def __init__(self, items=None):
+        self._entries = []
+        self._items = items
+
+    def extend(self, items):
+        """Append the items that are not in the set yet."""
+        self._thaw()
+        self._entries.extend(items)
+
+    def share(self, other):
+        """Append the items of another set that are not in this set yet."""
+        self._thaw()
+        if other._items is not None:
+            self._entries.append(_Prefix(other._items, len(other._items)))
+        else:
+            self._entries.append(_Prefix(other._entries, len(other._entries)))
+
+    def to_list(self):
+        """Return the items as a list, flattened once."""
+        if self._items is None:
+            self._items = _flatten_entries(self._entries)
+            self._entries = None
+        return self._items
+
+    def _thaw(self):
+        # entries are only ever appended to, as other sets refer to their prefixes
+        if self._items is not None:
+            self._entries = list(self._items)
+            self._items = None
+
+
+def _flatten_entries(entries):
+    """Return the items of the entries and of the prefixes they refer to, keeping the first occurrences."""
+    items = []
+    seen = set()
+    flattened = {}  # id of entries => length of their prefix already flattened
+    stack = [(entries, 0, len(entries))]
+    while stack:
+        entries, start, stop = stack.pop()
+        for i in range(start, stop):
+            entry = entries[i]
+            if isinstance(entry, _Prefix):
+                done = flattened.get(id(entry.entries), 0)
+                if entry.stop > done:
+                    flattened[id(entry.entries)] = entry.stop
+                    stack.append((entries, i + 1, stop))
+                    stack.append((entry.entries, done, entry.stop))
+                    break
+            elif id(entry) not in seen:
+                seen.add(id(entry))
+                items.append(entry)
+    return items
+
+
 class Layer(object):
     """The basic :class:`Layer` class represents a single layer of a neural network.
 
@@ -116,8 +205,8 @@ class Layer(object):
 
         self.inputs = None
         self.outputs = None
-        self.all_layers = list()
-        self.all_params = list()
+        self._all_layers = _SharedOrderedSet()
+        self._all_params = _SharedOrderedSet()
         self.all_drop = dict()
 
         if name is None:
@@ -134,23 +223,20 @@ class Layer(object):
 
         if isinstance(prev_layer, Layer):
             # 1. for normal layer have only 1 input i.e. DenseLayer
-            # Hint : list(), dict() is pass by value (shallow), without them,
-            # it is pass by reference.
+            # Hint : the layers and params of the previous layer are shared, not copied,
+            # dict() is pass by value (shallow), without it, it is pass by reference.
 
             self.inputs = prev_layer.outputs
 
-            self._add_layers(prev_layer.all_layers)
-            self._add_params(prev_layer.all_params)
-            self._add_dropout_layers(prev_layer.all_drop)
+            self._add_prev_layer(prev_layer)
 
         elif isinstance(prev_layer, list):
             # 2. for layer have multiply inputs i.e. ConcatLayer
 
             self.inputs = [layer.outputs for layer in prev_layer]
 
-            self._add_layers(sum([l.all_layers for l in prev_layer], []))
-            self._add_params(sum([l.all_params for l in prev_layer], []))
-            self._add_dropout_layers(sum([list(l.all_drop.items()) for l in prev_layer], []))
+            for layer in prev_layer:
+                self._add_prev_layer(layer)
 
         elif isinstance(prev_layer, tf.Tensor) or isinstance(prev_layer, tf.Variable):  # placeholders
             if self.__class__.__name__ not in ['InputLayer', 'OneHotInputLayer', 'Word2vecEmbeddingInputlayer',
@@ -161,13 +247,29 @@ class Layer(object):
 
         elif prev_layer is not None:
             # 4. tl.models
-            self._add_layers(prev_layer.all_layers)
-            self._add_params(prev_layer.all_params)
-            self._add_dropout_layers(prev_layer.all_drop)
+            self._add_prev_layer(prev_layer)
 
             if hasattr(prev_layer, "outputs"):
                 self.inputs = prev_layer.outputs
 
+    @property
+    def all_layers(self):
+        """The outputs of all the layers of this network, in order."""
+        return self._all_layers.to_list()
+
+    @all_layers.setter
+    def all_layers(self, layers):
+        self._all_layers = _SharedOrderedSet(layers)
+
+    @property
+    def all_params(self):
+        """The parameters of all the layers of this network, in order."""
+        return self._all_params.to_list()
+
+    @all_params.setter
+    def all_params(self, params):
+        self._all_params = _SharedOrderedSet(params)
+
     def print_params(self, details=True, session=None):
         """Print all info of parameters in the network"""
         for i, p in enumerate(self.all_params):
@@ -198,19 +300,7 @@ class Layer(object):
 
     def count_params(self):
         """Returns the number of parameters in the network."""
-        n_params = 0
-        for _i, p in enumerate(self.all_params):
-            n = 1
-            # for s in p.eval().shape:
-            for s in p.get_shape():
-                try:
-                    s = int(s)
-                except Exception:
-                    s = 1
-                if s:
-                    n = n * s
-            n_params = n_params + n
-        return n_params
+        return _count_params(self.all_params)
 
     def get_all_params(self, session=None):
         """Return the parameters in a list of array."""
@@ -285,31 +375,38 @@ class Layer(object):
 
         return params
 
+    @protected_method
+    def _add_prev_layer(self, prev_layer):
+        if isinstance(prev_layer, Layer):
+            self._all_layers.share(prev_layer._all_layers)
+            self._all_params.share(prev_layer._all_params)
+        else:
+            self._add_layers(prev_layer.all_layers)
+            self._add_params(prev_layer.all_params)
+
+        self._add_dropout_layers(prev_layer.all_drop)
+
     @protected_method
     def _add_layers(self, layers):
         if isinstance(layers, list):
             try:  # list of class Layer
                 new_layers = [layer.outputs for layer in layers]
-                self.all_layers.extend(list(new_layers))
+                self._all_layers.extend(new_layers)
 
             except AttributeError:  # list of tf.Tensor
-                self.all_layers.extend(list(layers))
+                self._all_layers.extend(layers)
 
         else:
-            self.all_layers.append(layers)
-
-        self.all_layers = list_remove_repeat(self.all_layers)
+            self._all_layers.extend([layers])
 
     @protected_method
     def _add_params(self, params):
 
         if isinstance(params, list):
-            self.all_params.extend(list(params))
+            self._all_params.extend(params)
 
         else:
-            self.all_params.append(params)
-
-        self.all_params = list_remove_repeat(self.all_params)
+            self._all_params.extend([params])
 
     @protected_method
     def _add_dropout_layers(self, drop_layers):
@@ -0,0 +1,304 @@
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import tensorflow as tf
+
+from tensorlayer import logging
+
+from tensorlayer.layers.core import Layer
+
+__all__ = [
+    'fold_batch_norms',
+]
+
+
+def _node_input_names(node):
+    """Return the names of the nodes feeding ``node``, without the port and control prefixes."""
+    return [name.lstrip('^').split(':')[0] for name in node.input]
+
+
+def _const_node(name, value, dtype):
+    """Return a ``Const`` NodeDef holding ``value``."""
+    node = tf.NodeDef(name=name, op='Const')
+    node.attr['dtype'].type = dtype.as_datatype_enum
+    node.attr['value'].tensor.CopyFrom(tf.make_tensor_proto(value, dtype=dtype))
+    return node
+
+
+def _fold_dropout(graph_def, keep_names):
+    """Replace the keeping probabilities by ``1`` and the dropout ops using them by identities.
+
+    ``tf.nn.dropout`` computes ``x / keep * floor(keep + random_uniform)``, with the probability folded to ``1``
+    the multiplication returns ``x`` and the random branch is left unused.
+
+    """
+    keep_names = set(keep_names)
+    nodes = dict((node.name, node) for node in graph_def.node)
+    for node in graph_def.node:
+        if node.name in keep_names:
+            dtype = tf.as_dtype(node.attr['dtype'].type)
+            node.CopyFrom(_const_node(node.name, 1, dtype))
+
+    for node in graph_def.node:
+        if node.op != 'Mul' or len(node.input) != 2:
+            continue
+        div, floor = [nodes.get(name) for name in _node_input_names(node)]
+        if div is None or floor is None or div.op != 'RealDiv' or floor.op != 'Floor':
+            continue
+        if _node_input_names(div)[1] not in keep_names:
+            continue
+        if not keep_names.intersection(_node_input_names(nodes[_node_input_names(floor)[0]])):
+            continue
+        dtype = node.attr['T']
+        node.op = 'Identity'
+        del node.input[:]
+        node.input.append(div.input[0])
+        node.ClearField('attr')
+        node.attr['T'].CopyFrom(dtype)
+    return graph_def
+
+
+def _per_channel(value, n_channels, axis):
+    """Return ``value`` as a vector of ``n_channels`` when it only varies along ``axis`` (counted from the end)."""
+    value = np.asarray(value, dtype=np.float64)
+    if value.size == 1:
+        return np.full(n_channels, value.item())
+    if value.size != n_channels or value.ndim < -axis or value.shape[axis] != n_channels:
+        return None
+    return value.reshape(n_channels)
+
+
+def _fold_batch_norm_ops(graph_def, layer_names=None):
+    """Fold the scales and shifts of the batch normalizations into the preceding convolutions or matmuls.
+
+    In inference mode ``BatchNorm`` computes ``x * a + b`` with ``a`` and ``b`` derived from its moving statistics,
+    once the variables are frozen they are constant and, when ``x`` is only used by the normalization, the
+    weights and the bias of the layer computing ``x`` can be scaled by ``a`` and shifted by ``b`` instead.
+    This is the folding of ``_w_fold`` and ``_bias_fold`` of :class:`QuanConv2dWithBN`, the weights become
+    ``W * gamma / sqrt(moving_variance + epsilon)`` and the bias ``beta + (b - moving_mean) * gamma / sqrt(...)``.
+    The last op of the normalization is rewritten into the ``BiasAdd`` and keeps its name.
+
+    Returns the rewritten graph and the names of the ops whose normalization is folded, the replaced nodes are
+    left unused.
+    If ``layer_names`` is given, only the normalizations of the outputs of these ops are folded.
+
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name='')
+
+    # the imported ops are in topological order
+    constant_ops = set()
+    for op in graph.get_operations():
+        inputs = [t.op for t in op.inputs] + op.control_inputs
+        if op.type == 'Const' or (inputs and not op.op_def.is_stateful and all(i in constant_ops for i in inputs)):
+            constant_ops.add(op)
+
+    def split_constant(op):
+        """Return the (variable, constant) inputs of a binary op, or None."""
+        if len(op.inputs) != 2:
+            return None
+        x, c = op.inputs
+        if x.op in constant_ops:
+            x, c = c, x
+        if x.op in constant_ops or c.op not in constant_ops:
+            return None
+        return x, c
+
+    def only_consumer(tensor, op):
+        return list(tensor.consumers()) == [op]
+
+    candidates = []
+    used = set()
+    for mul in graph.get_operations():
+        if mul.type != 'Mul' or mul in constant_ops:
+            continue
+        inputs = split_constant(mul)
+        if inputs is None:
+            continue
+        x, scale = inputs
+        bias = None
+        if x.op.type in ('BiasAdd', 'Add', 'AddV2') and split_constant(x.op) is not None:
+            bias = x.op
+            x = split_constant(bias)[0]
+            if not only_consumer(bias.outputs[0], mul):
+                continue
+        linear = x.op
+        if layer_names is not None and (bias or linear).name not in layer_names:
+            continue
+        if linear.type not in ('Conv2D', 'DepthwiseConv2dNative', 'MatMul') or \
+                linear.inputs[1].op not in constant_ops or not only_consumer(linear.outputs[0], bias or mul):
+            continue
+        add, shift = None, None
+        consumers = mul.outputs[0].consumers()
+        if len(consumers) == 1 and consumers[0].type in ('BiasAdd', 'Add', 'AddV2'):
+            if split_constant(consumers[0]) is not None:
+                add = consumers[0]
+                shift = split_constant(add)[1]
+        ops = set([linear, bias, mul, add]) - set([None])
+        if used.intersection(ops):
+            continue
+        used.update(ops)
+        candidates.append((linear, bias, mul, scale, add, shift))
+
+    if not candidates:
+        return graph_def, []
+
+    tensors = []
+    for linear, bias, _, scale, _, shift in candidates:
+        # the scale is fetched again in place of a missing bias or shift
+        bias_tensor = scale if bias is None else split_constant(bias)[1]
+        tensors.extend([linear.inputs[1], bias_tensor, scale, scale if shift is None else shift])
+    with tf.Session(graph=graph) as sess:
+        values = sess.run(tensors)
+
+    nodes = dict((node.name, node) for node in graph_def.node)
+    folded = []
+    for i, (linear, bias, mul, _, add, _) in enumerate(candidates):
+        weights, bias_value, scale, shift = values[4 * i:4 * i + 4]
+        data_format = linear.get_attr('data_format') if linear.type != 'MatMul' else b'NHWC'
+        if linear.type == 'MatMul':
+            n_channels = weights.shape[0 if linear.get_attr('transpose_b') else 1]
+        elif linear.type == 'DepthwiseConv2dNative':
+            n_channels = weights.shape[2] * weights.shape[3]
+        else:
+            n_channels = weights.shape[3]
+        # the channels of a BiasAdd are given by its data format, the ones of a broadcast by the shape
+        axis = -3 if data_format in (b'NCHW', 'NCHW') else -1
+        scale = _per_channel(scale, n_channels, axis)
+        if add is None:
+            shift = np.zeros(n_channels)
+        else:
+            shift = _per_channel(shift, n_channels, -1 if add.type == 'BiasAdd' else axis)
+        if bias is None:
+            bias_value = np.zeros(n_channels)
+        else:
+            bias_value = _per_channel(bias_value, n_channels, -1 if bias.type == 'BiasAdd' else axis)
+        if scale is None or shift is None or bias_value is None:
+            continue
+
+        if linear.type == 'DepthwiseConv2dNative':
+            folded_weights = weights * scale.reshape(weights.shape[2:])
+        elif linear.type == 'MatMul' and linear.get_attr('transpose_b'):
+            folded_weights = weights * scale[:, None]
+        else:
+            folded_weights = weights * scale
+        dtype = linear.outputs[0].dtype
+        weights_node = _const_node(linear.name + '/folded_weights', folded_weights, dtype)
+        bias_node = _const_node(linear.name + '/folded_bias', bias_value * scale + shift, dtype)
+        graph_def.node.extend([weights_node, bias_node])
+        nodes[linear.name].input[1] = weights_node.name
+
+        last = nodes[(add or mul).name]
+        last.op = 'BiasAdd'
+        del last.input[:]
+        last.input.extend([linear.name, bias_node.name])
+        last.ClearField('attr')
+        last.attr['T'].type = dtype.as_datatype_enum
+        last.attr['data_format'].s = tf.compat.as_bytes(data_format)
+        folded.append((bias or linear).name)
+    return graph_def, folded
+
+
+def _layer_output_names(network):
+    """Return the names of the ops computing the layer outputs of a network, skipping the identities."""
+    names = set()
+    for outputs in network.all_layers:
+        if not isinstance(outputs, tf.Tensor):
+            continue
+        op = outputs.op
+        while op.type == 'Identity' and op.inputs:
+            op = op.inputs[0].op
+        names.add(op.name)
+    return names
+
+
+def _inference_graph_def(sess, network, inputs, outputs, fold_batch_norms=True):
+    """Return the frozen inference GraphDef of the outputs of a network and the names of the layer outputs whose
+    batch normalization is folded.
+
+    The keeping probabilities of ``network.all_drop`` are folded to 1, the variables are converted to constants,
+    the batch normalizations following the layers of the network are folded and the unused nodes are stripped.
+
+    """
+    output_names = [t.op.name for t in outputs]
+    graph_def = tf.graph_util.extract_sub_graph(sess.graph.as_graph_def(), output_names)
+    graph_def = _fold_dropout(graph_def, [t.op.name for t in network.all_drop])
+    graph_def = tf.graph_util.convert_variables_to_constants(sess, graph_def, output_names)
+    graph_def = tf.graph_util.remove_training_nodes(
+        graph_def, protected_nodes=[t.op.name for t in inputs] + output_names
+    )
+    folded = []
+    if fold_batch_norms:
+        graph_def, folded = _fold_batch_norm_ops(graph_def, _layer_output_names(network))
+    return tf.graph_util.extract_sub_graph(graph_def, output_names), folded
+
+
+def fold_batch_norms(sess, network, inputs, name='bn_folded'):
+    """Return an inference network equivalent to the given network, with the :class:`BatchNorm` layers following
+    a :class:`Conv2d`, :class:`DepthwiseConv2d` or :class:`Dense` layer folded into it.
+
+    The network is walked for the convolution or dense layers whose outputs are only used by a batch normalization,
+    their weights and biases are scaled and shifted with the moving mean and variance of the normalization,
+    like ``_w_fold`` and ``_bias_fold`` of :class:`QuanConv2dWithBN`, and the normalization is removed.
+    This saves a memory-bound op after every convolution of MobileNet or VGG-like networks.
+
+    The new network is imported into the graph of the session, under the ``name`` scope, and computes its outputs
+    from the same inputs. Its parameters are frozen as constants and its dropout layers disabled, it is meant for
+    inference only. The batch normalizations built with ``is_train=True`` use the statistics of the batch and
+    are kept.
+
+    Parameters
+    ----------
+    sess : Session
+        TensorFlow Session with the trained parameters.
+    network : TensorLayer layer
+        The network to fold.
+    inputs : Tensor or list of Tensor
+        The input placeholders of the network.
+    name : str
+        A unique layer name, the name scope of the imported graph.
+
+    Returns
+    -------
+    :class:`Layer`
+        The folded network, its ``all_layers`` are the outputs of the layers that are left, its ``all_params``
+        is empty.
+
+    Examples
+    --------
+    A convolution followed by the ops of a batch normalization in inference mode
+
+    >>> x = tf.placeholder(tf.float32, [None, 32, 32, 3])
+    >>> W = tf.get_variable('conv/W', [3, 3, 3, 32])
+    >>> conv = tf.nn.conv2d(x, W, strides=[1, 1, 1, 1], padding='SAME', name='conv/Conv2D')
+    >>> beta, moving_mean = tf.get_variable('bn/beta', [32]), tf.get_variable('bn/moving_mean', [32])
+    >>> gamma, moving_variance = tf.get_variable('bn/gamma', [32]), tf.get_variable('bn/moving_variance', [32])
+    >>> bn = tf.nn.relu(tf.nn.batch_normalization(conv, moving_mean, moving_variance, beta, gamma, 1e-3))
+    >>> net = tl.layers.Layer(prev_layer=None, name='net')
+    >>> net.outputs = bn
+    >>> net.all_layers = [conv, bn]
+    >>> ...
+    >>> net_folded = tl.layers.fold_batch_norms(sess, net, x)
+    >>> y = sess.run(net_folded.outputs, feed_dict={x: X})
+
+    """
+    inputs = inputs if isinstance(inputs, (list, tuple)) else [inputs]
+    graph_def, folded = _inference_graph_def(sess, network, inputs, [network.outputs])
+
+    # the outputs of the folded layers are replaced by the outputs of their normalizations
+    node_names = set(node.name for node in graph_def.node) - set(folded)
+    layers = [t for t in network.all_layers if isinstance(t, tf.Tensor) and t.op.name in node_names]
+    with sess.graph.as_default():
+        imported = tf.import_graph_def(
+            graph_def, input_map=dict((t.name, t) for t in inputs), return_elements=[t.name for t in layers], name=name
+        )
+
+    net_new = Layer(prev_layer=None, name=name)
+    net_new.inputs = inputs[0] if len(inputs) == 1 else inputs
+    net_new.outputs = imported[layers.index(network.outputs)]
+    net_new.all_layers = list(imported)
+
+    logging.info("fold_batch_norms %s: %d batch norms folded" % (net_new.name, len(folded)))
+    return net_new
@@ -0,0 +1,503 @@
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+import functools
+import json
+import time
+
+from contextlib import contextmanager
+
+import tensorflow as tf
+
+from tensorflow.python.client import timeline
+
+from tensorlayer import logging
+
+from tensorlayer.layers.core import Layer
+from tensorlayer.layers.core import _count_params
+
+__all__ = [
+    'BuildProfile',
+    'RunProfile',
+    'profile_build',
+    'profile_run',
+]
+
+# ops counted as one floating point operation per output element
+_ELEMENTWISE_OPS = frozenset(
+    [
+        'Add', 'AddN', 'AddV2', 'BiasAdd', 'Elu', 'Exp', 'LeakyRelu', 'Log', 'Maximum', 'Minimum', 'Mul', 'Neg',
+        'RealDiv', 'Relu', 'Relu6', 'Rsqrt', 'Selu', 'Sigmoid', 'Softmax', 'Softplus', 'Softsign', 'Sqrt', 'Square',
+        'Sub', 'Tanh'
+    ]
+)
+
+
+def _dims(shape):
+    """Return the dimensions of a TensorShape with the unknown ones as 1, or None if the rank is unknown."""
+    if shape.ndims is None:
+        return None
+    return [1 if d is None else d for d in shape.as_list()]
+
+
+def _product(dims):
+    n = 1
+    for d in dims:
+        n *= d
+    return n
+
+
+def _num_elements(tensor):
+    dims = _dims(tensor.get_shape())
+    return 0 if dims is None else _product(dims)
+
+
+def _is_initializer(op):
+    names = op.name.split('/')
+    return 'Initializer' in names or 'initial_value' in names
+
+
+def _estimate_flops(op):
+    """Estimate the floating point operations of an op, the unknown dimensions (e.g. the batch size) count as 1."""
+    if op.type in ('MatMul', 'BatchMatMul', 'BatchMatMulV2'):
+        dims = _dims(op.inputs[0].get_shape())
+        if not dims:
+            return 0
+        transpose = op.get_attr('transpose_a') if op.type == 'MatMul' else op.get_attr('adj_x')
+        return 2 * (dims[-2] if transpose else dims[-1]) * _num_elements(op.outputs[0])
+
+    if op.type in ('Conv2D', 'Conv3D', 'DepthwiseConv2dNative', 'Conv2DBackpropInput', 'Conv3DBackpropInputV2'):
+        dims = _dims(op.inputs[1].get_shape())  # filter
+        if not dims:
+            return 0
+        if op.type == 'DepthwiseConv2dNative':
+            return 2 * _product(dims[:-2]) * _num_elements(op.outputs[0])
+        if op.type in ('Conv2D', 'Conv3D'):
+            return 2 * _product(dims[:-1]) * _num_elements(op.outputs[0])
+        return 2 * _product(dims[:-1]) * _num_elements(op.inputs[2])  # transposed convolutions
+
+    if op.type in ('AvgPool', 'AvgPool3D', 'MaxPool', 'MaxPool3D'):
+        return _product(op.get_attr('ksize')) * _num_elements(op.outputs[0])
+
+    if op.type in _ELEMENTWISE_OPS:
+        return _num_elements(op.outputs[0])
+
+    return 0
+
+
+class _Profile(object):
+    """Records of layers, printed as a table with the columns (key, header, width, format, scale, total)."""
+
+    _columns = []
+
+    def __init__(self):
+        self.records = []
+
+    def sorted_records(self, sort_by='time'):
+        """Return the records sorted by decreasing values of a column, or in their order if sort_by is None."""
+        if sort_by is None:
+            return list(self.records)
+        return sorted(self.records, key=lambda record: record[sort_by], reverse=True)
+
+    def print_table(self, sort_by='time', top=None):
+        """Print the records as a table, see :meth:`sorted_records`.
+
+        Parameters
+        ----------
+        sort_by : str or None
+            The column to sort by.
+        top : int or None
+            If not None, only print the first `top` layers.
+
+        """
+        logging.info(
+            ''.join(
+                ' {:{}{}}'.format(header, '<' if scale is None else '>', width)
+                for _, header, width, _, scale, _ in self._columns
+            )
+        )
+        for record in self.sorted_records(sort_by)[:top]:
+            cells = []
+            for key, _, width, fmt, scale, _ in self._columns:
+                value = record[key]
+                if key == 'name':
+                    value = '  ' * record.get('depth', 0) + value
+                if scale is None:
+                    cells.append(' {:<{}}'.format(str(value), width))
+                else:
+                    cells.append(' {:>{}{}}'.format(value * scale, width, fmt))
+            logging.info(''.join(cells))
+
+        outermost = [record for record in self.records if record.get('depth', 0) == 0]
+        cells = []
+        for key, _, width, fmt, scale, total in self._columns:
+            if key == 'name':
+                cells.append(' {:<{}}'.format('total (%d layers)' % len(self.records), width))
+            elif total is None or not outermost:
+                cells.append(' ' * (width + 1))
+            else:
+                cells.append(' {:>{}{}}'.format(total(record[key] for record in outermost) * scale, width, fmt))
+        logging.info(''.join(cells))
+
+    def to_json(self, path=None):
+        """Return the records as a JSON string, and write it to `path` if not None."""
+        s = json.dumps(self.records, indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(s)
+        return s
+
+
+class BuildProfile(_Profile):
+    """The layers built in a :func:`profile_build` context.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dictionary per layer, in the order the layers were built, with the keys:
+            - ``name`` and ``class`` of the layer.
+            - ``depth``: the number of layers being built around it, e.g. by a layer that builds other layers.
+            - ``time``: the wall time of its ``__init__``, in seconds.
+            - ``n_params``: the number of elements of the variables it created.
+            - ``output_shape``: the shape of its outputs.
+            - ``flops``: the estimated floating point operations of the ops it created.
+            - ``activation_bytes``: the size of its outputs.
+
+        The unknown dimensions, usually the batch size, count as 1, i.e. ``flops`` and ``activation_bytes`` are per
+        example. The numbers of a layer include the ones of the layers it built.
+
+    """
+
+    _columns = [
+        ('name', 'layer', 30, None, None, None),
+        ('class', 'class', 24, None, None, None),
+        ('time', 'time (ms)', 10, '.2f', 1000., sum),
+        ('n_params', 'params', 12, 'd', 1, sum),
+        ('flops', 'flops', 14, 'd', 1, sum),
+        ('activation_bytes', 'act. (KB)', 12, '.1f', 1 / 1024., sum),
+        ('output_shape', 'output shape', 20, None, None, None),
+    ]
+
+    def _record(self, layer, took, depth, ops, variables):
+        outputs = getattr(layer, 'outputs', None)
+        if isinstance(outputs, tf.Tensor):
+            shape = outputs.get_shape()
+            output_shape = shape.as_list() if shape.ndims is not None else None
+            activation_bytes = _num_elements(outputs) * outputs.dtype.size
+        else:
+            output_shape = None
+            activation_bytes = 0
+
+        self.records.append(
+            {
+                'name': layer.name,
+                'class': layer.__class__.__name__,
+                'depth': depth,
+                'time': took,
+                'n_params': _count_params(variables),
+                'output_shape': output_shape,
+                'flops': sum(_estimate_flops(op) for op in ops if not _is_initializer(op)),
+                'activation_bytes': activation_bytes,
+            }
+        )
+
+
+def _layer_classes():
+    classes, stack = [], [Layer]
+    while stack:
+        cls = stack.pop()
+        if cls not in classes:
+            classes.append(cls)
+            stack.extend(cls.__subclasses__())
+    return classes
+
+
+def _profiled_init(init, profile, building):
+    """Wrap the ``__init__`` of a layer class, only the outermost call for a layer is recorded."""
+
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        if any(layer is self for layer in building):  # __init__ of a base class
+            return init(self, *args, **kwargs)
+
+        graph = tf.get_default_graph()
+        n_ops = len(graph.get_operations())
+        variables = graph.get_collection_ref(tf.GraphKeys.GLOBAL_VARIABLES)
+        n_variables = len(variables)
+
+        building.append(self)
+        start_time = time.time()
+        try:
+            init(self, *args, **kwargs)
+        finally:
+            building.pop()
+        took = time.time() - start_time
+
+        profile._record(self, took, len(building), graph.get_operations()[n_ops:], variables[n_variables:])
+
+    return wrapper
+
+
+@contextmanager
+def profile_build(sort_by='time', top=None, print_table=True, json_path=None):
+    """A context that records the wall time, created parameters, output shape, estimated FLOPs and activation memory
+    of every layer built in it, see :class:`BuildProfile`.
+
+    It wraps the ``__init__`` of :class:`Layer` and of its subclasses defined when entering the context.
+
+    Parameters
+    ----------
+    sort_by : str or None
+        The column the table is sorted by: ``time``, ``n_params``, ``flops``, ``activation_bytes``, or None for the
+        build order.
+    top : int or None
+        If not None, only print the first `top` layers.
+    print_table : boolean
+        If True, print the table when leaving the context.
+    json_path : str or None
+        If not None, save the records as JSON to this file when leaving the context.
+
+    Examples
+    --------
+    >>> x = tf.placeholder(tf.float32, [None, 784])
+    >>> with tl.layers.profile_build(sort_by='flops', json_path='build_profile.json') as profile:
+    ...     net = tl.layers.InputLayer(x, name='input')
+    ...     net = tl.layers.DenseLayer(net, 800, act=tf.nn.relu, name='relu1')
+    ...     net = tl.layers.DenseLayer(net, 10, name='output')
+    >>> slowest = profile.sorted_records('time')[0]['name']
+
+    """
+    profile = BuildProfile()
+    building = []  # the layers being built, outermost first
+    originals = []
+    for cls in _layer_classes():
+        if '__init__' in cls.__dict__:
+            init = cls.__dict__['__init__']
+            originals.append((cls, init))
+            setattr(cls, '__init__', _profiled_init(init, profile, building))
+    try:
+        yield profile
+    finally:
+        for cls, init in originals:
+            setattr(cls, '__init__', init)
+
+    if print_table:
+        profile.print_table(sort_by, top)
+    if json_path is not None:
+        profile.to_json(json_path)
+
+
+class RunProfile(_Profile):
+    """The layers of a network run by :func:`profile_run`.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dictionary per layer, in the order of the layers of the network, and one named ``(other)`` for the ops
+        outside of the name scopes of the layers, e.g. the optimizer, with the keys:
+            - ``name``: the name scope of the outputs of the layer.
+            - ``time``: the compute time of its ops and of their gradients per step, in seconds.
+            - ``critical_time``: the compute time of its ops on the critical path per step, in seconds.
+            - ``n_ops``: the number of its ops run per step.
+            - ``allocated_bytes``: the memory allocated by its ops per step.
+            - ``peak_bytes``: the largest peak memory of one of its ops.
+    critical_path : list of tuple
+        The (layer name, time in seconds) of the consecutive parts of the critical path, i.e. of the longest chain of
+        dependent ops weighted by their compute time.
+    step_time : float
+        The wall time of a traced step, in seconds.
+
+    """
+
+    _columns = [
+        ('name', 'layer', 30, None, None, None),
+        ('time', 'time (ms)', 10, '.3f', 1000., sum),
+        ('critical_time', 'critical (ms)', 13, '.3f', 1000., sum),
+        ('n_ops', 'ops', 6, 'd', 1, sum),
+        ('allocated_bytes', 'alloc. (KB)', 12, '.1f', 1 / 1024., sum),
+        ('peak_bytes', 'peak (KB)', 12, '.1f', 1 / 1024., max),
+    ]
+
+    def __init__(self):
+        super(RunProfile, self).__init__()
+        self.critical_path = []
+        self.step_time = 0.
+
+    def print_table(self, sort_by='time', top=None):
+        super(RunProfile, self).print_table(sort_by, top)
+        logging.info("  step time: %.3f ms (traced)" % (self.step_time * 1000))
+        logging.info(
+            "  critical path: %s" %
+            ' -> '.join('%s (%.3f ms)' % (name, took * 1000) for name, took in self.critical_path)
+        )
+
+
+def _node_stats(step_stats):
+    """Yield the stats of the ops run in a step, without the ones of the GPU streams duplicated in stream:all."""
+    devices = [dev_stats.device for dev_stats in step_stats.dev_stats]
+    all_streams = set(device[:-len('/stream:all')] for device in devices if device.endswith('/stream:all'))
+    for dev_stats in step_stats.dev_stats:
+        device = dev_stats.device
+        if device.endswith('/stream:all') or ('/stream:' not in device and '/memcpy' not in device and
+                                              device not in all_streams):
+            for node_stats in dev_stats.node_stats:
+                yield node_stats
+
+
+def _layer_of(op_name, scopes):
+    """Return the longest scope of `scopes` that contains the op or its forward op, or None."""
+    names = op_name.split('/')
+    if names[0] == 'gradients' or names[0].startswith('gradients_'):
+        names = names[1:]
+    for i in range(len(names) - 1, 0, -1):
+        scope = '/'.join(names[:i])
+        if scope in scopes:
+            return scope
+    return None
+
+
+def _critical_path(graph, durations):
+    """Return the names of the ops on the longest chain of dependent ops of the graph weighted by their durations."""
+    finish = {}
+    previous = {}
+    for op in graph.get_operations():  # in the order they were created, inputs first
+        start, previous[op.name] = 0, None
+        for dep in [tensor.op for tensor in op.inputs] + list(op.control_inputs):
+            if finish.get(dep.name, 0) > start:
+                start, previous[op.name] = finish[dep.name], dep.name
+        finish[op.name] = start + durations.get(op.name, 0)
+
+    path = []
+    name = max(finish, key=finish.get) if finish else None
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+    return path[::-1]
+
+
+def profile_run(
+        sess, network, feed_dict=None, fetches=None, n_steps=5, n_warmup=1, sort_by='time', top=None, print_table=True,
+        json_path=None, chrome_trace_path=None
+):
+    """Run a network a few steps with full tracing and report the compute time and memory of its layers,
+    see :class:`RunProfile`.
+
+    The ops run are assigned to the layer whose name scope, i.e. the name scope of its outputs, is the longest prefix
+    of their name, gradients included.
+
+    Parameters
+    ----------
+    sess : Session
+        TensorFlow Session.
+    network : TensorLayer layer
+        The network.
+    feed_dict : dictionary or None
+        The feed of the steps, the noise layers are disabled unless their placeholders are in it.
+    fetches : TensorFlow expression, list of them or None
+        What to run, e.g. ``[cost, train_op]`` to profile a training step. The outputs of the network by default.
+    n_steps : int
+        The number of traced steps, the times and memory are their means.
+    n_warmup : int
+        The number of steps run before tracing.
+    sort_by : str or None
+        The column the table is sorted by: ``time``, ``critical_time``, ``n_ops``, ``allocated_bytes``, ``peak_bytes``
+        or None for the order of the layers.
+    top : int or None
+        If not None, only print the first `top` layers.
+    print_table : boolean
+        If True, print the table and the critical path.
+    json_path : str or None
+        If not None, save the records as JSON to this file.
+    chrome_trace_path : str or None
+        If not None, save the last traced step to this file in the Chrome trace format, to be opened in
+        ``chrome://tracing``.
+
+    Returns
+    --------
+    :class:`RunProfile`
+
+    Examples
+    --------
+    >>> profile = tl.layers.profile_run(sess, network, {x: X_train[:128], y_: y_train[:128]}, fetches=train_op,
+    ...                                 chrome_trace_path='train_step.json')
+    >>> slowest = profile.sorted_records('time')[0]['name']
+
+    """
+    if n_steps < 1:
+        raise ValueError("n_steps should be at least 1")
+    if fetches is None:
+        fetches = network.outputs
+    feed = dict((key, 1) for key in network.all_drop)  # disable noise layers
+    feed.update(feed_dict or {})
+
+    for _ in range(n_warmup):
+        sess.run(fetches, feed_dict=feed)
+
+    options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+    steps_stats = []
+    start_time = time.time()
+    for _ in range(n_steps):
+        run_metadata = tf.RunMetadata()
+        sess.run(fetches, feed_dict=feed, options=options, run_metadata=run_metadata)
+        steps_stats.append(run_metadata.step_stats)
+    step_time = (time.time() - start_time) / n_steps
+
+    scopes = []
+    scope_set = set()
+    for output in network.all_layers:
+        if '/' in output.op.name:
+            scope = output.op.name.rsplit('/', 1)[0]
+            if scope not in scope_set:
+                scopes.append(scope)
+                scope_set.add(scope)
+    records = dict(
+        (name, {
+            'name': name,
+            'time': 0.,
+            'critical_time': 0.,
+            'n_ops': 0,
+            'allocated_bytes': 0,
+            'peak_bytes': 0
+        }) for name in scopes + ['(other)']
+    )
+
+    durations = {}
+    for step_stats in steps_stats:
+        for node_stats in _node_stats(step_stats):
+            duration = node_stats.all_end_rel_micros / 1e6 / n_steps
+            durations[node_stats.node_name] = durations.get(node_stats.node_name, 0) + duration
+            record = records[_layer_of(node_stats.node_name, scope_set) or '(other)']
+            record['time'] += duration
+            record['n_ops'] += 1
+            for memory in node_stats.memory:
+                record['allocated_bytes'] += memory.total_bytes
+                record['peak_bytes'] = max(record['peak_bytes'], memory.peak_bytes)
+
+    profile = RunProfile()
+    profile.step_time = step_time
+    for op_name in _critical_path(sess.graph, durations):
+        name = _layer_of(op_name, scope_set) or '(other)'
+        took = durations.get(op_name, 0)
+        records[name]['critical_time'] += took
+        if profile.critical_path and profile.critical_path[-1][0] == name:
+            profile.critical_path[-1] = (name, profile.critical_path[-1][1] + took)
+        elif took > 0:
+            profile.critical_path.append((name, took))
+
+    for name in scopes + ['(other)']:
+        record = records[name]
+        record['n_ops'] //= n_steps
+        record['allocated_bytes'] //= n_steps
+        if name != '(other)' or record['n_ops'] > 0:
+            profile.records.append(record)
+
+    if print_table:
+        profile.print_table(sort_by, top)
+    if json_path is not None:
+        profile.to_json(json_path)
+    if chrome_trace_path is not None:
+        trace = timeline.Timeline(steps_stats[-1], graph=sess.graph)
+        with open(chrome_trace_path, 'w') as f:
+            f.write(trace.generate_chrome_trace_format(show_memory=True))
+
+    return profile
@@ -255,9 +255,16 @@ def list_remove_repeat(x):
 
     """
     y = []
+    seen = set()
     for i in x:
-        if i not in y:
-            y.append(i)
+        try:
+            if i in seen:
+                continue
+            seen.add(i)
+        except TypeError:  # unhashable item
+            if i in y:
+                continue
+        y.append(i)
 
     return y
 
@@ -3,13 +3,17 @@
 
 import collections
 from collections import Counter
+import itertools
+import json
+import multiprocessing
 import os
-import random
 import re
 import subprocess
 import tempfile
+import threading
 import warnings
 
+from six.moves import queue
 from six.moves import urllib
 from six.moves import xrange
 
@@ -25,10 +29,12 @@ nltk = LazyImport("nltk")
 
 __all__ = [
     'generate_skip_gram_batch',
+    'SkipGramBatchGenerator',
     'sample',
     'sample_top',
     'SimpleVocabulary',
     'Vocabulary',
+    'CompactVocabulary',
     'process_sentence',
     'create_vocab',
     'simple_read_words',
@@ -37,6 +43,8 @@ __all__ = [
     'build_vocab',
     'build_reverse_dictionary',
     'build_words_dataset',
+    'count_words',
+    'encode_words',
     'words_to_word_ids',
     'word_ids_to_words',
     'save_vocab',
@@ -45,6 +53,7 @@ __all__ = [
     'initialize_vocabulary',
     'sentence_to_token_ids',
     'data_to_token_ids',
+    'load_token_ids',
     'moses_multi_bleu',
 ]
 
@@ -56,8 +65,8 @@ def generate_skip_gram_batch(data, batch_size, num_skips, skip_window, data_inde
 
     Parameters
     ----------
-    data : list of data
-        To present context, usually a list of integers.
+    data : list of data or numpy.array
+        To present context, usually a list of integers. An int32 array is the fastest, the windows are views of it.
     batch_size : int
         Batch size to return.
     num_skips : int
@@ -69,10 +78,10 @@ def generate_skip_gram_batch(data, batch_size, num_skips, skip_window, data_inde
 
     Returns
     -------
-    batch : list of data
-        Inputs.
-    labels : list of data
-        Labels
+    batch : numpy.array
+        Inputs, int32 array of shape [batch_size].
+    labels : numpy.array
+        Labels, int32 array of shape [batch_size, 1]
     data_index : int
         Index of the context location.
 
@@ -104,27 +113,137 @@ def generate_skip_gram_batch(data, batch_size, num_skips, skip_window, data_inde
         raise Exception("batch_size should be able to be divided by num_skips.")
     if num_skips > 2 * skip_window:
         raise Exception("num_skips <= 2 * skip_window")
-    batch = np.ndarray(shape=(batch_size), dtype=np.int32)
-    labels = np.ndarray(shape=(batch_size, 1), dtype=np.int32)
     span = 2 * skip_window + 1  # [ skip_window target skip_window ]
-    buffer = collections.deque(maxlen=span)
-    for _ in range(span):
-        buffer.append(data[data_index])
-        data_index = (data_index + 1) % len(data)
-    for i in range(batch_size // num_skips):
-        target = skip_window  # target label at the center of the buffer
-        targets_to_avoid = [skip_window]
-        for j in range(num_skips):
-            while target in targets_to_avoid:
-                target = random.randint(0, span - 1)
-            targets_to_avoid.append(target)
-            batch[i * num_skips + j] = buffer[skip_window]
-            labels[i * num_skips + j, 0] = buffer[target]
-        buffer.append(data[data_index])
-        data_index = (data_index + 1) % len(data)
+    n_targets = batch_size // num_skips
+
+    # the words of all the windows, the window of the i-th target is words[i:i + span]
+    n_words = n_targets + span - 1
+    if isinstance(data, np.ndarray):
+        if data_index + n_words <= len(data):
+            words = data[data_index:data_index + n_words]
+        else:
+            words = data.take(np.arange(data_index, data_index + n_words), mode='wrap')
+    else:
+        words = [data[idx % len(data)] for idx in range(data_index, data_index + n_words)]
+    words = np.ascontiguousarray(words, dtype=np.int32)
+    windows = np.lib.stride_tricks.as_strided(
+        words, shape=(n_targets, span), strides=(words.strides[0], words.strides[0]), writeable=False
+    )
+
+    # sample num_skips different context words of each target
+    context = np.argsort(np.random.random_sample((n_targets, 2 * skip_window)), axis=1)[:, :num_skips]
+    context += context >= skip_window  # skip the target at the center
+
+    batch = np.repeat(windows[:, skip_window], num_skips)
+    labels = windows[np.arange(n_targets)[:, None], context].reshape(batch_size, 1)
+    data_index = (data_index + span + n_targets) % len(data)
     return batch, labels, data_index
 
 
+class SkipGramBatchGenerator(object):
+    """Iterate over the training batches for the Skip-Gram model, see ``tl.nlp.generate_skip_gram_batch``.
+
+    The batches are generated from ``data_index`` onwards in the same way as successive calls of
+    ``tl.nlp.generate_skip_gram_batch``, optionally in a background thread.
+
+    Parameters
+    ----------
+    data : numpy.array
+        The corpus as word ids, usually an int32 array, a list is converted.
+    batch_size : int
+        Batch size to return.
+    num_skips : int
+        How many times to reuse an input to generate a label.
+    skip_window : int
+        How many words to consider left and right.
+    data_index : int
+        Index of the context location to start from.
+    prefetch : int
+        The number of batches to generate in advance in a background thread. If 0, generate the batches when requested.
+
+    Attributes
+    ----------
+    data_index : int
+        Index of the context location after the last returned batch, which can be used to resume.
+
+    Examples
+    --------
+    >>> batches = tl.nlp.SkipGramBatchGenerator(data, batch_size=128, num_skips=2, skip_window=1, prefetch=8)
+    >>> for step in range(num_steps):
+    >>>     batch_inputs, batch_labels = next(batches)
+    >>>     ...
+    >>> data_index = batches.data_index
+    >>> batches.close()
+
+    """
+
+    def __init__(self, data, batch_size, num_skips, skip_window, data_index=0, prefetch=0):
+        if batch_size % num_skips != 0:
+            raise Exception("batch_size should be able to be divided by num_skips.")
+        if num_skips > 2 * skip_window:
+            raise Exception("num_skips <= 2 * skip_window")
+        self.data = data if isinstance(data, np.ndarray) else np.asarray(data, dtype=np.int32)
+        self.batch_size = batch_size
+        self.num_skips = num_skips
+        self.skip_window = skip_window
+        self.data_index = data_index
+        self.prefetch = prefetch
+
+        self._next_index = data_index
+        self._queue = None
+        self._stop = threading.Event()
+        if prefetch > 0:
+            self._queue = queue.Queue(maxsize=prefetch)
+            self._thread = threading.Thread(target=self._prefetch_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _generate(self):
+        batch, labels, self._next_index = generate_skip_gram_batch(
+            self.data, self.batch_size, self.num_skips, self.skip_window, self._next_index
+        )
+        return batch, labels, self._next_index
+
+    def _put(self, item):
+        """Put an item into the queue, giving up if the generator is closed while the queue is full."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _prefetch_loop(self):
+        try:
+            while not self._stop.is_set():
+                self._put(self._generate())
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._queue is None:
+            result = self._generate()
+        else:
+            if self._stop.is_set():
+                raise StopIteration
+            result = self._queue.get()
+            if isinstance(result, Exception):
+                raise result
+        batch, labels, self.data_index = result
+        return batch, labels
+
+    next = __next__  # Python 2
+
+    def close(self):
+        """Stop the background thread."""
+        if self._queue is not None and not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+
 def sample(a=None, temperature=1.0):
     """Sample an index from a probability array.
 
@@ -332,6 +451,240 @@ class Vocabulary(object):
             return self.reverse_vocab[word_id]
 
 
+_FNV_OFFSET = np.uint64(14695981039346656037)
+_FNV_PRIME = np.uint64(1099511628211)
+
+
+def _padded_lengths(codes):
+    """Returns the lengths of the rows of a zero-padded matrix."""
+    if codes.shape[1] == 0:
+        return np.zeros(len(codes), dtype=np.int64)
+    nonzero = codes[:, ::-1] != 0
+    return np.where(nonzero.any(axis=1), codes.shape[1] - np.argmax(nonzero, axis=1), 0).astype(np.int64)
+
+
+def _words_to_byte_matrix(words):
+    """Encode the words into a zero-padded uint8 matrix of UTF-8 bytes, and return it with the lengths of the words."""
+    words = np.asarray(words).reshape(-1)
+    if words.dtype.kind == 'U' and words.dtype.itemsize > 0:
+        codes = words.view(np.uint32).reshape(len(words), -1)
+        if codes.max() < 128:  # ASCII, the UTF-32 code units are the bytes
+            return codes.astype(np.uint8), _padded_lengths(codes)
+        words = np.char.encode(words, 'utf-8')
+    elif words.dtype.kind == 'U':
+        words = words.astype(bytes)
+    elif words.dtype.kind != 'S':
+        words = np.array([w if isinstance(w, bytes) else w.encode('utf-8') for w in words], dtype=bytes)
+    matrix = words.view(np.uint8).reshape(len(words), words.dtype.itemsize)
+    return matrix, _padded_lengths(matrix)
+
+
+def _fnv1a_hash(matrix, lengths):
+    """64-bit FNV-1a hash of every row of a byte matrix, vectorized over the rows."""
+    h = np.full(len(matrix), _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for col in range(matrix.shape[1]):
+            valid = col < lengths
+            h[valid] = (h[valid] ^ matrix[valid, col].astype(np.uint64)) * _FNV_PRIME
+    return h
+
+
+class CompactVocabulary(object):
+    """A vocabulary stored in a few flat arrays, which can be saved into a single file and memory-mapped.
+
+    The words are stored as UTF-8 bytes in one buffer with an offsets array, and the IDs are indexed by an
+    open-addressing hash table of their FNV-1a hash, so that a vocabulary of millions of words costs a few bytes per
+    word instead of two Python objects, and can be shared by processes through the page cache by loading it with
+    ``mmap=True``.
+    ``words_to_ids`` and ``ids_to_words`` convert whole arrays.
+
+    Parameters
+    -----------
+    words : list of str or byte
+        The words, the ID of a word is its index. The words should be unique.
+    unk_word : str, byte or None
+        Special word denoting unknown words, appended to the words if missing.
+        If None, unknown words are converted to -1.
+
+    Attributes
+    ------------
+    unk_id : int
+        For unknown ID, -1 if there is no ``unk_word``.
+
+    Examples
+    -------------
+    >>> vocab = tl.nlp.CompactVocabulary.from_file('vocab.txt', unk_word='<UNK>')
+    >>> vocab.save('vocab.bin')
+    >>> vocab = tl.nlp.CompactVocabulary.load('vocab.bin')  # e.g. in each worker
+    >>> ids = vocab.words_to_ids([['the', 'cat'], ['a', 'dog']])
+    >>> print(ids.dtype, ids.shape)
+    int32 (2, 2)
+    >>> vocab.ids_to_words(ids[0])
+    ['the', 'cat']
+
+    """
+
+    _MAGIC = b'TLVOCAB1'
+    _ALIGNMENT = 64
+
+    def __init__(self, words, unk_word=None):
+        words = list(words)
+        if unk_word is not None and unk_word not in words:
+            words.append(unk_word)
+        self.binary = len(words) > 0 and isinstance(words[0], bytes)
+
+        matrix, lengths = _words_to_byte_matrix(words)
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        valid = np.arange(matrix.shape[1]) < lengths[:, None]
+        self._buffer = matrix[valid]
+        self._offsets = offsets
+        self._table = self._build_table(_fnv1a_hash(matrix, lengths))
+        self.unk_id = -1 if unk_word is None else words.index(unk_word)
+
+    @staticmethod
+    def _build_table(hashes):
+        """Insert the IDs into a hash table with linear probing, vectorized over the IDs waiting for a slot."""
+        size = 1
+        while size < 2 * len(hashes):
+            size *= 2
+        table = np.full(size, -1, dtype=np.int64 if len(hashes) >= 2**31 else np.int32)
+        pending = np.arange(len(hashes))
+        slots = (hashes & np.uint64(size - 1)).astype(np.int64)
+        while len(pending) > 0:
+            free = table[slots] < 0
+            # among the ids probing the same free slot, the first one takes it
+            _, first = np.unique(slots[free], return_index=True)
+            inserted = np.flatnonzero(free)[first]
+            table[slots[inserted]] = pending[inserted]
+            waiting = np.ones(len(pending), dtype=bool)
+            waiting[inserted] = False
+            pending = pending[waiting]
+            slots = (slots[waiting] + 1) & (size - 1)
+        return table
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __contains__(self, word):
+        return self._lookup([word])[0] >= 0
+
+    def _lookup(self, words, batch_size=65536):
+        """Returns the IDs of a list of words, -1 for unknown words, by batches to bound the temporary arrays."""
+        matrix, lengths = _words_to_byte_matrix(words)
+        ids = np.full(len(lengths), -1, dtype=np.int64)
+        mask = len(self._table) - 1
+        for batch_start in range(0, len(lengths), batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            batch_lengths = lengths[batch]
+            batch_matrix = matrix[batch, :batch_lengths.max() if len(batch_lengths) > 0 else 0]
+            batch_ids = ids[batch]
+            columns = np.arange(batch_matrix.shape[1])
+            slots = (_fnv1a_hash(batch_matrix, batch_lengths) & np.uint64(mask)).astype(np.int64)
+            pending = np.arange(len(batch_lengths))
+            while len(pending) > 0:
+                candidates = self._table[slots].astype(np.int64)
+                found = np.flatnonzero(candidates >= 0)
+                # compare the bytes of the candidates with the words
+                starts = self._offsets[candidates[found]]
+                same = self._offsets[candidates[found] + 1] - starts == batch_lengths[pending[found]]
+                if len(self._buffer) > 0:
+                    positions = np.minimum(starts[:, None] + columns, len(self._buffer) - 1)
+                    in_word = columns < batch_lengths[pending[found], None]
+                    same &= np.all((self._buffer[positions] == batch_matrix[pending[found]]) | ~in_word, axis=1)
+                batch_ids[pending[found[same]]] = candidates[found[same]]
+                # probe the next slot for the others, the words reaching an empty slot are unknown
+                probing = found[~same]
+                pending = pending[probing]
+                slots = (slots[probing] + 1) & mask
+        return ids
+
+    def words_to_ids(self, words):
+        """Returns the int32 IDs of an array or nested list of words, with the same shape."""
+        ids = self._lookup(words)
+        ids[ids < 0] = self.unk_id
+        return ids.astype(np.int32).reshape(np.shape(words))
+
+    def ids_to_words(self, ids):
+        """Returns the words of an array of IDs, as a list for 1-D IDs or an object array otherwise."""
+        ids = np.asarray(ids)
+        words = [self.id_to_word(word_id) for word_id in ids.ravel().tolist()]
+        if ids.ndim == 1:
+            return words
+        result = np.empty(len(words), dtype=object)
+        result[:] = words
+        return result.reshape(ids.shape)
+
+    def word_to_id(self, word):
+        """Returns the integer word id of a word string."""
+        return int(self.words_to_ids([word])[0])
+
+    def id_to_word(self, word_id):
+        """Returns the word string of an integer word id."""
+        if not 0 <= word_id < len(self):
+            if self.unk_id < 0:
+                raise IndexError("word id %d out of range" % word_id)
+            word_id = self.unk_id
+        word = self._buffer[self._offsets[word_id]:self._offsets[word_id + 1]].tobytes()
+        return word if self.binary else word.decode('utf-8')
+
+    @classmethod
+    def from_file(cls, vocab_file, unk_word=None):
+        """Create the vocabulary from a file with a word per line, e.g. of ``tl.nlp.create_vocab``,
+        where the words are the first whitespace-separated token on each line."""
+        with tf.gfile.GFile(vocab_file, mode="r") as f:
+            words = [line.split()[0] for line in f if line.strip()]
+        return cls(words, unk_word=unk_word)
+
+    def save(self, path):
+        """Save the vocabulary into a single binary file, see ``CompactVocabulary.load``."""
+        arrays = [('buffer', self._buffer), ('offsets', self._offsets), ('table', self._table)]
+        header = {'binary': self.binary, 'unk_id': self.unk_id, 'arrays': []}
+        offset = 0
+        for name, array in arrays:
+            header['arrays'].append([name, array.dtype.str, len(array), offset])
+            offset += -(-array.nbytes // self._ALIGNMENT) * self._ALIGNMENT
+        header = json.dumps(header).encode('utf-8')
+        header += b' ' * (-(len(self._MAGIC) + 8 + len(header)) % self._ALIGNMENT)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self._MAGIC)
+            f.write(np.array(len(header), dtype='<u8').tobytes())
+            f.write(header)
+            for _, array in arrays:
+                array.tofile(f)
+                f.write(b'\0' * (-array.nbytes % self._ALIGNMENT))
+        os.rename(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a vocabulary saved by ``CompactVocabulary.save``.
+
+        Parameters
+        -----------
+        path : str
+            The file of the vocabulary.
+        mmap : boolean
+            If True (default), the arrays are read-only memory maps of the file, shared by the processes loading it.
+
+        """
+        data = np.memmap(path, dtype=np.uint8, mode='r') if mmap else np.fromfile(path, dtype=np.uint8)
+        if data[:len(cls._MAGIC)].tobytes() != cls._MAGIC:
+            raise ValueError("%s is not a CompactVocabulary file" % path)
+        header_start = len(cls._MAGIC) + 8
+        header_size = int(data[len(cls._MAGIC):header_start].view('<u8')[0])
+        header = json.loads(data[header_start:header_start + header_size].tobytes().decode('utf-8'))
+
+        vocab = cls.__new__(cls)
+        vocab.binary = header['binary']
+        vocab.unk_id = header['unk_id']
+        data_start = header_start + header_size
+        for name, dtype, count, offset in header['arrays']:
+            dtype = np.dtype(dtype)
+            start = data_start + offset
+            setattr(vocab, '_' + name, data[start:start + count * dtype.itemsize].view(dtype))
+        return vocab
+
+
 def process_sentence(sentence, start_word="<S>", end_word="</S>"):
     """Seperate a sentence string into a list of string words, add start_word and end_word,
     see ``create_vocab()`` and ``tutorial_tfrecord3.py``.
@@ -678,32 +1031,197 @@ def build_words_dataset(words=None, vocabulary_size=50000, printable=True, unk_k
     if words is None:
         raise Exception("words : list of str or byte")
 
+    counter = collections.Counter(words)
     count = [[unk_key, -1]]
-    count.extend(collections.Counter(words).most_common(vocabulary_size - 1))
+    count.extend(counter.most_common(vocabulary_size - 1))
     dictionary = dict()
     for word, _ in count:
         dictionary[word] = len(dictionary)
-    data = list()
-    unk_count = 0
-    for word in words:
-        if word in dictionary:
-            index = dictionary[word]
-        else:
-            index = 0  # dictionary['UNK']
-            unk_count += 1
-        data.append(index)
-    count[0][1] = unk_count
+    data = np.fromiter(map(dictionary.get, words, itertools.repeat(0)), dtype=np.int32, count=len(words))  # 0 is UNK
+    count[0][1] = len(words) - sum(counter[word] for word in dictionary if word in counter)
+    data = data.tolist()
     reverse_dictionary = dict(zip(dictionary.values(), dictionary.keys()))
     if printable:
-        tl.logging.info('Real vocabulary size    %d' % len(collections.Counter(words).keys()))
+        tl.logging.info('Real vocabulary size    %d' % len(counter))
         tl.logging.info('Limited vocabulary size {}'.format(vocabulary_size))
-    if len(collections.Counter(words).keys()) < vocabulary_size:
+    if len(counter) < vocabulary_size:
         raise Exception(
             "len(collections.Counter(words).keys()) >= vocabulary_size , the limited vocabulary_size must be less than or equal to the read vocabulary_size"
         )
     return data, count, dictionary, reverse_dictionary
 
 
+def _read_text_chunks(filenames, chunk_size, replace):
+    """Yield the text of the files in chunks of about ``chunk_size`` characters, without splitting a word."""
+    for filename in filenames:
+        tail = ''
+        with tf.gfile.GFile(filename, "r") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                chunk = tail + chunk + f.readline()
+                if replace:
+                    chunk = chunk.replace(*replace)
+                # the last word may continue in the next chunk if a line break is replaced
+                split = len(chunk.rstrip())
+                split = max(chunk.rfind(' ', 0, split), chunk.rfind('\n', 0, split), chunk.rfind('\t', 0, split)) + 1
+                chunk, tail = chunk[:split], chunk[split:]
+                yield chunk
+        if tail:
+            yield tail
+
+
+def _split_words_chunk(chunk):
+    return chunk if isinstance(chunk, list) else chunk.split()
+
+
+def _count_words_chunk(chunk):
+    return collections.Counter(_split_words_chunk(chunk))
+
+
+_encoder_word_to_id = None
+_encoder_unk_id = None
+
+
+def _init_words_encoder(word_to_id, unk_id):
+    global _encoder_word_to_id, _encoder_unk_id
+    _encoder_word_to_id = word_to_id
+    _encoder_unk_id = unk_id
+
+
+def _encode_words_chunk(chunk):
+    words = _split_words_chunk(chunk)
+    return np.fromiter(
+        map(_encoder_word_to_id.get, words, itertools.repeat(_encoder_unk_id)), dtype=np.int32, count=len(words)
+    )
+
+
+def _imap_processes(fn, tasks, num_workers, initializer=None, initargs=()):
+    """Apply ``fn`` to the tasks in order, in a pool of ``num_workers`` processes if it is larger than 1."""
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if num_workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield fn(task)
+        return
+
+    pool = multiprocessing.Pool(num_workers, initializer=initializer, initargs=initargs)
+    try:
+        for result in pool.imap(fn, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _map_words_chunks(fn, words, filenames, replace, num_workers, chunk_size, initializer=None, initargs=()):
+    """Apply ``fn`` to the chunks of the words or of the files, see ``_imap_processes``."""
+    if replace is None:
+        replace = ['\n', '<eos>']
+    if filenames is not None:
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        chunks = _read_text_chunks(filenames, chunk_size, replace)
+    else:
+        chunks = (words[i:i + chunk_size] for i in range(0, len(words), chunk_size))
+    return _imap_processes(fn, chunks, num_workers, initializer, initargs)
+
+
+def count_words(words=None, filenames=None, replace=None, num_workers=None, chunk_size=2**22):
+    """Count the occurrence of the words of a list or of text files, in parallel over chunks.
+
+    The files are read in chunks, so that the words are never held in memory at once.
+
+    Parameters
+    ----------
+    words : list of str or byte
+        The context in list format.
+    filenames : str or list of str
+        The text files to count the words of, if ``words`` is None. The words are split using space, as
+        ``tl.nlp.read_words``.
+    replace : list of str
+        Replace original string by target string when reading the files, default is ``['\\n', '<eos>']``.
+    num_workers : int or None
+        The number of processes to count the chunks, the counters are merged in the main process.
+        If None, use the number of CPUs. If 1, count in the current process.
+    chunk_size : int
+        The number of words, or of characters for the files, of a chunk.
+
+    Returns
+    --------
+    collections.Counter
+        The occurrence number of each word.
+
+    Examples
+    --------
+    >>> counter = tl.nlp.count_words(filenames=['train.txt'], num_workers=8)
+    >>> word_to_id = {word: idx for idx, (word, _) in enumerate(counter.most_common(50000))}
+    >>> data = tl.nlp.encode_words(filenames=['train.txt'], word_to_id=word_to_id, unk_key='<unk>')
+
+    """
+    if words is None and filenames is None:
+        raise Exception("words or filenames should be given")
+    counter = collections.Counter()
+    for chunk_counter in _map_words_chunks(_count_words_chunk, words, filenames, replace, num_workers, chunk_size):
+        counter.update(chunk_counter)
+    return counter
+
+
+def encode_words(
+        words=None, word_to_id=None, filenames=None, unk_key='UNK', replace=None, num_workers=1, chunk_size=2**22
+):
+    """Convert the words of a list or of text files to a contiguous int32 array of IDs.
+
+    Parameters
+    ----------
+    words : list of str or byte
+        The context in list format.
+    word_to_id : a dictionary
+        that maps word to ID.
+    filenames : str or list of str
+        The text files to encode, if ``words`` is None. They are read in chunks, see ``tl.nlp.count_words``.
+    unk_key : str
+        Represent the unknown words, if None, unknown words raise a KeyError.
+    replace : list of str
+        Replace original string by target string when reading the files, default is ``['\\n', '<eos>']``.
+    num_workers : int or None
+        The number of processes to encode the chunks, each of them receives a copy of ``word_to_id``.
+        If None, use the number of CPUs. If 1 (default), encode in the current process.
+    chunk_size : int
+        The number of words, or of characters for the files, of a chunk.
+
+    Returns
+    --------
+    numpy.array
+        The int32 IDs of the context.
+
+    Examples
+    --------
+    - See ``tl.nlp.count_words``
+
+    """
+    if words is None and filenames is None:
+        raise Exception("words or filenames should be given")
+    if word_to_id is None:
+        raise Exception("word_to_id : a dictionary")
+    unk_id = -1 if unk_key is None else word_to_id[unk_key]
+    ids = list(
+        _map_words_chunks(
+            _encode_words_chunk, words, filenames, replace, num_workers, chunk_size, _init_words_encoder,
+            (word_to_id, unk_id)
+        )
+    )
+    _init_words_encoder(None, None)  # release word_to_id if encoded in the current process
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32)
+    if unk_key is None and np.any(ids < 0):
+        raise KeyError("unknown words and unk_key is None")
+    return ids
+
+
 def words_to_word_ids(data=None, word_to_id=None, unk_key='UNK'):
     """Convert a list of string (words) to IDs.
 
@@ -751,12 +1269,10 @@ def words_to_word_ids(data=None, word_to_id=None, unk_key='UNK'):
     #     return [word_to_id[str(word)] for word in data]
     # else:
 
-    word_ids = []
-    for word in data:
-        if word_to_id.get(word) is not None:
-            word_ids.append(word_to_id[word])
-        else:
-            word_ids.append(word_to_id[unk_key])
+    unk_id = word_to_id[unk_key] if unk_key in word_to_id else None
+    word_ids = list(map(word_to_id.get, data, itertools.repeat(unk_id)))
+    if unk_id is None and None in word_ids:
+        raise KeyError(unk_key)
     return word_ids
     # return [word_to_id[word] for word in data]    # this one
 
@@ -870,9 +1386,61 @@ def basic_tokenizer(sentence, _WORD_SPLIT=re.compile(b"([.,!?\"':;)(])")):
     return [w for w in words if w]
 
 
+def _split_lines_into_shards(data_path, num_shards):
+    """Split a file into byte ranges of about the same size, starting at the beginning of a line."""
+    with gfile.GFile(data_path, mode="rb") as f:
+        size = f.size()
+        bounds = [0]
+        for i in range(1, num_shards):
+            f.seek(max(size * i // num_shards - 1, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _read_shard_lines(data_path, start, end):
+    with gfile.GFile(data_path, mode="rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def _shard_tokens(data_path, start, end, tokenizer, normalize_digits, _DIGIT_RE):
+    """Yield the tokens of each line of a byte range of the file."""
+    digit_sub = re.compile(_DIGIT_RE).sub
+    for line in _read_shard_lines(data_path, start, end):
+        tokens = tokenizer(line) if tokenizer else basic_tokenizer(line)
+        if normalize_digits:
+            tokens = [digit_sub(b"0", w) for w in tokens]
+        yield tokens
+
+
+def _count_shard_tokens(args):
+    counter = collections.Counter()
+    for tokens in _shard_tokens(*args):
+        counter.update(tokens)
+    return counter
+
+
+def _shard_token_ids(args):
+    """Return the int32 token ids of the lines of a byte range of the file, and the number of tokens of each line."""
+    ids = []
+    lengths = []
+    for tokens in _shard_tokens(*args):
+        ids.extend(map(_encoder_word_to_id.get, tokens, itertools.repeat(_encoder_unk_id)))
+        lengths.append(len(tokens))
+    return np.asarray(ids, dtype=np.int32), np.asarray(lengths, dtype=np.int64)
+
+
 def create_vocabulary(
         vocabulary_path, data_path, max_vocabulary_size, tokenizer=None, normalize_digits=True,
-        _DIGIT_RE=re.compile(br"\d"), _START_VOCAB=None
+        _DIGIT_RE=re.compile(br"\d"), _START_VOCAB=None, num_workers=1
 ):
     r"""Create vocabulary file (if it does not exist yet) from data file.
 
@@ -898,6 +1466,10 @@ def create_vocabulary(
         Default is ``re.compile(br"\d")``.
     _START_VOCAB : list of str
         The pad, go, eos and unk token, default is ``[b"_PAD", b"_GO", b"_EOS", b"_UNK"]``.
+    num_workers : int or None
+        If larger than 1, split the data file into byte ranges of whole lines and count their tokens in as many
+        processes, the ``tokenizer`` should then be picklable, e.g. a module-level function. If None, use the number
+        of CPUs.
 
     References
     ----------
@@ -908,26 +1480,37 @@ def create_vocabulary(
         _START_VOCAB = [b"_PAD", b"_GO", b"_EOS", b"_UNK"]
     if not gfile.Exists(vocabulary_path):
         tl.logging.info("Creating vocabulary %s from data %s" % (vocabulary_path, data_path))
-        vocab = {}
-        with gfile.GFile(data_path, mode="rb") as f:
-            counter = 0
-            for line in f:
-                counter += 1
-                if counter % 100000 == 0:
-                    tl.logging.info("  processing line %d" % counter)
-                tokens = tokenizer(line) if tokenizer else basic_tokenizer(line)
-                for w in tokens:
-                    word = re.sub(_DIGIT_RE, b"0", w) if normalize_digits else w
-                    if word in vocab:
-                        vocab[word] += 1
-                    else:
-                        vocab[word] = 1
-            vocab_list = _START_VOCAB + sorted(vocab, key=vocab.get, reverse=True)
-            if len(vocab_list) > max_vocabulary_size:
-                vocab_list = vocab_list[:max_vocabulary_size]
-            with gfile.GFile(vocabulary_path, mode="wb") as vocab_file:
-                for w in vocab_list:
-                    vocab_file.write(w + b"\n")
+        if num_workers is None or num_workers > 1:
+            # the counters are merged in the order of the shards, so the ties are sorted as in a single process
+            vocab = collections.Counter()
+            shards = [
+                (data_path, start, end, tokenizer, normalize_digits, _DIGIT_RE)
+                for start, end in _split_lines_into_shards(data_path, num_workers or multiprocessing.cpu_count())
+            ]
+            for i, shard_counter in enumerate(_imap_processes(_count_shard_tokens, shards, num_workers)):
+                tl.logging.info("  processed shard %d/%d" % (i + 1, len(shards)))
+                vocab.update(shard_counter)
+        else:
+            vocab = {}
+            with gfile.GFile(data_path, mode="rb") as f:
+                counter = 0
+                for line in f:
+                    counter += 1
+                    if counter % 100000 == 0:
+                        tl.logging.info("  processing line %d" % counter)
+                    tokens = tokenizer(line) if tokenizer else basic_tokenizer(line)
+                    for w in tokens:
+                        word = re.sub(_DIGIT_RE, b"0", w) if normalize_digits else w
+                        if word in vocab:
+                            vocab[word] += 1
+                        else:
+                            vocab[word] = 1
+        vocab_list = _START_VOCAB + sorted(vocab, key=vocab.get, reverse=True)
+        if len(vocab_list) > max_vocabulary_size:
+            vocab_list = vocab_list[:max_vocabulary_size]
+        with gfile.GFile(vocabulary_path, mode="wb") as vocab_file:
+            for w in vocab_list:
+                vocab_file.write(w + b"\n")
     else:
         tl.logging.info("Vocabulary %s from data %s exists" % (vocabulary_path, data_path))
 
@@ -1016,7 +1599,7 @@ def sentence_to_token_ids(
 
 def data_to_token_ids(
         data_path, target_path, vocabulary_path, tokenizer=None, normalize_digits=True, UNK_ID=3,
-        _DIGIT_RE=re.compile(br"\d")
+        _DIGIT_RE=re.compile(br"\d"), num_workers=1, file_format='text'
 ):
     """Tokenize data file and turn into token-ids using given vocabulary file.
 
@@ -1036,13 +1619,46 @@ def data_to_token_ids(
         A function to use to tokenize each sentence. If None, ``basic_tokenizer`` will be used.
     normalize_digits : boolean
         If true, all digits are replaced by 0.
+    num_workers : int or None
+        If larger than 1, split the data file into byte ranges of whole lines and tokenize them in as many processes,
+        the ``tokenizer`` should then be picklable, e.g. a module-level function. If None, use the number of CPUs.
+    file_format : str
+        The format of the token-ids file:
+            - `text`, one line of space separated token-ids per sentence;
+            - `npy`, the token-ids of all the sentences as an int32 `.npy` array in ``target_path``, and the offsets
+              of the sentences in this array as an int64 `.npy` array in ``target_path + '.offsets'``,
+              see ``tl.nlp.load_token_ids``.
+
+    Examples
+    --------
+    >>> tl.nlp.data_to_token_ids('train.en', 'train.ids.npy', 'vocab.en', num_workers=8, file_format='npy')
+    >>> ids, offsets = tl.nlp.load_token_ids('train.ids.npy')
+    >>> sentence = ids[offsets[10]:offsets[11]]
 
     References
     ----------
     - Code from ``/tensorflow/models/rnn/translation/data_utils.py``
 
     """
-    if not gfile.Exists(target_path):
+    if file_format not in ['text', 'npy']:
+        raise ValueError("file_format should be text or npy, but got %s" % file_format)
+    if not gfile.Exists(target_path) and (file_format == 'npy' or num_workers is None or num_workers > 1):
+        tl.logging.info("Tokenizing data in %s" % data_path)
+        vocab, _ = initialize_vocabulary(vocabulary_path)
+        shards = [
+            (data_path, start, end, tokenizer, normalize_digits, _DIGIT_RE)
+            for start, end in _split_lines_into_shards(data_path, num_workers or multiprocessing.cpu_count())
+        ]
+        results = _imap_processes(_shard_token_ids, shards, num_workers, _init_words_encoder, (vocab, UNK_ID))
+        if file_format == 'text':
+            with gfile.GFile(target_path, mode="w") as tokens_file:
+                for ids, lengths in results:
+                    for line_ids in np.split(ids, np.cumsum(lengths)[:-1]):
+                        tokens_file.write(" ".join([str(tok) for tok in line_ids]) + "\n")
+        else:
+            _write_token_ids(target_path, results)
+        _init_words_encoder(None, None)
+    elif not gfile.Exists(target_path):
         tl.logging.info("Tokenizing data in %s" % data_path)
         vocab, _ = initialize_vocabulary(vocabulary_path)
         with gfile.GFile(data_path, mode="rb") as data_file:
@@ -1060,6 +1676,55 @@ def data_to_token_ids(
         tl.logging.info("Target path %s exists" % target_path)
 
 
+def _write_token_ids(target_path, results):
+    """Write the (ids, lengths) of the shards into the `.npy` files of token-ids and offsets."""
+    # the ids are appended to a raw file first, as their number is only known at the end
+    lengths = []
+    with open(target_path + '.tmp', 'wb') as f:
+        for ids, shard_lengths in results:
+            ids.tofile(f)
+            lengths.append(shard_lengths)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    ids = np.lib.format.open_memmap(target_path + '.npy.tmp', mode='w+', dtype=np.int32, shape=(int(offsets[-1]), ))
+    if len(ids) > 0:
+        ids[:] = np.memmap(target_path + '.tmp', dtype=np.int32, mode='r')
+    ids.flush()
+    del ids
+    os.remove(target_path + '.tmp')
+    with open(target_path + '.offsets', 'wb') as f:
+        np.save(f, offsets)
+    os.rename(target_path + '.npy.tmp', target_path)
+
+
+def load_token_ids(target_path, mmap=True):
+    """Load the token-ids saved by ``tl.nlp.data_to_token_ids`` with ``file_format='npy'``.
+
+    Parameters
+    -----------
+    target_path : str
+        Path of the token-ids file.
+    mmap : boolean
+        If True (default), return read-only memory maps of the files, otherwise read them into memory.
+
+    Returns
+    --------
+    ids : numpy.array
+        The int32 token-ids of all the sentences.
+    offsets : numpy.array
+        The int64 offsets of the sentences in ``ids``, the i-th sentence is ``ids[offsets[i]:offsets[i + 1]]``.
+
+    Examples
+    --------
+    - See ``tl.nlp.data_to_token_ids``
+
+    """
+    mmap_mode = 'r' if mmap else None
+    return np.load(target_path, mmap_mode=mmap_mode), np.load(target_path + '.offsets', mmap_mode=mmap_mode)
+
+
 def moses_multi_bleu(hypotheses, references, lowercase=False):
     """Calculate the bleu score for hypotheses and references
     using the MOSES ulti-bleu.perl script.
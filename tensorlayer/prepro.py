@@ -1,11 +1,16 @@
 #! /usr/bin/python
 # -*- coding: utf-8 -*-
 
+import atexit
 import copy
 
+import multiprocessing
+import numbers
 import threading
 import time
 
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 
 import tensorlayer as tl
@@ -30,6 +35,7 @@ from skimage.morphology import binary_erosion as _binary_erosion
 from six.moves import range
 from tensorlayer.lazy_imports import LazyImport
 import PIL
+import PIL.ImageEnhance
 cv2 = LazyImport("cv2")
 import math
 import random
@@ -39,6 +45,7 @@ import random
 
 __all__ = [
     'threading_data',
+    'Compose',
     'affine_rotation_matrix',
     'affine_horizontal_flip_matrix',
     'affine_shift_matrix',
@@ -49,6 +56,10 @@ __all__ = [
     'affine_transform',
     'affine_transform_cv2',
     'affine_transform_keypoints',
+    'affine_batch_matrices',
+    'affine_transform_batch',
+    'affine_transform_keypoints_batch',
+    'affine_transform_boxes_batch',
     'projective_transform_by_points',
     'rotation',
     'rotation_multi',
@@ -121,7 +132,7 @@ __all__ = [
 ]
 
 
-def threading_data(data=None, fn=None, thread_count=None, **kwargs):
+def threading_data(data=None, fn=None, thread_count=None, backend=None, chunk_size=None, **kwargs):
     """Process a batch of data by given function by threading.
 
     Usually be used for data augmentation.
@@ -132,8 +143,20 @@ def threading_data(data=None, fn=None, thread_count=None, **kwargs):
         The data to be processed.
     thread_count : int
         The number of threads to use.
+        With a ``backend``, the number of workers in the pool, default is the number of CPUs.
     fn : function
         The function for data processing.
+    backend : None or str
+        The executor used to run ``fn``.
+            - None (default), start new threads on every call.
+            - `thread`, a persistent thread pool, fits functions that release the GIL (e.g. OpenCV, SciPy).
+            - `process`, a persistent process pool, ``fn`` and the data must be picklable.
+        The pools are created on first use and reused by later calls with the same ``backend`` and ``thread_count``.
+        With a backend, ``fn`` is always applied to a single sample, and the outputs are written into
+        a preallocated array when they all have the same shape and dtype.
+    chunk_size : int or None
+        The number of samples sent to a worker per task when a ``backend`` is used.
+        If None, the data is split into about 4 chunks per worker.
     more args : the args for `fn`
         Ssee Examples below.
 
@@ -186,6 +209,11 @@ def threading_data(data=None, fn=None, thread_count=None, **kwargs):
     >>> data = tl.prepro.threading_data([_ for _ in zip(X, Y)], distort_img)
     >>> X_, Y_ = data.transpose((1,0,2,3,4))
 
+    Reuse a pool of worker processes across minibatches.
+
+    >>> for X_batch, _ in tl.iterate.minibatches(X_train, y_train, batch_size=32, shuffle=True):
+    >>>     X_batch = tl.prepro.threading_data(X_batch, distort_img, thread_count=8, backend='process')
+
     Returns
     -------
     list or numpyarray
@@ -198,6 +226,9 @@ def threading_data(data=None, fn=None, thread_count=None, **kwargs):
 
     """
 
+    if backend is not None:
+        return _pool_map_data(data, fn, backend, thread_count, chunk_size, kwargs)
+
     def apply_fn(results, i, data, kwargs):
         results[i] = fn(data, **kwargs)
 
@@ -234,6 +265,101 @@ def threading_data(data=None, fn=None, thread_count=None, **kwargs):
         return np.concatenate(results)
 
 
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def _reseed_worker():
+    # Forked workers inherit the random state of the parent, reseed them so that
+    # random augmentations differ between processes.
+    np.random.seed()
+    random.seed()
+
+
+def _get_worker_pool(backend, n_workers):
+    """Return the persistent pool of the given backend and size, create it on first use."""
+    key = (backend, n_workers)
+    with _worker_pools_lock:
+        pool = _worker_pools.get(key)
+        if pool is None:
+            if backend == 'thread':
+                pool = ThreadPool(n_workers)
+            else:
+                pool = multiprocessing.Pool(n_workers, initializer=_reseed_worker)
+            _worker_pools[key] = pool
+    return pool
+
+
+@atexit.register
+def _close_worker_pools():
+    with _worker_pools_lock:
+        for pool in _worker_pools.values():
+            pool.terminate()
+        _worker_pools.clear()
+
+
+def _apply_fn_chunk(args):
+    fn, chunk, kwargs = args
+    return [fn(d, **kwargs) for d in chunk]
+
+
+def _pool_map_data(data, fn, backend, n_workers, chunk_size, kwargs):
+    """Apply ``fn`` to every sample of ``data`` on a persistent pool, see ``threading_data``."""
+    if backend not in ('thread', 'process'):
+        raise ValueError("backend should be one of None, 'thread' or 'process', but got %s" % backend)
+
+    n_samples = len(data)
+    if n_samples == 0:
+        return []
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    if chunk_size is None:
+        chunk_size = int(math.ceil(n_samples / float(n_workers * 4)))
+    chunk_size = max(1, chunk_size)
+
+    # the first output tells whether the results can be written into a single preallocated array
+    first = fn(data[0], **kwargs)
+    if isinstance(first, np.ndarray):
+        results = np.empty((n_samples, ) + first.shape, dtype=first.dtype)
+    else:
+        results = [None] * n_samples
+    results[0] = first
+    mismatched = {}
+
+    def store(i, y):
+        if isinstance(results, np.ndarray):
+            if not isinstance(y, np.ndarray) or y.shape != first.shape or y.dtype != first.dtype:
+                mismatched[i] = y
+                return
+        results[i] = y
+
+    bounds = [(i, min(i + chunk_size, n_samples)) for i in range(1, n_samples, chunk_size)]
+    pool = _get_worker_pool(backend, n_workers)
+
+    if backend == 'thread':
+
+        def apply_chunk(bound):
+            for i in range(bound[0], bound[1]):
+                store(i, fn(data[i], **kwargs))
+
+        pool.map(apply_chunk, bounds)
+    else:
+        tasks = ((fn, data[start:end], kwargs) for start, end in bounds)
+        for (start, _), outputs in zip(bounds, pool.imap(_apply_fn_chunk, tasks)):
+            for i, y in enumerate(outputs, start):
+                store(i, y)
+
+    if isinstance(results, np.ndarray) and not mismatched:
+        return results
+    results = list(results)
+    for i, y in mismatched.items():
+        results[i] = y
+    try:
+        return np.asarray(results)
+    except Exception:
+        return results
+
+
 def affine_rotation_matrix(angle=(-20, 20)):
     """Create an affine transform matrix for image rotation.
     NOTE: In OpenCV, x is width and y is height.
@@ -484,12 +610,16 @@ def transform_matrix_offset_center(matrix, x, y):
     --------
     - See ``tl.prepro.rotation``, ``tl.prepro.shear``, ``tl.prepro.zoom``.
     """
+    return _transform_matrices_offset_center(matrix, x, y)
+
+
+def _transform_matrices_offset_center(matrices, x, y):
+    """The batched version of ``transform_matrix_offset_center``, for a [3, 3] matrix or [n, 3, 3] matrices."""
     o_x = (x - 1) / 2.0
     o_y = (y - 1) / 2.0
     offset_matrix = np.array([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]])
     reset_matrix = np.array([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]])
-    transform_matrix = np.dot(np.dot(offset_matrix, matrix), reset_matrix)
-    return transform_matrix
+    return np.matmul(np.matmul(offset_matrix, matrices), reset_matrix)
 
 
 def affine_transform(x, transform_matrix, channel_index=2, fill_mode='nearest', cval=0., order=1):
@@ -628,6 +758,268 @@ def affine_transform_keypoints(coords_list, transform_matrix):
     return coords_result_list
 
 
+def _batch_param(value, n, name):
+    """Return ``n`` values of a parameter, tuple of 2 values means uniform random sampling."""
+    if isinstance(value, tuple):
+        if len(value) != 2:
+            raise ValueError("%s: tuple should have 2 values, but got %s" % (name, value))
+        return np.random.uniform(value[0], value[1], n)
+    if isinstance(value, numbers.Real):
+        return np.full(n, value, dtype=np.float64)
+    raise ValueError("%s: float or tuple of 2 floats" % name)
+
+
+def affine_batch_matrices(
+        n, w, h, angle=None, flip_prob=None, wrg=None, hrg=None, x_shear=None, y_shear=None, zoom_range=None
+):
+    """Create the affine transform matrices of a batch of images, one random matrix per image.
+    OpenCV format, x is width.
+
+    Every matrix is combined in the same order as the single-image API, i.e.
+    ``M_shift.dot(M_zoom).dot(M_shear).dot(M_flip).dot(M_rotate)``, and is converted to image coordinates
+    by ``transform_matrix_offset_center``, so it can be given to ``affine_transform_batch`` directly.
+    A transformation is skipped when its argument is None.
+
+    Parameters
+    -----------
+    n : int
+        The number of images in the batch.
+    w, h : int
+        The width and height of the images.
+    angle : None, int/float or tuple of two int/float
+        Degree to rotate, see ``tl.prepro.affine_rotation_matrix``.
+    flip_prob : None or float
+        Probability to horizontally flip each image, see ``tl.prepro.affine_horizontal_flip_matrix``.
+    wrg, hrg : None, float or tuple of floats
+        Range to shift on width and height axis, see ``tl.prepro.affine_shift_matrix``.
+    x_shear, y_shear : None, float or tuple of floats
+        Shear of width and height directions, see ``tl.prepro.affine_shear_matrix``.
+    zoom_range : None, float or tuple of 2 floats
+        The zooming/scaling ratio, see ``tl.prepro.affine_zoom_matrix``.
+
+    Returns
+    -------
+    numpy.array
+        Affine transform matrices with shape of [n, 3, 3].
+
+    Examples
+    --------
+    >>> M = tl.prepro.affine_batch_matrices(32, w=w, h=h, angle=(-20, 20), flip_prob=0.5, zoom_range=(0.8, 1.1))
+    >>> images = tl.prepro.affine_transform_batch(images, M)
+
+    """
+    matrices = np.tile(np.eye(3), (n, 1, 1))
+
+    if angle is not None:
+        theta = np.pi / 180 * _batch_param(angle, n, 'angle')
+        cos, sin = np.cos(theta), np.sin(theta)
+        m = np.tile(np.eye(3), (n, 1, 1))
+        m[:, 0, 0], m[:, 0, 1], m[:, 1, 0], m[:, 1, 1] = cos, sin, -sin, cos
+        matrices = np.matmul(m, matrices)
+
+    if flip_prob is not None:
+        m = np.tile(np.eye(3), (n, 1, 1))
+        m[:, 0, 0] = np.where(flip_prob >= np.random.uniform(0, 1, n), -1., 1.)
+        matrices = np.matmul(m, matrices)
+
+    if x_shear is not None or y_shear is not None:
+        m = np.tile(np.eye(3), (n, 1, 1))
+        m[:, 0, 1] = _batch_param(x_shear or 0., n, 'x_shear')
+        m[:, 1, 0] = _batch_param(y_shear or 0., n, 'y_shear')
+        matrices = np.matmul(m, matrices)
+
+    if zoom_range is not None:
+        scale = _batch_param(zoom_range, n, 'zoom_range')
+        m = np.tile(np.eye(3), (n, 1, 1))
+        m[:, 0, 0], m[:, 1, 1] = scale, scale
+        matrices = np.matmul(m, matrices)
+
+    if wrg is not None or hrg is not None:
+        m = np.tile(np.eye(3), (n, 1, 1))
+        m[:, 0, 2] = _batch_param(wrg or 0., n, 'wrg') * w
+        m[:, 1, 2] = _batch_param(hrg or 0., n, 'hrg') * h
+        matrices = np.matmul(m, matrices)
+
+    return _transform_matrices_offset_center(matrices, w, h)
+
+
+def _gather_pixels(x, batch_idx, iy, ix, border_mode, cval, dtype):
+    h, w = x.shape[1], x.shape[2]
+    values = x[batch_idx, np.clip(iy, 0, h - 1), np.clip(ix, 0, w - 1)].astype(dtype)
+    if border_mode == 'constant':
+        values[(ix < 0) | (ix >= w) | (iy < 0) | (iy >= h)] = cval
+    return values
+
+
+def affine_transform_batch(x, transform_matrices, order=1, border_mode='constant', cval=0, chunk_size=None):
+    """Return a batch of transformed images by given affine matrices in OpenCV format (x is width).
+
+    All images are warped by vectorized NumPy operations rather than a Python loop over the samples,
+    the result is the same as applying ``tl.prepro.affine_transform_cv2`` to every image.
+
+    Parameters
+    -----------
+    x : numpy.array
+        Images with dimension of [batch_size, row, col, channel] or [batch_size, row, col].
+    transform_matrices : numpy.array
+        Transform matrices with shape of [batch_size, 3, 3] or a [3, 3] matrix shared by all images, OpenCV format.
+    order : int
+        The order of interpolation, 0 for nearest-neighbor or 1 for bi-linear (default).
+    border_mode : str
+        - `constant`, pad the image with ``cval``.
+        - `replicate`, the row or column at the very edge of the original is replicated to the extra border.
+    cval : float
+        Value used for points outside the boundaries of the input if border_mode is `constant`.
+    chunk_size : int or None
+        The number of images warped at once, bound the size of the temporary arrays. If None, warp the whole batch.
+
+    Returns
+    -------
+    numpy.array
+        A batch of processed images with the same shape and dtype as ``x``.
+
+    Examples
+    --------
+    >>> images --> [32, 224, 224, 3]
+    >>> M = tl.prepro.affine_batch_matrices(32, w=224, h=224, angle=(-20, 20), wrg=(-0.1, 0.1), hrg=(-0.1, 0.1))
+    >>> images = tl.prepro.affine_transform_batch(images, M)
+
+    """
+    return _affine_transform_batch(x, transform_matrices, order, border_mode, cval, chunk_size)
+
+
+def _affine_transform_batch(x, transform_matrices, order, border_mode, cval, chunk_size=None, strict_bounds=False):
+    """Implement ``affine_transform_batch``, with ``strict_bounds`` the points sampled outside of ``[0, size - 1]``
+    are filled with ``cval`` as ``scipy.ndimage.affine_transform`` does in `constant` mode, instead of the
+    half-pixel border of the nearest-neighbor rounding and the blending of the bi-linear interpolation."""
+    if order not in (0, 1):
+        raise ValueError("order should be 0 (nearest-neighbor) or 1 (bi-linear), but got %s" % order)
+    if border_mode not in ('constant', 'replicate'):
+        raise ValueError("unsupport border_mode, should be `constant` or `replicate`, but got %s" % border_mode)
+
+    n, h, w = x.shape[0], x.shape[1], x.shape[2]
+    transform_matrices = np.asarray(transform_matrices, dtype=np.float64)
+    if transform_matrices.ndim == 2:
+        transform_matrices = np.broadcast_to(transform_matrices, (n, 3, 3))
+    # sample the input at the inverse mapping of every output pixel, as cv2.warpAffine does
+    inverse_matrices = np.linalg.inv(transform_matrices)
+
+    dtype = x.dtype if np.issubdtype(x.dtype, np.floating) else np.float32
+    results = np.empty_like(x)
+    if chunk_size is None:
+        chunk_size = n
+    xs = np.arange(w, dtype=dtype)[None, None, :]
+    ys = np.arange(h, dtype=dtype)[None, :, None]
+
+    for start in range(0, n, chunk_size):
+        chunk = x[start:start + chunk_size]
+        m = inverse_matrices[start:start + chunk_size].astype(dtype)[:, :, :, None, None]
+        src_x = m[:, 0, 0] * xs + m[:, 0, 1] * ys + m[:, 0, 2]
+        src_y = m[:, 1, 0] * xs + m[:, 1, 1] * ys + m[:, 1, 2]
+        batch_idx = np.arange(len(chunk))[:, None, None]
+
+        if order == 0:
+            ix = np.floor(src_x + 0.5).astype(np.intp)
+            iy = np.floor(src_y + 0.5).astype(np.intp)
+            values = _gather_pixels(chunk, batch_idx, iy, ix, border_mode, cval, dtype)
+        else:
+            x0 = np.floor(src_x)
+            y0 = np.floor(src_y)
+            wx = src_x - x0
+            wy = src_y - y0
+            if chunk.ndim == 4:
+                wx = wx[..., None]
+                wy = wy[..., None]
+            x0 = x0.astype(np.intp)
+            y0 = y0.astype(np.intp)
+            top = _gather_pixels(chunk, batch_idx, y0, x0, border_mode, cval, dtype) * (1 - wx)
+            top += _gather_pixels(chunk, batch_idx, y0, x0 + 1, border_mode, cval, dtype) * wx
+            bottom = _gather_pixels(chunk, batch_idx, y0 + 1, x0, border_mode, cval, dtype) * (1 - wx)
+            bottom += _gather_pixels(chunk, batch_idx, y0 + 1, x0 + 1, border_mode, cval, dtype) * wx
+            values = top * (1 - wy) + bottom * wy
+
+        if strict_bounds and border_mode == 'constant':
+            values[(src_x < 0) | (src_x > w - 1) | (src_y < 0) | (src_y > h - 1)] = cval
+
+        if not np.issubdtype(x.dtype, np.floating):
+            info = np.iinfo(x.dtype)
+            values = np.clip(np.rint(values), info.min, info.max)
+        results[start:start + chunk_size] = values
+    return results
+
+
+def affine_transform_keypoints_batch(coords, transform_matrices):
+    """Transform the keypoint coordinates of a batch of images according to their affine transform matrices.
+    OpenCV format, x is width.
+
+    Parameters
+    -----------
+    coords : numpy.array
+        The coordinates with shape of [batch_size, n_points, 2], e.g., the keypoints of every image,
+        pad the images that have fewer points with `nan`.
+    transform_matrices : numpy.array
+        Transform matrices with shape of [batch_size, 3, 3], OpenCV format.
+
+    Returns
+    -------
+    numpy.array
+        The transformed coordinates with shape of [batch_size, n_points, 2].
+
+    Examples
+    --------
+    >>> M = tl.prepro.affine_batch_matrices(len(images), w=w, h=h, angle=(-20, 20))
+    >>> images = tl.prepro.affine_transform_batch(images, M)
+    >>> coords = tl.prepro.affine_transform_keypoints_batch(coords, M)
+
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    transform_matrices = np.asarray(transform_matrices, dtype=np.float64)
+    return np.einsum('nij,nkj->nki', transform_matrices[:, :2, :2], coords) + transform_matrices[:, None, :2, 2]
+
+
+def affine_transform_boxes_batch(boxes, transform_matrices):
+    """Transform the bounding boxes of a batch of images according to their affine transform matrices.
+    OpenCV format, x is width.
+
+    The four corners of every box are transformed, and the returned box is the up-left and bottom-right corners
+    of the transformed corners, i.e. the smallest axis-aligned box that contains the transformed box.
+
+    Parameters
+    -----------
+    boxes : numpy.array
+        The boxes with shape of [batch_size, n_boxes, 4], in pixel unit [x_min, y_min, x_max, y_max],
+        pad the images that have fewer boxes with `nan`.
+    transform_matrices : numpy.array
+        Transform matrices with shape of [batch_size, 3, 3], OpenCV format.
+
+    Returns
+    -------
+    numpy.array
+        The transformed boxes with shape of [batch_size, n_boxes, 4].
+
+    Examples
+    --------
+    >>> M = tl.prepro.affine_batch_matrices(len(images), w=w, h=h, angle=(-20, 20), zoom_range=(0.8, 1.1))
+    >>> images = tl.prepro.affine_transform_batch(images, M)
+    >>> boxes = tl.prepro.affine_transform_boxes_batch(boxes, M)
+
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    n, n_boxes = boxes.shape[0], boxes.shape[1]
+    x_min, y_min, x_max, y_max = boxes[..., 0], boxes[..., 1], boxes[..., 2], boxes[..., 3]
+    corners = np.stack(
+        [
+            np.stack([x_min, y_min], axis=-1),
+            np.stack([x_max, y_min], axis=-1),
+            np.stack([x_min, y_max], axis=-1),
+            np.stack([x_max, y_max], axis=-1),
+        ], axis=2
+    )
+    corners = affine_transform_keypoints_batch(corners.reshape(n, n_boxes * 4, 2), transform_matrices)
+    corners = corners.reshape(n, n_boxes, 4, 2)
+    return np.concatenate([corners.min(axis=2), corners.max(axis=2)], axis=-1)
+
+
 def projective_transform_by_points(
         x, src, dst, map_args=None, output_shape=None, order=1, mode='constant', cval=0.0, clip=True,
         preserve_range=False
@@ -1706,13 +2098,21 @@ def illumination(x, gamma=1., contrast=1., saturation=1., is_random=False):
     return np.asarray(im_)
 
 
-def rgb_to_hsv(rgb):
+def rgb_to_hsv(rgb, out=None, dtype=np.float64):
     """Input RGB image [0~255] return HSV image [0~1].
 
+    Only the value channel keeps the range of the input, i.e. [0~255].
+    The image can have any leading dimensions, e.g. a batch of [batch_size, row, col, channel].
+
     Parameters
     ------------
     rgb : numpy.array
-        An image with values between 0 and 255.
+        An image with values between 0 and 255, e.g. uint8 or float32.
+    out : numpy.array or None
+        A buffer with the same shape as ``rgb`` to write the result into, e.g. ``rgb`` itself for a float image.
+        If None, a new array is returned.
+    dtype : numpy.dtype
+        The dtype of the returned image if ``out`` is None, float64 by default, float32 halves the memory traffic.
 
     Returns
     -------
@@ -1721,36 +2121,60 @@ def rgb_to_hsv(rgb):
 
     """
     # Translated from source of colorsys.rgb_to_hsv
-    # r,g,b should be a numpy arrays with values between 0 and 255
-    # rgb_to_hsv returns an array of floats between 0.0 and 1.0.
-    rgb = rgb.astype('float')
-    hsv = np.zeros_like(rgb)
-    # in case an RGBA array was passed, just copy the A channel
-    hsv[..., 3:] = rgb[..., 3:]
+    if out is None:
+        out = np.empty(rgb.shape, dtype=dtype)
+    dtype = out.dtype
     r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
-    maxc = np.max(rgb[..., :3], axis=-1)
-    minc = np.min(rgb[..., :3], axis=-1)
-    hsv[..., 2] = maxc
-    mask = maxc != minc
-    hsv[mask, 1] = (maxc - minc)[mask] / maxc[mask]
-    rc = np.zeros_like(r)
-    gc = np.zeros_like(g)
-    bc = np.zeros_like(b)
-    rc[mask] = (maxc - r)[mask] / (maxc - minc)[mask]
-    gc[mask] = (maxc - g)[mask] / (maxc - minc)[mask]
-    bc[mask] = (maxc - b)[mask] / (maxc - minc)[mask]
-    hsv[..., 0] = np.select([r == maxc, g == maxc], [bc - gc, 2.0 + rc - bc], default=4.0 + gc - rc)
-    hsv[..., 0] = (hsv[..., 0] / 6.0) % 1.0
-    return hsv
-
-
-def hsv_to_rgb(hsv):
+
+    maxc = np.maximum(r, g, dtype=dtype)
+    np.maximum(maxc, b, out=maxc)
+    delta = np.minimum(r, g, dtype=dtype)
+    np.minimum(delta, b, out=delta)
+    np.subtract(maxc, delta, out=delta)
+    mask = delta != 0
+
+    # rc, gc and bc of colorsys, in the same order of operations to give exactly the same hue
+    rc = np.subtract(maxc, r, dtype=dtype)
+    gc = np.subtract(maxc, g, dtype=dtype)
+    bc = np.subtract(maxc, b, dtype=dtype)
+    for c in (rc, gc, bc):
+        np.divide(c, delta, out=c, where=mask)
+        c[~mask] = 0
+    r_is_max = r == maxc
+    g_is_max = (g == maxc) & ~r_is_max
+    hue = np.subtract(bc, gc)
+    gc += 4.0
+    gc -= rc
+    np.copyto(hue, gc, where=~(r_is_max | g_is_max))
+    rc += 2.0
+    rc -= bc
+    np.copyto(hue, rc, where=g_is_max)
+    hue /= 6.0
+    np.mod(hue, 1.0, out=hue)
+
+    # r, g and b are not used anymore, so that ``out`` can be ``rgb`` itself
+    if out is not rgb:
+        out[..., 3:] = rgb[..., 3:]  # in case an RGBA array was passed, just copy the A channel
+    out[..., 0] = hue
+    out[..., 1] = 0
+    np.divide(delta, maxc, out=out[..., 1], where=mask)
+    out[..., 2] = maxc
+    return out
+
+
+def hsv_to_rgb(hsv, out=None):
     """Input HSV image [0~1] return RGB image [0~255].
 
+    The value channel is in [0~255], see ``tl.prepro.rgb_to_hsv``.
+    The image can have any leading dimensions, e.g. a batch of [batch_size, row, col, channel].
+
     Parameters
     -------------
     hsv : numpy.array
         An image with values between 0.0 and 1.0
+    out : numpy.array or None
+        A buffer with the same shape as ``hsv`` to write the result into, the values are truncated to its dtype.
+        If None, a new uint8 array is returned.
 
     Returns
     -------
@@ -1758,26 +2182,45 @@ def hsv_to_rgb(hsv):
         A processed image.
     """
     # Translated from source of colorsys.hsv_to_rgb
-    # h,s should be a numpy arrays with values between 0.0 and 1.0
-    # v should be a numpy array with values between 0.0 and 255.0
-    # hsv_to_rgb returns an array of uints between 0 and 255.
-    rgb = np.empty_like(hsv)
-    rgb[..., 3:] = hsv[..., 3:]
+    if out is None:
+        out = np.empty(hsv.shape, dtype=np.uint8)
     h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
-    i = (h * 6.0).astype('uint8')
-    f = (h * 6.0) - i
-    p = v * (1.0 - s)
-    q = v * (1.0 - s * f)
-    t = v * (1.0 - s * (1.0 - f))
-    i = i % 6
-    conditions = [s == 0.0, i == 1, i == 2, i == 3, i == 4, i == 5]
-    rgb[..., 0] = np.select(conditions, [v, q, p, p, t, v], default=v)
-    rgb[..., 1] = np.select(conditions, [v, v, v, q, p, p], default=t)
-    rgb[..., 2] = np.select(conditions, [v, p, t, v, v, q], default=p)
-    return rgb.astype('uint8')
-
-
-def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
+    if np.may_share_memory(out, hsv):
+        v = v.copy()
+    dtype = np.promote_types(hsv.dtype, np.float32)
+
+    i = np.multiply(h, 6.0, dtype=dtype)
+    f = i - i.astype('uint8')
+    i = i.astype('uint8') % 6
+    p = np.subtract(1.0, s, dtype=dtype)
+    p *= v
+    q = np.multiply(s, f, dtype=dtype)
+    np.subtract(1.0, q, out=q)
+    q *= v
+    t = np.subtract(1.0, f, out=f)
+    t *= s
+    np.subtract(1.0, t, out=t)
+    t *= v
+    is_grey = s == 0.0
+
+    # the channels take v, p, q or t depending on the sector i of the hue
+    if out is not hsv:
+        out[..., 3:] = hsv[..., 3:]
+    for channel, default, choices in (
+        (0, v, ((q, (1, )), (p, (2, 3)), (t, (4, )))),
+        (1, t, ((v, (1, 2)), (q, (3, )), (p, (4, 5)))),
+        (2, p, ((t, (2, )), (v, (3, 4)), (q, (5, )))),
+    ):
+        dst = out[..., channel]
+        np.copyto(dst, default, casting='unsafe')
+        for src, sectors in choices:
+            where = (i == sectors[0]) if len(sectors) == 1 else (i == sectors[0]) | (i == sectors[1])
+            np.copyto(dst, src, casting='unsafe', where=where)
+        np.copyto(dst, v, casting='unsafe', where=is_grey)
+    return out
+
+
+def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False, out=None):
     """Adjust hue of an RGB image.
 
     This is a convenience method that converts an RGB image to float representation, converts it to HSV, add an offset to the hue channel, converts back to RGB and then back to the original data type.
@@ -1786,7 +2229,8 @@ def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
     Parameters
     -----------
     im : numpy.array
-        An image with values between 0 and 255.
+        An image with values between 0 and 255, or a batch of images with dimension of [batch_size, row, col, channel].
+        The HSV image is computed in float32 for a float32 input, otherwise in float64.
     hout : float
         The scale value for adjusting hue.
             - If is_offset is False, set all hue values to this value. 0 is red; 0.33 is green; 0.66 is blue.
@@ -1796,7 +2240,10 @@ def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
     is_clip : boolean
         If HSV value smaller than 0, set to 0. Default is True.
     is_random : boolean
-        If True, randomly change hue. Default is False.
+        If True, randomly change hue. Default is False. For a batch, every image has its own random offset.
+    out : numpy.array or None
+        A buffer with the same shape as ``im`` to write the result into, e.g. ``im`` itself to adjust in-place.
+        If None, a new uint8 array is returned.
 
     Returns
     -------
@@ -1813,6 +2260,10 @@ def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
 
     >>> im_green = tl.prepro.adjust_hue(image, hout=0.66, is_offset=False, is_random=False)
 
+    Random, a batch of uint8 images in-place.
+
+    >>> tl.prepro.adjust_hue(images, hout=0.1, is_random=True, out=images)
+
     References
     -----------
     - `tf.image.random_hue <https://www.tensorflow.org/api_docs/python/tf/image/random_hue>`__.
@@ -1820,9 +2271,12 @@ def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
     - `StackOverflow: Changing image hue with python PIL <https://stackoverflow.com/questions/7274221/changing-image-hue-with-python-pil>`__.
 
     """
-    hsv = rgb_to_hsv(im)
+    hsv = rgb_to_hsv(im, dtype=np.float32 if im.dtype == np.float32 else np.float64)
     if is_random:
-        hout = np.random.uniform(-hout, hout)
+        if im.ndim == 4:
+            hout = np.random.uniform(-hout, hout, (len(im), 1, 1))
+        else:
+            hout = np.random.uniform(-hout, hout)
 
     if is_offset:
         hsv[..., 0] += hout
@@ -1830,10 +2284,9 @@ def adjust_hue(im, hout=0.66, is_offset=True, is_clip=True, is_random=False):
         hsv[..., 0] = hout
 
     if is_clip:
-        hsv[..., 0] = np.clip(hsv[..., 0], 0, np.inf)  # Hao : can remove green dots
+        np.maximum(hsv[..., 0], 0, out=hsv[..., 0])  # Hao : can remove green dots
 
-    rgb = hsv_to_rgb(hsv)
-    return rgb
+    return hsv_to_rgb(hsv, out=out)
 
 
 # # contrast
@@ -2206,6 +2659,249 @@ def drop(x, keep=0.5):
 # exit()
 
 
+# compose
+def _uniform_or_fixed(value, n, is_random):
+    if is_random:
+        return np.random.uniform(-value, value, n)
+    return np.full(n, value, dtype=np.float64)
+
+
+def _linear_matrices(n, a, b, c, d):
+    matrices = np.tile(np.eye(3), (n, 1, 1))
+    matrices[:, 0, 0], matrices[:, 0, 1], matrices[:, 1, 0], matrices[:, 1, 1] = a, b, c, d
+    return matrices
+
+
+# The following functions return the matrices of a batch in the Scipy format of ``tl.prepro.affine_transform``
+# (x is height), the random values are sampled in the same way as the single-image functions.
+def _rotation_matrices(n, h, w, rg=20, is_random=False):
+    theta = np.pi / 180 * _uniform_or_fixed(rg, n, is_random)
+    matrices = _linear_matrices(n, np.cos(theta), -np.sin(theta), np.sin(theta), np.cos(theta))
+    return _transform_matrices_offset_center(matrices, h, w)
+
+
+def _flip_matrices(n, h, w, axis=1, is_random=False):
+    if axis not in (0, 1):
+        raise ValueError("only axis 0 (up and down) and 1 (left and right) can be composed, but got %s" % axis)
+    flip = np.random.uniform(-1, 1, n) > 0 if is_random else np.ones(n, dtype=bool)
+    scale = np.where(flip, -1., 1.)
+    matrices = _linear_matrices(n, scale, 0, 0, 1) if axis == 0 else _linear_matrices(n, 1, 0, 0, scale)
+    return _transform_matrices_offset_center(matrices, h, w)
+
+
+def _shift_matrices(n, h, w, wrg=0.1, hrg=0.1, is_random=False):
+    matrices = np.tile(np.eye(3), (n, 1, 1))
+    matrices[:, 0, 2] = _uniform_or_fixed(hrg, n, is_random) * h
+    matrices[:, 1, 2] = _uniform_or_fixed(wrg, n, is_random) * w
+    return matrices
+
+
+def _shear_matrices(n, h, w, intensity=0.1, is_random=False):
+    shear = _uniform_or_fixed(intensity, n, is_random)
+    matrices = _linear_matrices(n, 1, -np.sin(shear), 0, np.cos(shear))
+    return _transform_matrices_offset_center(matrices, h, w)
+
+
+def _shear2_matrices(n, h, w, shear=(0.1, 0.1), is_random=False):
+    if len(shear) != 2:
+        raise AssertionError("shear should be tuple of 2 floats")
+    shear_x = _uniform_or_fixed(shear[0], n, is_random)
+    shear_y = _uniform_or_fixed(shear[1], n, is_random)
+    matrices = _linear_matrices(n, 1, shear_x, shear_y, 1)
+    return _transform_matrices_offset_center(matrices, h, w)
+
+
+def _zoom_matrices(n, h, w, zoom_range=(0.9, 1.1)):
+    if not isinstance(zoom_range, (numbers.Real, tuple)):
+        raise Exception("zoom_range: float or tuple of 2 floats")
+    scale = _batch_param(zoom_range, n, 'zoom_range')
+    return _transform_matrices_offset_center(_linear_matrices(n, scale, 0, 0, scale), h, w)
+
+
+def _respective_zoom_matrices(n, h, w, h_range=(0.9, 1.1), w_range=(0.9, 1.1)):
+    zx = _batch_param(w_range, n, 'w_range')
+    zy = _batch_param(h_range, n, 'h_range')
+    return _transform_matrices_offset_center(_linear_matrices(n, zx, 0, 0, zy), h, w)
+
+
+# The following functions process a float batch of [n, row, col, channel] in-place,
+# ``scale`` is the maximum value of the original dtype, e.g. 255 for uint8 and 1 for float images.
+def _brightness_batch(x, scale, gamma=1, gain=1, is_random=False):
+    if is_random:
+        gamma = np.random.uniform(1 - gamma, 1 + gamma, len(x))
+    gamma = np.broadcast_to(gamma, (len(x), )).reshape(-1, 1, 1, 1)
+    if np.any(gamma < 0):
+        raise ValueError("Gamma should be a non-negative real number.")
+    x /= scale
+    np.power(x, gamma, out=x)
+    x *= scale * gain
+
+
+def _grey_batch(x):
+    """Return the grey levels of a float batch with a channel axis of 1, single-channel batches are copied."""
+    if x.shape[-1] == 1:
+        return x.copy()
+    if x.shape[-1] < 3:
+        raise ValueError("the images should have 1 or at least 3 channels, but got %d" % x.shape[-1])
+    return np.dot(x[..., :3], np.array([0.299, 0.587, 0.114], dtype=x.dtype))[..., None]
+
+
+def _illumination_batch(x, scale, gamma=1., contrast=1., saturation=1., is_random=False):
+    n = len(x)
+    if is_random:
+        if not (len(gamma) == len(contrast) == len(saturation) == 2):
+            raise AssertionError("if is_random = True, the arguments are (min, max)")
+        illum_settings = np.random.randint(0, 3, n)  # 0-brighter, 1-darker, 2 keep normal
+        brighter = np.random.uniform(gamma[0], 1.0, n)
+        darker = np.random.uniform(1.0, gamma[1], n)
+        gamma = np.select([illum_settings == 0, illum_settings == 1], [brighter, darker], 1.)
+        contrast = np.random.uniform(contrast[0], contrast[1], n)
+        saturation = np.random.uniform(saturation[0], saturation[1], n)
+    _brightness_batch(x, scale, gamma=gamma, gain=1, is_random=False)
+    contrast = np.broadcast_to(contrast, (n, )).reshape(-1, 1, 1, 1)
+    saturation = np.broadcast_to(saturation, (n, )).reshape(-1, 1, 1, 1)
+    # blend with the mean grey level and the grey image, as PIL.ImageEnhance.Contrast and Color do
+    grey = _grey_batch(x)
+    mean = grey.mean(axis=(1, 2, 3), keepdims=True)
+    x -= mean
+    x *= contrast
+    x += mean
+    np.clip(x, 0, scale, out=x)
+    grey = _grey_batch(x)
+    x -= grey
+    x *= saturation
+    x += grey
+    np.clip(x, 0, scale, out=x)
+
+
+def _channel_shift_batch(x, scale, intensity, is_random=False):
+    factor = _uniform_or_fixed(intensity, len(x), is_random).reshape(-1, 1, 1, 1)
+    min_x = x.min(axis=(1, 2, 3), keepdims=True)
+    max_x = x.max(axis=(1, 2, 3), keepdims=True)
+    x += factor
+    np.clip(x, min_x, max_x, out=x)
+
+
+class Compose(object):
+    """Compose image augmentations and apply them to a batch of images at once.
+
+    All the geometric transformations are folded into a single affine matrix per image,
+    so every image is resampled only once, which is faster and preserves more details than calling the functions
+    one by one. The pixel-wise transformations are then applied by in-place NumPy operations over the whole batch.
+
+    Parameters
+    ------------
+    transforms : list of function or tuple of (function, dict)
+        The transformations and their keyword arguments, the images and the arguments of interpolation are omitted.
+            - geometric: ``rotation``, ``flip_axis`` (axis 0 or 1), ``shift``, ``shear``, ``shear2``, ``zoom``,
+              ``respective_zoom``.
+            - pixel-wise: ``brightness``, ``illumination``, ``channel_shift``, on images with 1 or 3 channels.
+        The geometric transformations are applied in the given order, followed by the pixel-wise ones.
+    fill_mode : str
+        Method to fill missing pixel, default `nearest`, more options `constant`, `reflect` or `wrap`,
+        see ``tl.prepro.affine_transform``.
+    cval : float
+        Value used for points outside the boundaries of the input if mode='constant'. Default is 0.0.
+    order : int
+        The order of interpolation. The order has to be in the range 0-5. See ``tl.prepro.affine_transform``.
+        With order 0 or 1 and fill_mode `nearest` or `constant`, the whole batch is warped at once,
+        as ``tl.prepro.affine_transform_batch`` does, with the same points outside the boundaries as Scipy.
+
+    Examples
+    ---------
+    >>> augment = tl.prepro.Compose([
+    >>>     (tl.prepro.rotation, {'rg': 20, 'is_random': True}),
+    >>>     (tl.prepro.flip_axis, {'axis': 1, 'is_random': True}),
+    >>>     (tl.prepro.zoom, {'zoom_range': (0.9, 1.1)}),
+    >>>     (tl.prepro.brightness, {'gamma': 0.2, 'is_random': True}),
+    >>> ])
+    >>> images = augment(images)  # [batch_size, row, col, channel]
+
+    """
+
+    def __init__(self, transforms, fill_mode='nearest', cval=0., order=1):
+        geometric_steps = {
+            rotation: _rotation_matrices,
+            flip_axis: _flip_matrices,
+            shift: _shift_matrices,
+            shear: _shear_matrices,
+            shear2: _shear2_matrices,
+            zoom: _zoom_matrices,
+            respective_zoom: _respective_zoom_matrices,
+        }
+        pixel_steps = {
+            brightness: _brightness_batch,
+            illumination: _illumination_batch,
+            channel_shift: _channel_shift_batch,
+        }
+
+        self.geometric_transforms = []
+        self.pixel_transforms = []
+        for transform in transforms:
+            fn, kwargs = transform if isinstance(transform, tuple) else (transform, {})
+            if fn in geometric_steps:
+                self.geometric_transforms.append((geometric_steps[fn], dict(kwargs)))
+            elif fn in pixel_steps:
+                self.pixel_transforms.append((pixel_steps[fn], dict(kwargs)))
+            else:
+                raise ValueError("%s can not be composed, see tl.prepro.Compose for the supported functions" % fn)
+
+        self.fill_mode = fill_mode
+        self.cval = cval
+        self.order = order
+
+    def transform_matrices(self, n, h, w):
+        """Return the combined matrices of the geometric transformations for ``n`` images in Scipy format
+        (x is height)."""
+        matrices = np.tile(np.eye(3), (n, 1, 1))
+        for fn, kwargs in self.geometric_transforms:
+            # matrices of the Scipy format map output to input coordinates,
+            # so the later ones are multiplied on the right
+            matrices = np.matmul(matrices, fn(n, h, w, **kwargs))
+        return matrices
+
+    def __call__(self, x):
+        """Apply the transformations to a batch of images with dimension of [batch_size, row, col, channel]
+        or [batch_size, row, col], and return the processed images with the same shape and dtype."""
+        x = np.asarray(x)
+        is_grey = x.ndim == 3
+        if is_grey:
+            x = x[..., None]
+        n, h, w = x.shape[0], x.shape[1], x.shape[2]
+
+        if self.geometric_transforms:
+            matrices = self.transform_matrices(n, h, w)
+            if self.order in (0, 1) and self.fill_mode in ('nearest', 'constant'):
+                # convert to OpenCV format (x is width, maps input to output coordinates)
+                swap = np.array([[0, 1, 0], [1, 0, 0], [0, 0, 1]], dtype=np.float64)
+                matrices = np.matmul(np.matmul(swap, np.linalg.inv(matrices)), swap)
+                border_mode = 'replicate' if self.fill_mode == 'nearest' else 'constant'
+                x = _affine_transform_batch(x, matrices, self.order, border_mode, self.cval, strict_bounds=True)
+            else:
+                x = np.stack(
+                    [affine_transform(img, m, 2, self.fill_mode, self.cval, self.order) for img, m in zip(x, matrices)]
+                )
+
+        if self.pixel_transforms:
+            dtype = x.dtype
+            if np.issubdtype(dtype, np.floating):
+                scale = 1.
+                x = x.astype(np.promote_types(dtype, np.float32))
+            else:
+                scale = float(np.iinfo(dtype).max)
+                x = x.astype(np.float32)
+            for fn, kwargs in self.pixel_transforms:
+                fn(x, scale, **kwargs)
+            if not np.issubdtype(dtype, np.floating):
+                info = np.iinfo(dtype)
+                np.clip(np.rint(x, out=x), info.min, info.max, out=x)
+            x = x.astype(dtype, copy=False)
+
+        if is_grey:
+            x = x[..., 0]
+        return x
+
+
 # Numpy and PIL
 def array_to_img(x, dim_ordering=(0, 1, 2), scale=True):
     """Converts a numpy array to PIL image object (uint8 format).
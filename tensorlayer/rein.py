@@ -1,39 +1,65 @@
 #! /usr/bin/python
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+import traceback
+
 import numpy as np
 
 import tensorflow as tf
 
-from six.moves import xrange
-
 __all__ = [
     'discount_episode_rewards',
+    'generalized_advantage_estimation',
     'cross_entropy_reward_loss',
     'log_weight',
     'choice_action_by_probs',
+    'choice_actions_by_probs',
+    'VectorEnv',
+    'ReplayBuffer',
+    'PrioritizedReplayBuffer',
 ]
 
 
-def discount_episode_rewards(rewards=None, gamma=0.99, mode=0):
+def _discounted_cumsum(values, discounts):
+    """Compute y[t] = values[t] + discounts[t] * y[t + 1] backwards along the last axis, with y[T] = 0.
+
+    The linear recurrence is solved by a parallel scan in log2(T) vectorized steps, instead of T Python steps.
+    """
+    y = np.array(values, dtype=np.float64)
+    a = np.array(np.broadcast_to(discounts, y.shape), dtype=np.float64)
+    shift = 1
+    while shift < y.shape[-1]:
+        # fold y[t + shift] into y[t], then a[t] becomes the product of the discounts over [t, t + 2 * shift)
+        y[..., :-shift] += a[..., :-shift] * y[..., shift:]
+        a[..., :-shift] *= a[..., shift:]
+        shift *= 2
+    return y
+
+
+def discount_episode_rewards(rewards=None, gamma=0.99, mode=0, dones=None):
     """Take 1D float array of rewards and compute discounted rewards for an
     episode. When encount a non-zero value, consider as the end a of an episode.
 
     Parameters
     ----------
-    rewards : list
-        List of rewards
+    rewards : list or numpy.array
+        List of rewards, or an array of shape [n_envs, T] of the rewards of several environments, the time is the
+        last axis.
     gamma : float
         Discounted factor
     mode : int
         Mode for computing the discount rewards.
             - If mode == 0, reset the discount process when encount a non-zero reward (Ping-pong game).
             - If mode == 1, would not reset the discount process.
+    dones : list or numpy.array or None
+        The episode ends, with the shape of ``rewards``. If ``dones[t]`` is true, the discount process is reset
+        after step t.
 
     Returns
     --------
-    list of float
-        The discounted rewards.
+    numpy.array of float32
+        The discounted rewards, with the shape of ``rewards``.
 
     Examples
     ----------
@@ -51,15 +77,59 @@ def discount_episode_rewards(rewards=None, gamma=0.99, mode=0):
     """
     if rewards is None:
         raise Exception("rewards should be a list")
-    discounted_r = np.zeros_like(rewards, dtype=np.float32)
-    running_add = 0
-    for t in reversed(xrange(0, rewards.size)):
-        if mode == 0:
-            if rewards[t] != 0: running_add = 0
+    rewards = np.asarray(rewards)
+    discounts = np.full(rewards.shape, gamma, dtype=np.float64)
+    if mode == 0:
+        discounts[rewards != 0] = 0
+    if dones is not None:
+        discounts[np.asarray(dones, dtype=bool)] = 0
+    return _discounted_cumsum(rewards, discounts).astype(np.float32)
+
 
-        running_add = running_add * gamma + rewards[t]
-        discounted_r[t] = running_add
-    return discounted_r
+def generalized_advantage_estimation(rewards, values, last_values=0, dones=None, gamma=0.99, lam=0.95):
+    """Compute the Generalized Advantage Estimation (GAE) of a rollout, for actor-critic methods such as A2C and PPO.
+
+    Parameters
+    ----------
+    rewards : numpy.array
+        The rewards of shape [T], or [n_envs, T] for several environments, the time is the last axis.
+    values : numpy.array
+        The value estimations of the states of the steps, with the shape of ``rewards``.
+    last_values : float or numpy.array
+        The value estimation of the state after the last step, of shape [n_envs] for several environments,
+        0 if the rollout ends with the episode.
+    dones : numpy.array or None
+        The episode ends, with the shape of ``rewards``. If ``dones[t]`` is true, the state after step t is not
+        bootstrapped.
+    gamma : float
+        Discounted factor
+    lam : float
+        The GAE lambda, 0 gives the one-step TD errors and 1 gives the discounted returns minus the values.
+
+    Returns
+    --------
+    advantages : numpy.array of float32
+        The advantages, with the shape of ``rewards``.
+    returns : numpy.array of float32
+        The targets of the value function, ``advantages + values``.
+
+    Examples
+    ----------
+    >>> advantages, returns = tl.rein.generalized_advantage_estimation(
+    >>>     rewards, values, last_values=sess.run(value, {state: next_states}), dones=dones, gamma=0.99, lam=0.95)
+
+    References
+    ----------
+    - `High-Dimensional Continuous Control Using Generalized Advantage Estimation <https://arxiv.org/abs/1506.02438>`__
+
+    """
+    rewards = np.asarray(rewards, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    next_values = np.concatenate([values[..., 1:], np.broadcast_to(last_values, values.shape[:-1])[..., None]], axis=-1)
+    not_done = 1.0 if dones is None else 1.0 - np.asarray(dones, dtype=np.float64)
+    deltas = rewards + gamma * not_done * next_values - values
+    advantages = _discounted_cumsum(deltas, gamma * lam * not_done)
+    return advantages.astype(np.float32), (advantages + values).astype(np.float32)
 
 
 def cross_entropy_reward_loss(logits, actions, rewards, name=None):
@@ -159,3 +229,440 @@ def choice_action_by_probs(probs=(0.5, 0.5), action_list=None):
         if len(action_list) != len(probs):
             raise Exception("number of actions should equal to number of probabilities.")
     return np.random.choice(action_list, p=probs)
+
+
+def choice_actions_by_probs(probs, action_list=None):
+    """Choice and return an action for each row of a matrix of action probability distributions.
+
+    The rows are e.g. the distributions of several environments. The actions are sampled at once by inverting the
+    cumulative distributions, instead of one ``np.random.choice`` per row.
+
+    Parameters
+    ------------
+    probs : numpy.array
+        The probability distributions of shape [n_envs, n_actions], e.g. the softmax outputs of a policy network.
+    action_list : None or a list of int or others
+        A list of n_actions actions. If None, returns integers between 0 and n_actions-1.
+
+    Returns
+    --------
+    numpy.array
+        The chosen actions, of shape [n_envs].
+
+    Examples
+    ----------
+    >>> probs = sess.run(policy, feed_dict={states: obs})  # obs of all the environments, see VectorEnv
+    >>> actions = tl.rein.choice_actions_by_probs(probs)
+
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if action_list is not None and len(action_list) != probs.shape[-1]:
+        raise Exception("number of actions should equal to number of probabilities.")
+    cdf = np.cumsum(probs, axis=-1)
+    # scale by the total so that rounding errors of the probabilities never leave the last action unreachable
+    u = np.random.random_sample(probs.shape[:-1] + (1, )) * cdf[..., -1:]
+    actions = np.minimum((u >= cdf).sum(axis=-1), probs.shape[-1] - 1)
+    return actions if action_list is None else np.asarray(action_list)[actions]
+
+
+def _vector_env_worker(remote, parent_remote, env_fn, obs_buffer, index):
+    parent_remote.close()
+    obs_buffer = np.frombuffer(obs_buffer[0], dtype=obs_buffer[1]).reshape(obs_buffer[2])
+    env = None
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'close':
+                break
+            try:
+                # created here so that an error is sent to the parent like the errors of the steps
+                if env is None:
+                    env = env_fn()
+                if command == 'step':
+                    obs, reward, done, info = env.step(data)
+                    if done:
+                        obs = env.reset()
+                    obs_buffer[index] = obs
+                    remote.send((reward, done, info))
+                elif command == 'reset':
+                    obs_buffer[index] = env.reset()
+                    remote.send(None)
+            except Exception:
+                remote.send(RuntimeError(traceback.format_exc()))
+    finally:
+        if env is not None:
+            env.close()
+        remote.close()
+
+
+class VectorEnv(object):
+    """Step several environments with a batch of actions.
+
+    A single ``sess.run`` of the policy then serves all the environments. With ``asynchronous=True``, each environment
+    runs in a subprocess and writes its observations into a shared memory buffer, so only the actions, rewards and
+    infos go through the pipes. With ``asynchronous=False``, the environments are stepped one after the other in the
+    current process, with the same interface. An environment whose episode is done is reset automatically, its
+    observation is then the first one of the new episode.
+
+    Parameters
+    ------------
+    env_fns : list of function
+        The functions creating the environments, e.g. ``[lambda: gym.make('Pong-v0')] * 8``. With ``asynchronous=True``,
+        they are called in the subprocesses, and should be picklable if the start method of multiprocessing is not fork.
+    asynchronous : boolean
+        Whether to run the environments in subprocesses.
+    obs_shape : tuple of int or None
+        The shape of an observation. If None, an environment is created and reset to find it.
+    obs_dtype : numpy.dtype or None
+        The dtype of the observations. If None, found as ``obs_shape``.
+
+    Examples
+    ----------
+    >>> envs = tl.rein.VectorEnv([lambda: gym.make('CartPole-v0')] * 16)
+    >>> obs = envs.reset()
+    >>> for step in range(n_steps):
+    >>>     probs = sess.run(policy_probs, feed_dict={states: obs})
+    >>>     actions = tl.rein.choice_actions_by_probs(probs)
+    >>>     obs, rewards, dones, infos = envs.step(actions)
+    >>> envs.close()
+
+    """
+
+    def __init__(self, env_fns, asynchronous=True, obs_shape=None, obs_dtype=None):
+        self.num_envs = len(env_fns)
+        self.asynchronous = asynchronous
+        self.closed = False
+        if obs_shape is None or obs_dtype is None:
+            env = env_fns[0]()
+            obs = np.asarray(env.reset())
+            env.close()
+            obs_shape = obs.shape if obs_shape is None else obs_shape
+            obs_dtype = obs.dtype if obs_dtype is None else obs_dtype
+        shape = (self.num_envs, ) + tuple(obs_shape)
+        obs_dtype = np.dtype(obs_dtype)
+
+        if not asynchronous:
+            self.envs = [env_fn() for env_fn in env_fns]
+            self._obs = np.zeros(shape, dtype=obs_dtype)
+            return
+
+        raw = multiprocessing.RawArray('b', int(np.prod(shape)) * obs_dtype.itemsize)
+        self._obs = np.frombuffer(raw, dtype=obs_dtype).reshape(shape)
+        self.remotes, self.processes = [], []
+        for index, env_fn in enumerate(env_fns):
+            remote, worker_remote = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_vector_env_worker, args=(worker_remote, remote, env_fn, (raw, obs_dtype, shape), index)
+            )
+            process.daemon = True
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self._waiting = False
+
+    def _receive(self):
+        results = [remote.recv() for remote in self.remotes]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def reset(self):
+        """Reset all the environments and return their observations, of shape [n_envs, ...]."""
+        if self.asynchronous:
+            for remote in self.remotes:
+                remote.send(('reset', None))
+            self._receive()
+        else:
+            for index, env in enumerate(self.envs):
+                self._obs[index] = env.reset()
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        """Send the actions to the environments without waiting, see ``step_wait``."""
+        if self.asynchronous:
+            for remote, action in zip(self.remotes, actions):
+                remote.send(('step', action))
+            self._waiting = True
+        else:
+            self._actions = actions
+
+    def step_wait(self):
+        """Wait for the environments to step, see ``step``."""
+        if self.asynchronous:
+            self._waiting = False
+            results = self._receive()
+        else:
+            results = []
+            for index, (env, action) in enumerate(zip(self.envs, self._actions)):
+                obs, reward, done, info = env.step(action)
+                if done:
+                    obs = env.reset()
+                self._obs[index] = obs
+                results.append((reward, done, info))
+        rewards, dones, infos = zip(*results)
+        return self._obs.copy(), np.asarray(rewards, dtype=np.float32), np.asarray(dones, dtype=np.bool_), list(infos)
+
+    def step(self, actions):
+        """Step all the environments with a batch of actions.
+
+        Parameters
+        ------------
+        actions : numpy.array or list
+            The actions of the environments.
+
+        Returns
+        --------
+        tuple
+            ``(obs, rewards, dones, infos)``, the observations of shape [n_envs, ...], the float32 rewards and the
+            boolean episode ends of shape [n_envs], and the list of infos.
+
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """Close the environments and stop the subprocesses."""
+        if self.closed:
+            return
+        self.closed = True
+        if not self.asynchronous:
+            for env in self.envs:
+                env.close()
+            return
+        if self._waiting:
+            self._receive()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+
+
+class ReplayBuffer(object):
+    """Experience replay memory of a fixed capacity, stored in a preallocated NumPy structured array.
+
+    The array is used as a ring buffer, the oldest transitions are overwritten when the buffer is full, and minibatches
+    are sampled uniformly with vectorized indexing. For Atari observations made of the last ``frame_stack`` frames, only
+    the newest frame of each observation is stored, and the stacks are rebuilt when sampling, which divides the memory
+    of the observations by about ``frame_stack``.
+
+    Parameters
+    ------------
+    capacity : int
+        The maximum number of transitions.
+    obs_shape : tuple of int
+        The shape of an observation, or of a single frame if ``frame_stack`` is larger than 1, e.g. ``(84, 84)``.
+    obs_dtype : numpy.dtype
+        The dtype of the observations, e.g. ``np.uint8`` for frames.
+    action_shape : tuple of int
+        The shape of an action, ``()`` for discrete actions.
+    action_dtype : numpy.dtype
+        The dtype of the actions.
+    frame_stack : int
+        The number of frames stacked in an observation. If larger than 1, the given observations are stacks of frames
+        along ``stack_axis``, the frames before the start of an episode are the first frame of the episode, as ``gym``
+        frame stacking.
+    stack_axis : int
+        The axis of the frames in a stacked observation.
+
+    Examples
+    ----------
+    >>> buffer = tl.rein.ReplayBuffer(100000, obs_shape=(84, 84), obs_dtype=np.uint8, frame_stack=4)
+    >>> buffer.add(obs, action, reward, next_obs, done)  # obs and next_obs of shape (84, 84, 4)
+    >>> obs, actions, rewards, next_obs, dones = buffer.sample(32)
+
+    """
+
+    def __init__(
+            self, capacity, obs_shape, obs_dtype=np.float32, action_shape=(), action_dtype=np.int64, frame_stack=1,
+            stack_axis=-1
+    ):
+        self.capacity = capacity
+        self.frame_stack = frame_stack
+        self.stack_axis = stack_axis
+        fields = [
+            ('obs', obs_dtype, tuple(obs_shape)),
+            ('action', action_dtype, tuple(action_shape)),
+            ('reward', np.float32),
+            ('done', np.bool_),
+            ('next_obs', obs_dtype, tuple(obs_shape)),
+        ]
+        if frame_stack > 1:
+            # whether a transition starts an episode, its older frames are then the newest one
+            fields.append(('first', np.bool_))
+        self.storage = np.zeros(capacity, dtype=fields)
+        self._next_idx = 0
+        self._size = 0
+        self._episode_start = True
+
+    def __len__(self):
+        return self._size
+
+    def add(self, obs, action, reward, next_obs, done):
+        """Add a transition, overwriting the oldest one if the buffer is full, and return its index."""
+        idx = self._next_idx
+        transition = self.storage[idx:idx + 1]
+        if self.frame_stack > 1:
+            # only keep the newest frames
+            obs = np.take(obs, -1, axis=self.stack_axis)
+            next_obs = np.take(next_obs, -1, axis=self.stack_axis)
+            transition['first'] = self._episode_start
+            self._episode_start = bool(done)
+        transition['obs'] = obs
+        transition['action'] = action
+        transition['reward'] = reward
+        transition['done'] = done
+        transition['next_obs'] = next_obs
+        self._next_idx = (idx + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return idx
+
+    def _stacked_frames(self, indices):
+        """Return the indices of the frames of the observations, of shape [batch_size, frame_stack]."""
+        oldest = self._next_idx if self._size == self.capacity else 0
+        frames = np.empty((len(indices), self.frame_stack), dtype=np.int64)
+        frames[:, -1] = indices
+        stopped = self.storage['first'][indices]
+        for j in range(1, self.frame_stack):
+            previous = (indices - j) % self.capacity
+            # stop at the start of the episode or at the oldest transition, and repeat the frame from there
+            stopped |= (indices - oldest) % self.capacity < j
+            frames[:, -1 - j] = np.where(stopped, frames[:, -j], previous)
+            stopped |= self.storage['first'][previous]
+        return frames
+
+    def _get_transitions(self, indices):
+        transitions = self.storage[indices]
+        if self.frame_stack == 1:
+            obs, next_obs = transitions['obs'], transitions['next_obs']
+        else:
+            frames = self.storage['obs'][self._stacked_frames(indices)]
+            next_frames = np.concatenate([frames[:, 1:], transitions['next_obs'][:, None]], axis=1)
+            axis = self.stack_axis if self.stack_axis < 0 else self.stack_axis + 1
+            obs, next_obs = np.moveaxis(frames, 1, axis), np.moveaxis(next_frames, 1, axis)
+        return obs, transitions['action'], transitions['reward'], next_obs, transitions['done']
+
+    def sample(self, batch_size):
+        """Sample a minibatch of transitions uniformly.
+
+        Returns
+        --------
+        tuple of numpy.array
+            ``(obs, actions, rewards, next_obs, dones)``, each with a first dimension of ``batch_size``.
+
+        """
+        if self._size == 0:
+            raise ValueError("cannot sample from an empty buffer")
+        return self._get_transitions(np.random.randint(0, self._size, size=batch_size))
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Prioritized experience replay memory, where the transitions are sampled proportionally to their priorities.
+
+    The priorities are kept in a sum tree and a min tree, so that adding, updating and sampling a minibatch of
+    transitions cost O(log n) vectorized operations. New transitions get the maximum priority seen so far.
+
+    Parameters
+    ------------
+    capacity : int
+        The maximum number of transitions.
+    obs_shape : tuple of int
+        The shape of an observation, see ``ReplayBuffer``.
+    alpha : float
+        How much prioritization is used, 0 is uniform sampling.
+    kwargs : other arguments
+        See ``ReplayBuffer``.
+
+    Examples
+    ----------
+    >>> buffer = tl.rein.PrioritizedReplayBuffer(100000, obs_shape=(4, ), alpha=0.6)
+    >>> buffer.add(obs, action, reward, next_obs, done)
+    >>> obs, actions, rewards, next_obs, dones, weights, indices = buffer.sample(32, beta=0.4)
+    >>> td_errors = ...  # train with the loss weighted by the importance-sampling weights
+    >>> buffer.update_priorities(indices, np.abs(td_errors) + 1e-6)
+
+    References
+    ------------
+    - `Prioritized Experience Replay <https://arxiv.org/abs/1511.05952>`__
+
+    """
+
+    def __init__(self, capacity, obs_shape, alpha=0.6, **kwargs):
+        super(PrioritizedReplayBuffer, self).__init__(capacity, obs_shape, **kwargs)
+        self.alpha = alpha
+        self._tree_capacity = 1
+        while self._tree_capacity < capacity:
+            self._tree_capacity *= 2
+        # node i has the children 2i and 2i+1, the leaves start at tree_capacity
+        self._sum_tree = np.zeros(2 * self._tree_capacity, dtype=np.float64)
+        self._min_tree = np.full(2 * self._tree_capacity, np.inf, dtype=np.float64)
+        self._max_priority = 1.0
+
+    def add(self, obs, action, reward, next_obs, done):
+        idx = super(PrioritizedReplayBuffer, self).add(obs, action, reward, next_obs, done)
+        self._set_priorities(np.array([idx]), np.array([self._max_priority**self.alpha]))
+        return idx
+
+    def _set_priorities(self, indices, priorities):
+        nodes = indices + self._tree_capacity
+        self._sum_tree[nodes] = priorities
+        self._min_tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self._sum_tree[nodes] = self._sum_tree[2 * nodes] + self._sum_tree[2 * nodes + 1]
+            self._min_tree[nodes] = np.minimum(self._min_tree[2 * nodes], self._min_tree[2 * nodes + 1])
+            nodes = np.unique(nodes // 2)
+
+    def update_priorities(self, indices, priorities):
+        """Update the priorities of the sampled transitions, e.g. to their absolute TD errors.
+
+        Parameters
+        ------------
+        indices : numpy.array of int
+            The indices of the transitions returned by ``sample``.
+        priorities : numpy.array of float
+            The new priorities, which should be positive.
+
+        """
+        indices = np.asarray(indices)
+        priorities = np.asarray(priorities, dtype=np.float64)
+        if np.any(priorities <= 0):
+            raise ValueError("priorities should be positive")
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._set_priorities(indices, priorities**self.alpha)
+
+    def sample(self, batch_size, beta=0.4):
+        """Sample a minibatch of transitions proportionally to their priorities.
+
+        Parameters
+        ------------
+        batch_size : int
+            The batch size.
+        beta : float
+            How much the importance-sampling weights compensate the prioritization, 1 fully compensates it.
+
+        Returns
+        --------
+        tuple of numpy.array
+            ``(obs, actions, rewards, next_obs, dones, weights, indices)``, where ``weights`` are the
+            importance-sampling weights normalized by their maximum, and ``indices`` are for ``update_priorities``.
+
+        """
+        if self._size == 0:
+            raise ValueError("cannot sample from an empty buffer")
+        total = self._sum_tree[1]
+        # stratified sampling, a prefix sum in each of batch_size segments of the total priority
+        prefix_sums = (np.arange(batch_size) + np.random.random_sample(batch_size)) * (total / batch_size)
+        nodes = np.ones(batch_size, dtype=np.int64)
+        while nodes[0] < self._tree_capacity:
+            left = 2 * nodes
+            go_right = prefix_sums > self._sum_tree[left]
+            prefix_sums -= np.where(go_right, self._sum_tree[left], 0)
+            nodes = left + go_right
+        indices = np.minimum(nodes - self._tree_capacity, self._size - 1)
+
+        probs = self._sum_tree[indices + self._tree_capacity] / total
+        max_weight = (self._size * self._min_tree[1] / total)**(-beta)
+        weights = ((self._size * probs)**(-beta) / max_weight).astype(np.float32)
+        return self._get_transitions(indices) + (weights, indices)
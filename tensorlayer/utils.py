@@ -9,11 +9,14 @@ from sys import platform as _platform
 
 import random
 import subprocess
+import threading
 import time
+import weakref
 
 from collections import Counter
 
 import numpy as np
+from six.moves import queue
 
 from sklearn.metrics import accuracy_score
 from sklearn.metrics import confusion_matrix
@@ -42,7 +45,7 @@ __all__ = [
 def fit(
         sess, network, train_op, cost, X_train, y_train, x, y_, acc=None, batch_size=100, n_epoch=100, print_freq=5,
         X_val=None, y_val=None, eval_train=True, tensorboard_dir=None, tensorboard_epoch_freq=5,
-        tensorboard_weight_histograms=True, tensorboard_graph_vis=True
+        tensorboard_weight_histograms=True, tensorboard_graph_vis=True, fast_mode=False
 ):
     """Training a given non time-series network by the given cost function, training data, batch_size, n_epoch etc.
 
@@ -90,6 +93,12 @@ def fit(
         of the weight histograms every tensorboard_epoch_freq epoch (default True).
     tensorboard_graph_vis : boolean
         If True stores the graph in the tensorboard summaries saved to log/ (default True).
+    fast_mode : boolean
+        If True, compile the training and evaluation steps with ``sess.make_callable``, stage the batches in a
+        background thread, accumulate the loss and accuracy in variables on the graph that are fetched once per pass,
+        and evaluate without shuffling. The printed losses and accuracies are the same means over the batches. The
+        variables and compiled steps are created at the first call and reused by the next calls with the same
+        ``train_op``.
 
     Examples
     --------
@@ -102,6 +111,9 @@ def fit(
     ...            acc=acc, batch_size=500, n_epoch=200, print_freq=5,
     ...            X_val=X_val, y_val=y_val, eval_train=False,
     ...            tensorboard=True, tensorboard_weight_histograms=True, tensorboard_graph_vis=True)
+    >>> tl.utils.fit(sess, network, train_op, cost, X_train, y_train, x, y_,
+    ...            acc=acc, batch_size=500, n_epoch=200, print_freq=5,
+    ...            X_val=X_val, y_val=y_val, fast_mode=True)
 
     Notes
     --------
@@ -143,25 +155,31 @@ def fit(
         tl.layers.initialize_global_variables(sess)
         tl.logging.info("Finished! use `tensorboard --logdir=%s/` to start tensorboard" % tensorboard_dir)
 
+    dp_dict = dict_to_one(network.all_drop)  # disable noise layers
+    if fast_mode:
+        run_epoch = _compile_fit_epoch(sess, network, train_op, cost, acc, x, y_)
+
     tl.logging.info("Start training the network ...")
     start_time_begin = time.time()
     tensorboard_train_index, tensorboard_val_index = 0, 0
     for epoch in range(n_epoch):
         start_time = time.time()
-        loss_ep = 0
-        n_step = 0
-        for X_train_a, y_train_a in tl.iterate.minibatches(X_train, y_train, batch_size, shuffle=True):
-            feed_dict = {x: X_train_a, y_: y_train_a}
-            feed_dict.update(network.all_drop)  # enable noise layers
-            loss, _ = sess.run([cost, train_op], feed_dict=feed_dict)
-            loss_ep += loss
-            n_step += 1
-        loss_ep = loss_ep / n_step
+        if fast_mode:
+            loss_ep, _ = run_epoch(X_train, y_train, batch_size, train=True)
+        else:
+            loss_ep = 0
+            n_step = 0
+            for X_train_a, y_train_a in tl.iterate.minibatches(X_train, y_train, batch_size, shuffle=True):
+                feed_dict = {x: X_train_a, y_: y_train_a}
+                feed_dict.update(network.all_drop)  # enable noise layers
+                loss, _ = sess.run([cost, train_op], feed_dict=feed_dict)
+                loss_ep += loss
+                n_step += 1
+            loss_ep = loss_ep / n_step
 
         if tensorboard_dir is not None and hasattr(tf, 'summary'):
             if epoch + 1 == 1 or (epoch + 1) % tensorboard_epoch_freq == 0:
                 for X_train_a, y_train_a in tl.iterate.minibatches(X_train, y_train, batch_size, shuffle=True):
-                    dp_dict = dict_to_one(network.all_drop)  # disable noise layers
                     feed_dict = {x: X_train_a, y_: y_train_a}
                     feed_dict.update(dp_dict)
                     result = sess.run(merged, feed_dict=feed_dict)
@@ -169,7 +187,6 @@ def fit(
                     tensorboard_train_index += 1
                 if (X_val is not None) and (y_val is not None):
                     for X_val_a, y_val_a in tl.iterate.minibatches(X_val, y_val, batch_size, shuffle=True):
-                        dp_dict = dict_to_one(network.all_drop)  # disable noise layers
                         feed_dict = {x: X_val_a, y_: y_val_a}
                         feed_dict.update(dp_dict)
                         result = sess.run(merged, feed_dict=feed_dict)
@@ -180,38 +197,24 @@ def fit(
             if (X_val is not None) and (y_val is not None):
                 tl.logging.info("Epoch %d of %d took %fs" % (epoch + 1, n_epoch, time.time() - start_time))
                 if eval_train is True:
-                    train_loss, train_acc, n_batch = 0, 0, 0
-                    for X_train_a, y_train_a in tl.iterate.minibatches(X_train, y_train, batch_size, shuffle=True):
-                        dp_dict = dict_to_one(network.all_drop)  # disable noise layers
-                        feed_dict = {x: X_train_a, y_: y_train_a}
-                        feed_dict.update(dp_dict)
-                        if acc is not None:
-                            err, ac = sess.run([cost, acc], feed_dict=feed_dict)
-                            train_acc += ac
-                        else:
-                            err = sess.run(cost, feed_dict=feed_dict)
-                        train_loss += err
-                        n_batch += 1
-                    tl.logging.info("   train loss: %f" % (train_loss / n_batch))
-                    if acc is not None:
-                        tl.logging.info("   train acc: %f" % (train_acc / n_batch))
-                val_loss, val_acc, n_batch = 0, 0, 0
-                for X_val_a, y_val_a in tl.iterate.minibatches(X_val, y_val, batch_size, shuffle=True):
-                    dp_dict = dict_to_one(network.all_drop)  # disable noise layers
-                    feed_dict = {x: X_val_a, y_: y_val_a}
-                    feed_dict.update(dp_dict)
-                    if acc is not None:
-                        err, ac = sess.run([cost, acc], feed_dict=feed_dict)
-                        val_acc += ac
+                    if fast_mode:
+                        train_loss, train_acc = run_epoch(X_train, y_train, batch_size, train=False)
                     else:
-                        err = sess.run(cost, feed_dict=feed_dict)
-                    val_loss += err
-                    n_batch += 1
+                        train_loss, train_acc = _evaluate_epoch(
+                            sess, cost, acc, X_train, y_train, x, y_, batch_size, dp_dict
+                        )
+                    tl.logging.info("   train loss: %f" % train_loss)
+                    if acc is not None:
+                        tl.logging.info("   train acc: %f" % train_acc)
+                if fast_mode:
+                    val_loss, val_acc = run_epoch(X_val, y_val, batch_size, train=False)
+                else:
+                    val_loss, val_acc = _evaluate_epoch(sess, cost, acc, X_val, y_val, x, y_, batch_size, dp_dict)
 
-                tl.logging.info("   val loss: %f" % (val_loss / n_batch))
+                tl.logging.info("   val loss: %f" % val_loss)
 
                 if acc is not None:
-                    tl.logging.info("   val acc: %f" % (val_acc / n_batch))
+                    tl.logging.info("   val acc: %f" % val_acc)
             else:
                 tl.logging.info(
                     "Epoch %d of %d took %fs, loss %f" % (epoch + 1, n_epoch, time.time() - start_time, loss_ep)
@@ -219,6 +222,87 @@ def fit(
     tl.logging.info("Total training time: %fs" % (time.time() - start_time_begin))
 
 
+def _evaluate_epoch(sess, cost, acc, X, y, x, y_, batch_size, dp_dict):
+    """Return the means of the cost and accuracy (or None) over the batches of one pass, as printed by `fit`."""
+    loss, ac, n_batch = 0, 0, 0
+    for X_a, y_a in tl.iterate.minibatches(X, y, batch_size, shuffle=True):
+        feed_dict = {x: X_a, y_: y_a}
+        feed_dict.update(dp_dict)
+        if acc is not None:
+            err, ac_a = sess.run([cost, acc], feed_dict=feed_dict)
+            ac += ac_a
+        else:
+            err = sess.run(cost, feed_dict=feed_dict)
+        loss += err
+        n_batch += 1
+    return loss / n_batch, (ac / n_batch if acc is not None else None)
+
+
+def _local_scalar(name):
+    """Create a float64 scalar variable in the local variables collection, for accumulating a metric."""
+    return tf.Variable(tf.zeros([], tf.float64), trainable=False, collections=[tf.GraphKeys.LOCAL_VARIABLES], name=name)
+
+
+# the metric ops of the fast mode of `fit` per graph, and their callables per session, built once and reused
+_fit_metrics_cache = weakref.WeakKeyDictionary()
+_fit_callables_cache = weakref.WeakKeyDictionary()
+
+
+def _fit_metrics(train_op, cost, acc):
+    """Return the (train_update, eval_update, means, reset) ops accumulating the metrics, created once per graph."""
+    graph = cost.graph
+    graph_cache = _fit_metrics_cache.setdefault(graph, {})
+    key = (train_op, cost, acc)
+    if key not in graph_cache:
+        with graph.as_default(), tf.name_scope('fit_metrics'):
+            metrics = [cost] if acc is None else [cost, acc]
+            sums = [_local_scalar('sum') for _ in metrics]
+            count = _local_scalar('count')
+            adds = [tf.assign_add(total, tf.cast(metric, tf.float64)) for total, metric in zip(sums, metrics)]
+            train_update = tf.group(train_op, adds[0], tf.assign_add(count, 1))
+            eval_update = tf.group(*(adds + [tf.assign_add(count, 1)]))
+            means = [total / tf.maximum(count, 1) for total in sums]
+            reset = tf.variables_initializer(sums + [count])
+        graph_cache[key] = (train_update, eval_update, means, reset)
+    return graph_cache[key]
+
+
+def _compile_fit_epoch(sess, network, train_op, cost, acc, x, y_):
+    """Build the fast mode of `fit`.
+
+    The cost (and accuracy) of every step are added to variables on the graph in the same ``sess.run`` as the step,
+    and the steps are called through ``sess.make_callable``, which skips the processing of a feed_dict. The variables
+    and ops are created once per graph and ``train_op``, and the callables once per session, so calling `fit` again
+    does not grow the graph.
+
+    Returns a function ``run_epoch(X, y, batch_size, train)`` doing one pass over the data, with the batches staged
+    in a background thread, that returns the means of the cost and accuracy (or None) over the batches.
+    """
+    train_update, eval_update, means, reset = _fit_metrics(train_op, cost, acc)
+
+    drop_keys = list(network.all_drop)
+    session_cache = _fit_callables_cache.setdefault(sess, {})
+    callables_key = (train_update, eval_update, x, y_, tuple(drop_keys))
+    if callables_key not in session_cache:
+        feed_list = [x, y_] + drop_keys
+        session_cache[callables_key] = (
+            sess.make_callable(train_update, feed_list=feed_list), sess.make_callable(eval_update, feed_list=feed_list)
+        )
+    train_step, eval_step = session_cache[callables_key]
+    train_keeps = [network.all_drop[key] for key in drop_keys]  # enable noise layers
+    eval_keeps = [1] * len(drop_keys)  # disable noise layers
+
+    def run_epoch(X, y, batch_size, train):
+        step, keeps = (train_step, train_keeps) if train else (eval_step, eval_keeps)
+        sess.run(reset)
+        for X_a, y_a in _prefetch(tl.iterate.minibatches(X, y, batch_size, shuffle=train)):
+            step(X_a, y_a, *keeps)
+        results = sess.run(means)
+        return results[0], (results[1] if acc is not None else None)
+
+    return run_epoch
+
+
 def test(sess, network, acc, X_test, y_test, x, y_, batch_size, cost=None):
     """
     Test a given non time-series network by the given test data and metric.
@@ -286,7 +370,58 @@ def test(sess, network, acc, X_test, y_test, x, y_, batch_size, cost=None):
         return test_acc / n_batch
 
 
-def predict(sess, network, X, x, y_op, batch_size=None):
+def _predict_feeds(X, batch_size, pad_last_batch):
+    """Yield the (start, end, input batch) of the batches, the last one padded to batch_size if pad_last_batch."""
+    for start in range(0, len(X), batch_size):
+        end = min(start + batch_size, len(X))
+        X_a = np.ascontiguousarray(X[start:end])  # read memory maps here, in the prefetch thread if any
+        if pad_last_batch and end - start < batch_size:
+            padded = np.zeros((batch_size, ) + X_a.shape[1:], dtype=X_a.dtype)
+            padded[:end - start] = X_a
+            X_a = padded
+        yield start, end, X_a
+
+
+def _prefetch(generator, size=2):
+    """Run a generator in a background thread, `size` items ahead."""
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item, error):
+        while not stop.is_set():
+            try:
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in generator:
+                if not put(item, None):
+                    return
+            put(None, StopIteration())
+        except Exception as e:
+            put(None, e)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if isinstance(error, StopIteration):
+                return
+            if error is not None:
+                raise error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def predict(sess, network, X, x, y_op, batch_size=None, prefetch=False, pad_last_batch=False):
     """
     Return the predict results of given non time-series network.
 
@@ -297,7 +432,7 @@ def predict(sess, network, X, x, y_op, batch_size=None):
     network : TensorLayer layer
         The network.
     X : numpy.array
-        The inputs.
+        The inputs, of any rank, e.g. a memory map.
     x : placeholder
         For inputs.
     y_op : placeholder
@@ -305,6 +440,16 @@ def predict(sess, network, X, x, y_op, batch_size=None):
     batch_size : int or None
         The batch size for prediction, when dataset is large, we should use minibatche for prediction;
         if dataset is small, we can set it to None.
+    prefetch : boolean
+        If True, the input batches are prepared in a background thread while the previous batch is running.
+    pad_last_batch : boolean
+        If True, the last batch is padded with zeros to batch_size, so that every ``sess.run`` has the same input shape,
+        e.g. for a placeholder with a fixed batch size. The outputs of the padding are discarded.
+
+    Returns
+    --------
+    numpy.array
+        The outputs of ``y_op`` of all the inputs, written into an array allocated once.
 
     Examples
     --------
@@ -314,46 +459,34 @@ def predict(sess, network, X, x, y_op, batch_size=None):
     >>> y_op = tf.argmax(tf.nn.softmax(y), 1)
     >>> print(tl.utils.predict(sess, network, X_test, x, y_op))
 
+    Predict a large memory-mapped dataset
+
+    >>> X_test = np.load('X_test.npy', mmap_mode='r')
+    >>> y_predict = tl.utils.predict(sess, network, X_test, x, y_op, batch_size=500, prefetch=True)
+
     """
+    dp_dict = dict_to_one(network.all_drop)  # disable noise layers
     if batch_size is None:
-        dp_dict = dict_to_one(network.all_drop)  # disable noise layers
         feed_dict = {
             x: X,
         }
         feed_dict.update(dp_dict)
         return sess.run(y_op, feed_dict=feed_dict)
-    else:
-        result = None
-        for X_a, _ in tl.iterate.minibatches(X, X, batch_size, shuffle=False):
-            dp_dict = dict_to_one(network.all_drop)
-            feed_dict = {
-                x: X_a,
-            }
-            feed_dict.update(dp_dict)
-            result_a = sess.run(y_op, feed_dict=feed_dict)
-            if result is None:
-                result = result_a
-            else:
-                result = np.concatenate((result, result_a))
+
+    feeds = _predict_feeds(X, batch_size, pad_last_batch)
+    if prefetch:
+        feeds = _prefetch(feeds)
+    result = None
+    for start, end, X_a in feeds:
+        feed_dict = {
+            x: X_a,
+        }
+        feed_dict.update(dp_dict)
+        result_a = sess.run(y_op, feed_dict=feed_dict)
         if result is None:
-            if len(X) % batch_size != 0:
-                dp_dict = dict_to_one(network.all_drop)
-                feed_dict = {
-                    x: X[-(len(X) % batch_size):, :],
-                }
-                feed_dict.update(dp_dict)
-                result_a = sess.run(y_op, feed_dict=feed_dict)
-                result = result_a
-        else:
-            if len(X) != len(result) and len(X) % batch_size != 0:
-                dp_dict = dict_to_one(network.all_drop)
-                feed_dict = {
-                    x: X[-(len(X) % batch_size):, :],
-                }
-                feed_dict.update(dp_dict)
-                result_a = sess.run(y_op, feed_dict=feed_dict)
-                result = np.concatenate((result, result_a))
-        return result
+            result = np.empty((len(X), ) + result_a.shape[1:], dtype=result_a.dtype)
+        result[start:end] = result_a[:end - start]
+    return result
 
 
 ## Evaluation
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class _Network(object):
+    """The attributes of a network used by the export."""
+
+    def __init__(self, outputs, all_layers, all_params, all_drop):
+        self.outputs = outputs
+        self.all_layers = all_layers
+        self.all_params = all_params
+        self.all_drop = all_drop
+
+
+def _variable(shape, name, low=-1., high=1.):
+    return tf.Variable(np.random.uniform(low, high, shape).astype(np.float32), name=name)
+
+
+def _batch_norm(x, n_channels, name):
+    """The ops of a batch normalization in inference mode, on non-trivial moving statistics."""
+    with tf.variable_scope(name):
+        beta = _variable([n_channels], 'beta')
+        gamma = _variable([n_channels], 'gamma', 0.5, 2.)
+        moving_mean = _variable([n_channels], 'moving_mean')
+        moving_variance = _variable([n_channels], 'moving_variance', 0.5, 2.)
+        outputs = tf.nn.batch_normalization(x, moving_mean, moving_variance, beta, gamma, 1e-3)
+    return outputs, [beta, gamma, moving_mean, moving_variance]
+
+
+class Files_Export_Inference_Graph_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        x = tf.placeholder(tf.float32, [None, 16, 16, 3], name='x')
+        keep = tf.placeholder(tf.float32, name='keep')
+
+        drop = tf.nn.dropout(x, keep_prob=keep)
+        W_conv = _variable([3, 3, 3, 8], 'conv/W')
+        conv = tf.nn.conv2d(drop, W_conv, strides=[1, 1, 1, 1], padding='SAME', name='conv/Conv2D')
+        bn1, bn1_params = _batch_norm(conv, 8, 'bn1')
+        relu = tf.nn.relu(bn1, name='bn1/Relu')
+        flatten = tf.reshape(relu, [-1, 16 * 16 * 8], name='flatten')
+        W_dense = _variable([16 * 16 * 8, 10], 'dense/W')
+        b_dense = _variable([10], 'dense/b')
+        dense = tf.nn.bias_add(tf.matmul(flatten, W_dense), b_dense, name='dense/BiasAdd')
+        bn2, bn2_params = _batch_norm(dense, 10, 'bn2')
+
+        cls.net = _Network(
+            bn2, [drop, conv, relu, flatten, dense, bn2], [W_conv] + bn1_params + [W_dense, b_dense] + bn2_params,
+            {keep: 0.8}
+        )
+
+        cls.path = os.path.join(tempfile.mkdtemp(), 'model.pb')
+        cls.X = np.random.random((4, 16, 16, 3)).astype(np.float32)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            cls.y = sess.run(bn2, feed_dict={x: cls.X, keep: 1.})
+            cls.report = tl.files.export_inference_graph(cls.net, x, bn2, sess=sess, name=cls.path, n_runs=2)
+
+        cls.keep_name = keep.op.name
+        cls.output_name = bn2.name
+
+        cls.graph_def = tf.GraphDef()
+        with tf.gfile.GFile(cls.path, 'rb') as f:
+            cls.graph_def.ParseFromString(f.read())
+
+    @classmethod
+    def tearDownClass(cls):
+        tf.reset_default_graph()
+
+    def test_report(self):
+        self.assertEqual(self.report['n_folded_batch_norms'], 2)
+        self.assertEqual(self.report['n_nodes'], len(self.graph_def.node))
+        self.assertLess(self.report['n_nodes'], self.report['original_n_nodes'])
+        self.assertGreater(self.report['latency'], 0)
+        self.assertGreater(self.report['original_latency'], 0)
+
+    def test_stripped_ops(self):
+        ops = dict((node.name, node.op) for node in self.graph_def.node)
+        self.assertNotIn('VariableV2', ops.values())
+        self.assertNotIn('Rsqrt', ops.values())
+        self.assertEqual(list(ops.values()).count('Placeholder'), 1)
+        # the keeping probability is a constant equal to 1
+        self.assertNotEqual(ops.get(self.keep_name, 'Const'), 'Placeholder')
+        # the normalizations are folded into BiasAdds keeping the output names
+        self.assertEqual(ops[self.output_name.split(':')[0]], 'BiasAdd')
+
+    def test_outputs(self):
+        with tf.Graph().as_default():
+            y, = tf.import_graph_def(self.graph_def, return_elements=[self.output_name], name='')
+            with tf.Session() as sess:
+                np.testing.assert_allclose(sess.run(y, feed_dict={'x:0': self.X}), self.y, rtol=1e-4, atol=1e-4)
+
+
+class Files_Fold_Dropout_Test(CustomTestCase):
+
+    def test_fold_dropout(self):
+        with tf.Graph().as_default() as graph:
+            x = tf.placeholder(tf.float32, [None, 4], name='x')
+            keep = tf.placeholder(tf.float32, name='keep')
+            # the ops of tf.nn.dropout
+            floor = tf.floor(keep + tf.random_uniform(tf.shape(x)))
+            drop = tf.multiply(tf.div(x, keep), floor, name='drop')
+            y = tf.nn.relu(drop, name='y')
+
+        graph_def = tl.layers.folding._fold_dropout(graph.as_graph_def(), [keep.op.name])
+        graph_def = tf.graph_util.extract_sub_graph(graph_def, [y.op.name])
+
+        nodes = dict((node.name, node) for node in graph_def.node)
+        self.assertEqual(nodes['drop'].op, 'Identity')
+        self.assertEqual(list(nodes['drop'].input), ['x'])
+        self.assertNotIn('RandomUniform', [node.op for node in graph_def.node])
+        self.assertNotIn('keep', nodes)
+
+        X = np.random.random((3, 4)).astype(np.float32) - 0.5
+        with tf.Graph().as_default():
+            y, = tf.import_graph_def(graph_def, return_elements=['y:0'], name='')
+            with tf.Session() as sess:
+                np.testing.assert_allclose(sess.run(y, feed_dict={'x:0': X}), np.maximum(X, 0))
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class _Unconvertible(object):
+    """A value that fails to be written."""
+
+    def __array__(self, *args, **kwargs):
+        raise ValueError("cannot convert")
+
+
+class Files_Sharded_Params_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.values = [
+            np.random.random((5, 7)).astype(np.float32),
+            np.arange(13, dtype=np.int64),
+            np.random.random((3, 2, 4)).astype(np.float64),
+            np.array(3, dtype=np.int32),
+            np.random.random((0, 4)).astype(np.float32),
+            (np.random.random((6, )) > 0.5),
+        ]
+        cls.params = [tf.Variable(value, name='var%d' % idx, trainable=False) for idx, value in enumerate(cls.values)]
+        cls.names = [param.name for param in cls.params]
+
+        cls.sess = tf.Session()
+        cls.sess.run(tf.global_variables_initializer())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sess.close()
+        tf.reset_default_graph()
+
+    def _save(self, max_shard_bytes=64):
+        name = os.path.join(tempfile.mkdtemp(), 'model')
+        tl.files.save_sharded_params(self.params, name=name, sess=self.sess, max_shard_bytes=max_shard_bytes)
+        return name
+
+    def test_round_trip(self):
+        name = self._save()
+
+        shards = [filename for filename in os.listdir(name) if filename.endswith('.bin')]
+        self.assertGreater(len(shards), 1)
+        self.assertFalse(os.path.exists(name + '.tmp'))
+
+        for mmap in [True, False]:
+            params = tl.files.load_sharded_params(name, mmap=mmap)
+            self.assertEqual(len(params), len(self.values))
+            for param, value in zip(params, self.values):
+                self.assertEqual(param.dtype, value.dtype)
+                self.assertEqual(param.shape, value.shape)
+                np.testing.assert_array_equal(param, value)
+
+    def test_trailing_separator(self):
+        save_dir = tempfile.mkdtemp()
+        name = os.path.join(save_dir, 'model') + os.sep
+        tl.files.save_sharded_params(self.params, name=name, sess=self.sess)
+        tl.files.save_sharded_params(self.params, name=name, sess=self.sess)
+
+        self.assertEqual(os.listdir(save_dir), ['model'])
+        self.assertNotIn('.tmp', os.listdir(name))
+        for param, value in zip(tl.files.load_sharded_params(name), self.values):
+            np.testing.assert_array_equal(param, value)
+
+    def test_failed_save(self):
+        name = self._save()
+        with self.assertRaises(ValueError):
+            tl.files.utils._write_sharded_params(name, self.names + ['broken'], self.values + [_Unconvertible()])
+
+        # the previous save is kept and the temporary folder is removed
+        self.assertEqual(os.listdir(os.path.dirname(name)), ['model'])
+        for param, value in zip(tl.files.load_sharded_params(name), self.values):
+            np.testing.assert_array_equal(param, value)
+
+    def test_load_subset(self):
+        name = self._save()
+
+        params = tl.files.load_sharded_params(name, names=[self.names[2], self.names[0]])
+        self.assertEqual(len(params), 2)
+        np.testing.assert_array_equal(params[0], self.values[2])
+        np.testing.assert_array_equal(params[1], self.values[0])
+
+        with self.assertRaises(KeyError):
+            tl.files.load_sharded_params(name, names=['missing:0'])
+
+    def test_save_over_mmap(self):
+        name = self._save()
+        params = tl.files.load_sharded_params(name, mmap=True)
+
+        # a single shard this time, the shards of the previous save must not be written in place
+        tl.files.save_sharded_params(self.params[:3], name=name, sess=self.sess)
+        for param, value in zip(params, self.values):
+            np.testing.assert_array_equal(param, value)
+
+        shards = [filename for filename in os.listdir(name) if filename.endswith('.bin')]
+        self.assertEqual(len(shards), 1)
+        reloaded = tl.files.load_sharded_params(name, mmap=True)
+        self.assertEqual(len(reloaded), 3)
+        for param, value in zip(reloaded, self.values[:3]):
+            np.testing.assert_array_equal(param, value)
+
+
+class _Network(object):
+    """The parameters of a network, all that the assign functions use."""
+
+    def __init__(self, all_params):
+        self.all_params = all_params
+
+
+class Files_Assign_Params_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        params = [
+            tf.Variable(tf.zeros([8, 4]), name='dense1/W'),
+            tf.Variable(tf.zeros([4]), name='dense1/b'),
+            tf.Variable(tf.zeros([4, 2]), name='dense2/W'),
+            tf.Variable(tf.zeros([2]), name='dense2/b'),
+        ]
+        cls.net = _Network(params)
+
+        cls.sess = tf.Session()
+        cls.sess.run(tf.global_variables_initializer())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sess.close()
+        tf.reset_default_graph()
+
+    def _random_params(self):
+        return [np.random.random(param.get_shape().as_list()).astype(np.float32) for param in self.net.all_params]
+
+    def test_assign_does_not_grow_graph(self):
+        graph = self.sess.graph
+        tl.files.assign_params(self.sess, self._random_params(), self.net)
+        n_ops = len(graph.get_operations())
+
+        for _ in range(3):
+            params = self._random_params()
+            tl.files.assign_params(self.sess, params, self.net)
+            self.assertEqual(len(graph.get_operations()), n_ops)
+            for value, param in zip(self.sess.run(self.net.all_params), params):
+                np.testing.assert_allclose(value, param)
+
+    def test_assign_ops_cached(self):
+        tl.files.assign_params(self.sess, self._random_params(), self.net)
+        ops = tl.files.assign_params(self.sess, self._random_params(), self.net)
+        self.assertEqual(len(ops), len(self.net.all_params))
+        self.assertEqual(ops, tl.files.assign_params(self.sess, self._random_params(), self.net))
+
+        # without a session, self-contained assign ops are returned and can be run again
+        params = self._random_params()
+        ops = tl.files.assign_params(None, params, self.net)
+        self.sess.run(ops)
+        self.sess.run(ops)
+        for value, param in zip(self.sess.run(self.net.all_params), params):
+            np.testing.assert_allclose(value, param)
+
+    def test_load_and_assign_sharded_does_not_grow_graph(self):
+        name = os.path.join(tempfile.mkdtemp(), 'model')
+        graph = self.sess.graph
+
+        tl.files.save_sharded_params(self.net.all_params, name=name, sess=self.sess)
+        tl.files.load_and_assign_sharded_params(self.sess, name=name, network=self.net)
+        n_ops = len(graph.get_operations())
+
+        params = self._random_params()
+        tl.files.assign_params(self.sess, params, self.net)
+        tl.files.save_sharded_params(self.net.all_params, name=name, sess=self.sess)
+        tl.files.assign_params(self.sess, self._random_params(), self.net)
+        tl.files.load_and_assign_sharded_params(self.sess, name=name, network=self.net)
+        self.assertEqual(len(graph.get_operations()), n_ops)
+        for value, param in zip(self.sess.run(self.net.all_params), params):
+            np.testing.assert_allclose(value, param)
+
+
+class Files_Async_Saver_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.W = tf.Variable(np.random.random((4, 3)).astype(np.float32), name='W')
+        cls.b = tf.Variable(np.zeros((3, ), dtype=np.float32), name='b')
+        cls.params = [cls.W, cls.b]
+
+        cls.sess = tf.Session()
+        cls.sess.run(tf.global_variables_initializer())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sess.close()
+        tf.reset_default_graph()
+
+    def test_max_to_keep(self):
+        for file_format in ['npz', 'npz_dict', 'sharded']:
+            save_dir = tempfile.mkdtemp()
+            saver = tl.files.AsyncSaver(save_dir=save_dir, name='model', max_to_keep=2, file_format=file_format)
+            for step in range(4):
+                self.sess.run(self.b.assign(np.full((3, ), step, dtype=np.float32)))
+                saver.save(self.sess, self.params, step=step)
+            saver.wait()
+
+            self.assertEqual(len(saver.checkpoints), 2)
+            self.assertEqual(sorted(os.listdir(save_dir)), sorted(os.path.basename(c) for c in saver.checkpoints))
+            self.assertTrue(saver.last_checkpoint.startswith(os.path.join(save_dir, 'model-3')))
+
+            if file_format == 'npz':
+                params = np.load(saver.last_checkpoint, allow_pickle=True)['params']
+            elif file_format == 'npz_dict':
+                params = np.load(saver.last_checkpoint)
+                params = [params[param.name] for param in self.params]
+            else:
+                params = tl.files.load_sharded_params(saver.last_checkpoint)
+            np.testing.assert_array_equal(params[0], self.sess.run(self.W))
+            np.testing.assert_array_equal(params[1], np.full((3, ), 3, dtype=np.float32))
+
+    def test_wait_raises_write_error(self):
+        save_dir = tempfile.mkdtemp()
+        # a folder in the way of the checkpoint file makes the rename fail in the writer thread
+        os.mkdir(os.path.join(save_dir, 'model-1.npz'))
+        saver = tl.files.AsyncSaver(save_dir=save_dir, name='model', max_to_keep=None)
+
+        saver.save(self.sess, self.params, step=1)
+        with self.assertRaises(OSError):
+            saver.wait()
+        self.assertIsNone(saver.last_checkpoint)
+        # the temporary file of the failed write is removed
+        self.assertEqual(os.listdir(save_dir), ['model-1.npz'])
+
+        # the error is raised once, the saver keeps working
+        saver.wait()
+        path = saver.save(self.sess, self.params, step=2)
+        saver.wait()
+        self.assertEqual(saver.last_checkpoint, path)
+        self.assertTrue(os.path.isfile(path))
+
+    def test_save_raises_write_error(self):
+        save_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(save_dir, 'model-1.npz'))
+        saver = tl.files.AsyncSaver(save_dir=save_dir, name='model')
+
+        saver.save(self.sess, self.params, step=1)
+        saver._queue.join()
+        with self.assertRaises(OSError):
+            saver.save(self.sess, self.params, step=2)
+
+    def test_close(self):
+        save_dir = tempfile.mkdtemp()
+        saver = tl.files.AsyncSaver(save_dir=save_dir, name='model', max_to_keep=None, file_format='sharded')
+        for step in range(3):
+            saver.save(self.sess, self.params, step=step)
+        thread = saver._thread
+
+        # close waits for the scheduled checkpoints and stops the thread
+        saver.close()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(os.listdir(save_dir)), ['model-0', 'model-1', 'model-2'])
+        saver.close()
+
+        # a new thread is started by the next save
+        saver.save(self.sess, self.params, step=3)
+        saver.close()
+        self.assertEqual(saver.last_checkpoint, os.path.join(save_dir, 'model-3'))
+
+    def test_close_raises_write_error(self):
+        save_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(save_dir, 'model-1.npz'))
+        saver = tl.files.AsyncSaver(save_dir=save_dir, name='model')
+
+        saver.save(self.sess, self.params, step=1)
+        with self.assertRaises(OSError):
+            saver.close()
+        self.assertIsNone(saver._thread)
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
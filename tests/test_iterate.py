@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+def _distort(example):
+    x, y = example
+    return x * 2, y + 1
+
+
+class Iterate_Data_Loader_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X = np.arange(230 * 3, dtype=np.float32).reshape(230, 3)
+        cls.y = np.arange(230, dtype=np.int64)
+
+    def _check_order(self, backend, num_workers):
+        for allow_dynamic_batch_size in [False, True]:
+            loader = tl.iterate.DataLoader(
+                self.X, self.y, batch_size=16, allow_dynamic_batch_size=allow_dynamic_batch_size,
+                num_workers=num_workers, prefetch=3, backend=backend
+            )
+            try:
+                expected = list(
+                    tl.iterate.minibatches(self.X, self.y, 16, allow_dynamic_batch_size=allow_dynamic_batch_size)
+                )
+                # two epochs, the buffers are reused
+                for _ in range(2):
+                    batches = [(X_batch.copy(), y_batch.copy()) for X_batch, y_batch in loader]
+                    self.assertEqual(len(batches), len(expected))
+                    self.assertEqual(len(batches), len(loader))
+                    for (X_batch, y_batch), (X_expected, y_expected) in zip(batches, expected):
+                        np.testing.assert_array_equal(X_batch, X_expected)
+                        np.testing.assert_array_equal(y_batch, y_expected)
+            finally:
+                loader.close()
+
+    def _check_close(self, backend):
+        loader = tl.iterate.DataLoader(
+            self.X, self.y, batch_size=16, allow_dynamic_batch_size=True, shuffle=True, num_workers=2, backend=backend
+        )
+        indices = np.concatenate([y_batch.copy() for _, y_batch in loader])
+        # every example once per epoch
+        np.testing.assert_array_equal(np.sort(indices), self.y)
+        self.assertFalse(np.array_equal(indices, np.arange(len(indices))))
+
+        # an interrupted epoch, the next one starts over
+        for step, _ in enumerate(loader):
+            if step == 2:
+                break
+        self.assertEqual(len([batch for batch in loader]), len(loader))
+
+        workers = loader._workers
+        self.assertTrue(all(worker.is_alive() for worker in workers))
+        loader.close()
+        self.assertIsNone(loader._workers)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        loader.close()
+
+        # new workers are started by the next iteration
+        self.assertEqual(len([batch for batch in loader]), len(loader))
+        loader.close()
+
+    def test_thread_order(self):
+        self._check_order('thread', num_workers=3)
+
+    def test_process_order(self):
+        self._check_order('process', num_workers=2)
+
+    def test_thread_close(self):
+        self._check_close('thread')
+
+    def test_process_close(self):
+        self._check_close('process')
+
+    def test_transform(self):
+        loader = tl.iterate.DataLoader(self.X, self.y, batch_size=32, transform=_distort, num_workers=2)
+        try:
+            for (X_batch, y_batch), (X_expected, y_expected) in zip(loader, tl.iterate.minibatches(self.X, self.y, 32)):
+                np.testing.assert_array_equal(X_batch, X_expected * 2)
+                np.testing.assert_array_equal(y_batch, y_expected + 1)
+        finally:
+            loader.close()
+
+    def test_invalid(self):
+        with self.assertRaises(AssertionError):
+            tl.iterate.DataLoader(self.X, self.y[:-1])
+        with self.assertRaises(ValueError):
+            tl.iterate.DataLoader(self.X, self.y, backend='gpu')
+
+
+class Iterate_Bucket_Minibatches_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        cls.lengths = rng.randint(0, 60, size=203)
+        cls.sequences = [rng.randint(1, 1000, size=length).tolist() for length in cls.lengths]
+        # the labels are the indices of the sequences
+        cls.labels = np.arange(len(cls.sequences))
+
+    def _check_batch(self, x, sequence_length, mask, indices, pad_value=0):
+        self.assertEqual(x.dtype, np.int32)
+        self.assertEqual(sequence_length.dtype, np.int32)
+        self.assertEqual(mask.dtype, np.int32)
+        self.assertEqual(x.shape, (len(indices), self.lengths[indices].max()))
+        np.testing.assert_array_equal(sequence_length, self.lengths[indices])
+        np.testing.assert_array_equal(mask, np.arange(x.shape[1]) < self.lengths[indices][:, None])
+        for row, idx in zip(x, indices):
+            np.testing.assert_array_equal(row[:self.lengths[idx]], self.sequences[idx])
+            self.assertTrue(np.all(row[self.lengths[idx]:] == pad_value))
+
+    def test_every_index_once(self):
+        for bucket_boundaries in [None, [10, 20, 40]]:
+            for shuffle in [False, True]:
+                indices = []
+                for x, y, sequence_length, mask in tl.iterate.bucket_minibatches(self.sequences, self.labels,
+                                                                                 batch_size=16,
+                                                                                 bucket_boundaries=bucket_boundaries,
+                                                                                 shuffle=shuffle):
+                    self.assertLessEqual(len(y), 16)
+                    self._check_batch(x, sequence_length, mask, y)
+                    if bucket_boundaries is not None:
+                        # a batch does not cross the boundaries
+                        buckets = np.searchsorted(bucket_boundaries, self.lengths[y], side='right')
+                        self.assertEqual(len(set(buckets)), 1)
+                    indices.extend(y)
+                np.testing.assert_array_equal(np.sort(indices), self.labels)
+
+    def test_sorted_by_length(self):
+        batches = list(tl.iterate.bucket_minibatches(self.sequences, batch_size=16))
+        self.assertEqual(len(batches), (len(self.sequences) + 15) // 16)
+        lengths = np.concatenate([sequence_length for _, sequence_length, _ in batches])
+        np.testing.assert_array_equal(lengths, np.sort(self.lengths))
+
+    def test_fixed_batch_size(self):
+        bucket_boundaries = [10, 20, 40]
+        buckets = np.searchsorted(bucket_boundaries, self.lengths, side='right')
+        indices = []
+        for _, y, _, _ in tl.iterate.bucket_minibatches(self.sequences, self.labels, batch_size=16,
+                                                        bucket_boundaries=bucket_boundaries,
+                                                        allow_dynamic_batch_size=False, shuffle=True):
+            self.assertEqual(len(y), 16)
+            indices.extend(y)
+        # the last partial batch of every bucket is dropped
+        self.assertEqual(len(set(indices)), len(indices))
+        self.assertEqual(len(indices), sum(np.sum(buckets == bucket) // 16 * 16 for bucket in range(4)))
+
+    def test_sequence_targets(self):
+        targets = [[-value for value in sequence] for sequence in self.sequences]
+        for x, y, sequence_length, mask in tl.iterate.bucket_minibatches(self.sequences, targets, batch_size=32,
+                                                                         pad_value=7):
+            np.testing.assert_array_equal(y, np.where(mask, -x, 7))
+            indices = [self.sequences.index(row[:length].tolist()) for row, length in zip(x, sequence_length)]
+            self._check_batch(x, sequence_length, mask, np.array(indices), pad_value=7)
+
+    def test_invalid(self):
+        with self.assertRaises(AssertionError):
+            list(tl.iterate.bucket_minibatches(self.sequences, self.labels[:-1]))
+
+
+class Iterate_PTB_Iterator_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = np.random.RandomState(0).randint(0, 10000, size=1037)
+
+    def _assert_same_batches(self, iterator, expected):
+        batches = list(iterator)
+        self.assertEqual(len(batches), len(expected))
+        for (x, y), (x_expected, y_expected) in zip(batches, expected):
+            np.testing.assert_array_equal(x, x_expected)
+            np.testing.assert_array_equal(y, y_expected)
+
+    def test_same_as_ptb_iterator(self):
+        for batch_size, num_steps in [(1, 1), (2, 3), (20, 35), (7, 147)]:
+            expected = list(tl.iterate.ptb_iterator(self.data.tolist(), batch_size, num_steps))
+            iterator = tl.iterate.PTBIterator(self.data.tolist(), batch_size, num_steps)
+            self.assertEqual(len(iterator), len(expected))
+            # the batches are the same at every epoch
+            for epoch in range(2):
+                self._assert_same_batches(iterator, expected)
+                self.assertEqual(iterator.epoch, epoch + 1)
+                self.assertEqual(iterator.step, 0)
+
+    def test_views_of_the_stream(self):
+        data = self.data.astype(np.int64)
+        expected = list(tl.iterate.ptb_iterator(data, 4, 10))
+        iterator = tl.iterate.PTBIterator(data, 4, 10)
+        for x, y in iterator:
+            self.assertEqual(x.dtype, np.int64)
+            self.assertTrue(np.shares_memory(x, data))
+            self.assertTrue(np.shares_memory(y, data))
+        self._assert_same_batches(iterator, expected)
+
+    def test_resume(self):
+        expected = list(tl.iterate.ptb_iterator(self.data, 5, 8))
+        iterator = tl.iterate.PTBIterator(self.data, 5, 8)
+        for step, _ in enumerate(iterator):
+            if step == 3:
+                break
+        self.assertEqual(iterator.step, 4)
+        # the interrupted epoch goes on from the next batch
+        self._assert_same_batches(iterator, expected[4:])
+        self.assertEqual(iterator.epoch, 1)
+        self._assert_same_batches(iterator, expected)
+
+    def test_random_offset(self):
+        data = np.arange(1000)
+        batch_size, num_steps = 6, 9
+        iterator = tl.iterate.PTBIterator(data, batch_size, num_steps, random_offset=True)
+        offsets = set()
+        for _ in range(30):
+            batches = list(iterator)
+            self.assertEqual(len(batches), len(iterator))
+            offset = batches[0][0][0, 0]
+            self.assertLess(offset, num_steps)
+            offsets.add(offset)
+            expected = tl.iterate.ptb_iterator(
+                data[offset:offset + batch_size * iterator.batch_len], batch_size, num_steps
+            )
+            for (x, y), (x_expected, y_expected) in zip(batches, expected):
+                np.testing.assert_array_equal(x, x_expected)
+                np.testing.assert_array_equal(y, y_expected)
+        self.assertGreater(len(offsets), 1)
+
+    def test_shards(self):
+        num_shards = 3
+        shard_len = len(self.data) // num_shards
+        for shard_index in range(num_shards):
+            shard = self.data[shard_index * shard_len:(shard_index + 1) * shard_len]
+            iterator = tl.iterate.PTBIterator(self.data, 4, 10, num_shards=num_shards, shard_index=shard_index)
+            self._assert_same_batches(iterator, list(tl.iterate.ptb_iterator(shard, 4, 10)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            tl.iterate.PTBIterator(self.data, 100, 20)
+        with self.assertRaises(ValueError):
+            tl.iterate.PTBIterator(self.data, 4, 10, num_shards=2, shard_index=2)
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -223,6 +223,155 @@ class Layer_Core_Test(CustomTestCase):
         self.assertEqual(self.net9_n_params, 310)
 
 
+class _Input(tl.layers.Layer):
+    """An input layer on the base constructor, whose output is not a layer output."""
+
+    def __init__(self, inputs, name):
+        super(_Input, self).__init__(prev_layer=None, name=name)
+        self.outputs = inputs
+
+
+class _Dense(tl.layers.Layer):
+    """A dense layer chained through the base constructor and `_add_prev_layer`."""
+
+    def __init__(self, prev_layer, n_units, name):
+        super(_Dense, self).__init__(prev_layer=prev_layer, name=name)
+        n_in = int(self.inputs.get_shape()[-1])
+        with tf.variable_scope(name):
+            W = tf.get_variable('W', shape=(n_in, n_units), initializer=tf.zeros_initializer())
+            b = tf.get_variable('b', shape=(n_units, ), initializer=tf.zeros_initializer())
+        self.outputs = tf.matmul(self.inputs, W) + b
+        self._add_layers(self.outputs)
+        self._add_params([W, b])
+
+
+class _Add(tl.layers.Layer):
+    """A layer with several previous layers."""
+
+    def __init__(self, prev_layer, name):
+        super(_Add, self).__init__(prev_layer=prev_layer, name=name)
+        self.outputs = tf.add_n(self.inputs)
+        self._add_layers(self.outputs)
+
+
+class Layer_Shared_Ordered_Set_Test(CustomTestCase):
+
+    def _items(self, n):
+        return [object() for _ in range(n)]
+
+    def test_share_and_extend(self):
+        a0, a1, b0, a2 = self._items(4)
+        a = tl.layers.core._SharedOrderedSet()
+        a.extend([a0, a1])
+        b = tl.layers.core._SharedOrderedSet()
+        b.share(a)
+        b.extend([b0, a1, a0])
+        # items added after the share are not seen by the sets sharing it
+        a.extend([a2, a0])
+
+        self.assertEqual(a.to_list(), [a0, a1, a2])
+        self.assertEqual(b.to_list(), [a0, a1, b0])
+
+    def test_diamond(self):
+        base0, base1, left, right = self._items(4)
+        base = tl.layers.core._SharedOrderedSet()
+        base.extend([base0, base1])
+        branches = []
+        for item in [left, right]:
+            branch = tl.layers.core._SharedOrderedSet()
+            branch.share(base)
+            branch.extend([item])
+            branches.append(branch)
+        merged = tl.layers.core._SharedOrderedSet()
+        merged.share(branches[0])
+        merged.share(branches[1])
+
+        self.assertEqual(merged.to_list(), [base0, base1, left, right])
+
+    def test_thaw(self):
+        a0, a1, a2 = self._items(3)
+        a = tl.layers.core._SharedOrderedSet()
+        a.extend([a0, a1])
+        self.assertEqual(a.to_list(), [a0, a1])
+
+        # shared after the list is cached, then extended
+        b = tl.layers.core._SharedOrderedSet()
+        b.share(a)
+        a.extend([a2])
+        self.assertEqual(a.to_list(), [a0, a1, a2])
+        self.assertEqual(b.to_list(), [a0, a1])
+
+        # created from a list, as assigned by the user
+        c = tl.layers.core._SharedOrderedSet([a2, a0])
+        c.extend([a1, a2])
+        self.assertEqual(c.to_list(), [a2, a0, a1])
+
+    def test_deep_chain(self):
+        sets = [tl.layers.core._SharedOrderedSet()]
+        items = self._items(5000)
+        for item in items:
+            s = tl.layers.core._SharedOrderedSet()
+            s.share(sets[-1])
+            s.extend([item, items[0]])
+            sets.append(s)
+        self.assertEqual(sets[-1].to_list(), items)
+        self.assertEqual(sets[100].to_list(), items[:100])
+
+
+class Layer_Shared_Lists_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        x = tf.placeholder(tf.float32, shape=[None, 30])
+        net = _Input(x, name='input')
+        net = _Dense(net, n_units=30, name='dense0')
+        cls.net0 = net
+        cls.net0_params = net.all_params
+
+        for i in range(1, 50):
+            net_res = _Dense(net, n_units=30, name='dense%d' % i)
+            net = _Add([net, net_res], name='add%d' % i)
+
+        cls.net = net
+
+    @classmethod
+    def tearDownClass(cls):
+        tf.reset_default_graph()
+
+    def test_all_layers(self):
+        self.assertEqual(len(self.net.all_layers), 1 + 49 * 2)
+        self.assertEqual(len(set(self.net.all_layers)), len(self.net.all_layers))
+        self.assertIs(self.net.all_layers[-1], self.net.outputs)
+        self.assertIs(self.net.all_layers[0], self.net0.outputs)
+        self.assertEqual(len(self.net0.all_layers), 1)
+
+    def test_all_params(self):
+        self.assertEqual(
+            [p.name for p in self.net.all_params], ['dense%d/%s:0' % (i, v) for i in range(50) for v in 'Wb']
+        )
+        self.assertEqual(len(self.net0_params), 2)
+        self.assertEqual(self.net.count_params(), 50 * (30 * 30 + 30))
+
+    def test_assign_all_params(self):
+        net = _Dense(self.net, n_units=10, name='dense_out')
+        net.all_params = net.all_params[-2:]
+        self.assertEqual(net.count_params(), 310)
+        net = _Dense(net, n_units=10, name='dense_out2')
+        self.assertEqual(len(net.all_params), 4)
+        self.assertEqual([p.name for p in net.all_params[:2]], ['dense_out/W:0', 'dense_out/b:0'])
+
+        # the assignment does not change the layers built before
+        self.assertEqual(len(self.net.all_params), 100)
+
+    def test_assign_all_layers(self):
+        net = _Dense(self.net, n_units=10, name='dense_layers')
+        net.all_layers = [net.outputs]
+        net = _Dense(net, n_units=10, name='dense_layers2')
+        self.assertEqual(len(net.all_layers), 2)
+        self.assertEqual(len(self.net.all_layers), 1 + 49 * 2)
+
+
 if __name__ == '__main__':
 
     tf.logging.set_verbosity(tf.logging.DEBUG)
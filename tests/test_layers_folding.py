@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class _Network(object):
+    """The attributes of a network used by the folding."""
+
+    def __init__(self, outputs, all_layers, all_drop=None):
+        self.outputs = outputs
+        self.all_layers = all_layers
+        self.all_drop = all_drop or {}
+
+
+def _variable(shape, name, low=-1., high=1.):
+    return tf.Variable(np.random.uniform(low, high, shape).astype(np.float32), name=name)
+
+
+def _batch_norm(x, n_channels, name):
+    """The ops of a batch normalization in inference mode, on non-trivial moving statistics."""
+    with tf.variable_scope(name):
+        beta = _variable([n_channels], 'beta')
+        gamma = _variable([n_channels], 'gamma', 0.5, 2.)
+        moving_mean = _variable([n_channels], 'moving_mean')
+        moving_variance = _variable([n_channels], 'moving_variance', 0.5, 2.)
+        return tf.nn.batch_normalization(x, moving_mean, moving_variance, beta, gamma, 1e-3)
+
+
+def _conv(x, n_in, n_out, name):
+    W = _variable([3, 3, n_in, n_out], name + '/W')
+    return tf.nn.conv2d(x, W, strides=[1, 1, 1, 1], padding='SAME', name=name + '/Conv2D')
+
+
+class Layer_Fold_Batch_Norms_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        x = tf.placeholder(tf.float32, [None, 16, 16, 3])
+
+        # without bias
+        conv1 = _conv(x, 3, 8, 'conv1')
+        bn1 = tf.nn.relu(_batch_norm(conv1, 8, 'bn1'), name='bn1/Relu')
+        # with a broadcast bias
+        conv2 = tf.add(_conv(bn1, 8, 8, 'conv2'), _variable([8], 'conv2/b'), name='conv2/add')
+        bn2 = _batch_norm(conv2, 8, 'bn2')
+        # depthwise
+        W_depthwise = _variable([3, 3, 8, 2], 'depthwise/W')
+        depthwise = tf.nn.depthwise_conv2d(bn2, W_depthwise, [1, 1, 1, 1], 'SAME', name='depthwise/depthwise')
+        bn3 = _batch_norm(depthwise, 16, 'bn3')
+        flatten = tf.reshape(bn3, [-1, 16 * 16 * 16], name='flatten')
+        # with a BiasAdd
+        dense = tf.nn.bias_add(
+            tf.matmul(flatten, _variable([16 * 16 * 16, 10], 'dense/W')), _variable([10], 'dense/b'),
+            name='dense/BiasAdd'
+        )
+        bn4 = _batch_norm(dense, 10, 'bn4')
+
+        net = _Network(bn4, [conv1, bn1, conv2, bn2, depthwise, bn3, flatten, dense, bn4])
+
+        X = np.random.random((4, 16, 16, 3)).astype(np.float32)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            net_folded = tl.layers.fold_batch_norms(sess, net, x, name='folded')
+            cls.y, cls.y_folded = sess.run([net.outputs, net_folded.outputs], feed_dict={x: X})
+
+        cls.net = net
+        cls.net_folded = net_folded
+        cls.folded_ops = [op.type for op in tf.get_default_graph().get_operations() if op.name.startswith('folded/')]
+
+    @classmethod
+    def tearDownClass(cls):
+        tf.reset_default_graph()
+
+    def test_outputs(self):
+        self.assertEqual(self.y_folded.shape, self.y.shape)
+        np.testing.assert_allclose(self.y_folded, self.y, rtol=1e-4, atol=1e-4)
+
+    def test_layers(self):
+        # the outputs of the folded layers are replaced by the ones of their normalizations
+        self.assertEqual(len(self.net_folded.all_layers), len(self.net.all_layers) - 4)
+        self.assertEqual(
+            [t.op.name for t in self.net_folded.all_layers],
+            ['folded/' + t.op.name for t in [self.net.all_layers[i] for i in [1, 3, 5, 6, 8]]]
+        )
+        self.assertEqual(len(self.net_folded.all_params), 0)
+
+    def test_folded_ops(self):
+        self.assertNotIn('Rsqrt', self.folded_ops)
+        self.assertNotIn('Mul', self.folded_ops)
+        self.assertNotIn('VariableV2', self.folded_ops)
+        self.assertEqual(self.folded_ops.count('BiasAdd'), 4)
+
+
+class Layer_Fold_Batch_Norms_Skipped_Test(CustomTestCase):
+
+    def tearDown(self):
+        tf.reset_default_graph()
+
+    def test_not_folded(self):
+        x = tf.placeholder(tf.float32, [None, 8, 8, 3])
+
+        # the statistics of the batch are not constant
+        conv1 = _conv(x, 3, 4, 'conv1')
+        mean, variance = tf.nn.moments(conv1, axes=[0, 1, 2])
+        bn1 = tf.nn.batch_normalization(conv1, mean, variance, None, None, 1e-3)
+        # the outputs of the convolution are used outside of the normalization
+        conv2 = _conv(bn1, 4, 4, 'conv2')
+        bn2 = _batch_norm(conv2, 4, 'bn2') + conv2
+        # not a layer of the network
+        conv3 = _conv(bn2, 4, 4, 'conv3')
+        bn3 = _batch_norm(conv3, 4, 'bn3')
+
+        net = _Network(bn3, [conv1, bn1, conv2, bn2, bn3])
+        X = np.random.random((4, 8, 8, 3)).astype(np.float32)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            with self.assertLogs('tensorlayer', level='INFO') as logs:
+                net_folded = tl.layers.fold_batch_norms(sess, net, x, name='folded')
+            y, y_folded = sess.run([net.outputs, net_folded.outputs], feed_dict={x: X})
+
+        self.assertIn('0 batch norms folded', logs.output[-1])
+        self.assertEqual(len(net_folded.all_layers), len(net.all_layers))
+        np.testing.assert_allclose(y_folded, y, rtol=1e-4, atol=1e-4)
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
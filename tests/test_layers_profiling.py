@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import tempfile
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class _Input(tl.layers.Layer):
+    """An input layer on the base constructor, whose output is not a layer output."""
+
+    def __init__(self, inputs, name):
+        super(_Input, self).__init__(prev_layer=None, name=name)
+        self.outputs = inputs
+
+
+class _Dense(tl.layers.Layer):
+    """A dense layer creating its parameters in `__init__`, as the layers instrumented by `profile_build`."""
+
+    def __init__(self, prev_layer, n_units, act=None, name='dense'):
+        super(_Dense, self).__init__(prev_layer=prev_layer, act=act, name=name)
+        n_in = int(self.inputs.get_shape()[-1])
+        with tf.variable_scope(name):
+            W = tf.get_variable('W', shape=(n_in, n_units), initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b = tf.get_variable('b', shape=(n_units, ), initializer=tf.zeros_initializer())
+            self.outputs = self._apply_activation(tf.matmul(self.inputs, W) + b)
+        self._add_layers(self.outputs)
+        self._add_params([W, b])
+
+
+class _Conv2d(tl.layers.Layer):
+    """A convolution without bias."""
+
+    def __init__(self, prev_layer, n_filter, filter_size, name='conv'):
+        super(_Conv2d, self).__init__(prev_layer=prev_layer, name=name)
+        shape = filter_size + (int(self.inputs.get_shape()[-1]), n_filter)
+        with tf.variable_scope(name):
+            W = tf.get_variable('W', shape=shape, initializer=tf.truncated_normal_initializer(stddev=0.1))
+            self.outputs = tf.nn.conv2d(self.inputs, W, strides=[1, 1, 1, 1], padding='SAME')
+        self._add_layers(self.outputs)
+        self._add_params([W])
+
+
+class _Stack(tl.layers.Layer):
+    """A layer building other layers."""
+
+    def __init__(self, prev_layer, n_units, name='stack'):
+        super(_Stack, self).__init__(prev_layer=prev_layer, name=name)
+        net = _Dense(prev_layer, n_units, act=tf.nn.relu, name=name + '_dense1')
+        net = _Dense(net, n_units, name=name + '_dense2')
+        self.outputs = net.outputs
+        self._add_layers(net.all_layers)
+        self._add_params(net.all_params)
+
+
+class _Dropout(tl.layers.Layer):
+    """A dropout layer whose keeping probability is fed by `all_drop`."""
+
+    def __init__(self, prev_layer, keep, name='drop'):
+        super(_Dropout, self).__init__(prev_layer=prev_layer, name=name)
+        keep_prob = tf.placeholder(tf.float32)
+        with tf.variable_scope(name):
+            self.outputs = tf.nn.dropout(self.inputs, keep_prob=keep_prob)
+        self._add_dropout_layers({keep_prob: keep})
+        self._add_layers(self.outputs)
+
+
+class Layer_Profile_Build_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        x = tf.placeholder(tf.float32, [None, 784])
+        x_image = tf.placeholder(tf.float32, [None, 32, 32, 3])
+
+        with tl.layers.profile_build(sort_by='flops') as profile:
+            net = _Input(x, name='input')
+            net = _Dense(net, n_units=800, act=tf.nn.relu, name='relu1')
+            net = _Dense(net, n_units=10, name='output')
+            net = _Stack(net, n_units=20, name='stack')
+
+            net_image = _Input(x_image, name='input_image')
+            net_image = _Conv2d(net_image, n_filter=8, filter_size=(3, 3), name='conv')
+
+        cls.net = net
+        cls.profile = profile
+        cls.records = dict((record['name'], record) for record in profile.records)
+
+    @classmethod
+    def tearDownClass(cls):
+        tf.reset_default_graph()
+
+    def test_records(self):
+        self.assertEqual(
+            [(record['name'], record['class'], record['depth']) for record in self.profile.records], [
+                ('input', '_Input', 0),
+                ('relu1', '_Dense', 0),
+                ('output', '_Dense', 0),
+                ('stack_dense1', '_Dense', 1),
+                ('stack_dense2', '_Dense', 1),
+                ('stack', '_Stack', 0),
+                ('input_image', '_Input', 0),
+                ('conv', '_Conv2d', 0),
+            ]
+        )
+
+        relu1 = self.records['relu1']
+        self.assertEqual(relu1['n_params'], 784 * 800 + 800)
+        self.assertEqual(relu1['output_shape'], [None, 800])
+        # matmul, bias and relu, the initializers are not counted
+        self.assertEqual(relu1['flops'], 2 * 784 * 800 + 800 + 800)
+        self.assertEqual(relu1['activation_bytes'], 800 * 4)
+        self.assertGreaterEqual(relu1['time'], 0)
+
+        self.assertEqual(self.records['output']['flops'], 2 * 800 * 10 + 10)
+        self.assertEqual(self.records['input']['n_params'], 0)
+        self.assertEqual(self.records['input']['flops'], 0)
+
+        conv = self.records['conv']
+        self.assertEqual(conv['n_params'], 3 * 3 * 3 * 8)
+        self.assertEqual(conv['output_shape'], [None, 32, 32, 8])
+        self.assertEqual(conv['flops'], 2 * 3 * 3 * 3 * 8 * 32 * 32)
+
+    def test_nested_records(self):
+        # the numbers of a layer include the ones of the layers it built
+        stack = self.records['stack']
+        dense1, dense2 = self.records['stack_dense1'], self.records['stack_dense2']
+        self.assertEqual(stack['n_params'], (10 * 20 + 20) + (20 * 20 + 20))
+        self.assertEqual(stack['n_params'], dense1['n_params'] + dense2['n_params'])
+        self.assertEqual(stack['flops'], dense1['flops'] + dense2['flops'])
+        self.assertGreaterEqual(stack['time'], dense1['time'] + dense2['time'])
+
+        outermost = [record for record in self.profile.records if record['depth'] == 0]
+        self.assertEqual(sum(record['n_params'] for record in outermost), self.net.count_params() + 3 * 3 * 3 * 8)
+
+    def test_sorted_records(self):
+        self.assertEqual(self.profile.sorted_records('flops')[0]['name'], 'relu1')
+        self.assertEqual(self.profile.sorted_records('activation_bytes')[0]['name'], 'conv')
+        self.assertEqual(self.profile.sorted_records(None)[0]['name'], 'input')
+
+    def test_to_json(self):
+        path = os.path.join(tempfile.mkdtemp(), 'profile.json')
+        self.assertEqual(json.loads(self.profile.to_json(path)), self.profile.records)
+        with open(path) as f:
+            self.assertEqual(json.load(f), self.profile.records)
+
+    def test_print_table(self):
+        with self.assertLogs('tensorlayer', level='INFO') as logs:
+            self.profile.print_table(sort_by='activation_bytes', top=2)
+        # the header, the first two layers and the total of the outermost layers
+        self.assertEqual(len(logs.output), 4)
+        self.assertIn('conv', logs.output[1])
+        self.assertIn('total (8 layers)', logs.output[-1])
+
+    def test_hooks_removed(self):
+        with tl.layers.profile_build(print_table=False) as profile:
+            pass
+        _Dense(self.net, n_units=10, name='output2')
+        self.assertEqual(profile.records, [])
+        self.assertEqual(_Dense.__init__.__name__, '__init__')
+        self.assertNotIn('wrapper', repr(tl.layers.Layer.__init__))
+
+
+class Layer_Profile_Run_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        x = tf.placeholder(tf.float32, [None, 784])
+        y_ = tf.placeholder(tf.int64, [None])
+
+        net = _Input(x, name='input')
+        net = _Dropout(net, keep=0.8, name='drop')
+        net = _Dense(net, n_units=800, act=tf.nn.relu, name='relu1')
+        net = _Dense(net, n_units=10, name='output')
+        cls.net = net
+
+        cost = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(labels=y_, logits=net.outputs))
+        train_op = tf.train.GradientDescentOptimizer(0.1).minimize(cost, var_list=net.all_params)
+
+        cls.trace_path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+        feed_dict = {x: np.random.random((64, 784)), y_: np.zeros(64)}
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            cls.profile = tl.layers.profile_run(
+                sess, net, feed_dict, fetches=[cost, train_op], n_steps=2, chrome_trace_path=cls.trace_path
+            )
+            cls.inference_profile = tl.layers.profile_run(sess, net, feed_dict, n_steps=2, print_table=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        tf.reset_default_graph()
+
+    def test_records(self):
+        names = [record['name'] for record in self.profile.records]
+        self.assertEqual(len(names), 4)
+        self.assertTrue(names[0].startswith('drop'))
+        self.assertEqual(names[1:], ['relu1', 'output', '(other)'])
+
+        records = dict((record['name'], record) for record in self.profile.records)
+        self.assertGreater(records['relu1']['time'], records['output']['time'])
+        for name in names:
+            self.assertGreater(records[name]['n_ops'], 0)
+        self.assertGreater(self.profile.step_time, 0)
+
+        # the inference does not run the optimizer
+        inference_records = dict((record['name'], record) for record in self.inference_profile.records)
+        self.assertLess(inference_records['(other)']['n_ops'], records['(other)']['n_ops'])
+
+    def test_gradients_assigned_to_layers(self):
+        training = dict((record['name'], record) for record in self.profile.records)
+        inference = dict((record['name'], record) for record in self.inference_profile.records)
+        self.assertGreater(training['relu1']['n_ops'], inference['relu1']['n_ops'])
+        self.assertGreater(training['output']['n_ops'], inference['output']['n_ops'])
+
+    def test_layer_of(self):
+        scopes = set(['relu1', 'output', 'block/conv'])
+        self.assertEqual(tl.layers.profiling._layer_of('relu1/MatMul', scopes), 'relu1')
+        self.assertEqual(tl.layers.profiling._layer_of('gradients/relu1/MatMul_grad/MatMul', scopes), 'relu1')
+        self.assertEqual(tl.layers.profiling._layer_of('gradients_1/output/add_grad/Sum', scopes), 'output')
+        self.assertEqual(tl.layers.profiling._layer_of('block/conv/Conv2D', scopes), 'block/conv')
+        self.assertIsNone(tl.layers.profiling._layer_of('block/Relu', scopes))
+        # a scope is not the layer of the op named like it
+        self.assertIsNone(tl.layers.profiling._layer_of('relu1', scopes))
+
+    def test_critical_path(self):
+        self.assertEqual([name for name, _ in self.inference_profile.critical_path][-2:], ['relu1', 'output'])
+        for _, took in self.inference_profile.critical_path:
+            self.assertGreater(took, 0)
+        self.assertAlmostEqual(
+            sum(took for _, took in self.inference_profile.critical_path),
+            sum(record['critical_time'] for record in self.inference_profile.records)
+        )
+
+        graph = tf.Graph()
+        with graph.as_default():
+            a = tf.constant(1., name='a')
+            b = tf.identity(a, name='b')
+            c = tf.identity(a, name='c')
+            tf.add(b, c, name='d')
+        durations = {'a': 1., 'b': 1., 'c': 3., 'd': 1.}
+        self.assertEqual(tl.layers.profiling._critical_path(graph, durations), ['a', 'c', 'd'])
+        durations['b'] = 5.
+        self.assertEqual(tl.layers.profiling._critical_path(graph, durations), ['a', 'b', 'd'])
+
+    def test_chrome_trace(self):
+        with open(self.trace_path) as f:
+            events = json.load(f)['traceEvents']
+        names = set(event.get('args', {}).get('name', '') for event in events)
+        self.assertTrue(any(name.startswith('relu1/') for name in names))
+        self.assertTrue(any(name.startswith('gradients') for name in names))
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import os
+import tempfile
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class Nlp_Count_Words_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        rng = np.random.RandomState(0)
+        vocab = ['the', 'a', 'of', 'tensorlayer', 'x', 'longerwordthanachunk', 'é']
+        cls.words = [vocab[i] for i in rng.randint(len(vocab), size=500)]
+
+        # words longer than the chunks, empty lines, lines with and without spaces around
+        lines = [' '.join(cls.words[i:i + 13]) for i in range(0, 200, 13)]
+        lines[2] = ''
+        lines[5] = ' ' + lines[5] + ' '
+        lines[7] = lines[7] + '\t'
+        cls.filenames = []
+        for i in range(2):
+            filename = os.path.join(tempfile.mkdtemp(), 'text%d.txt' % i)
+            with open(filename, 'w') as f:
+                f.write('\n'.join(lines[i::2]) + '\n')
+            cls.filenames.append(filename)
+        cls.file_words = tl.nlp.read_words(cls.filenames[0]) + tl.nlp.read_words(cls.filenames[1])
+
+        counter = collections.Counter(cls.words)
+        cls.word_to_id = dict((word, idx) for idx, (word, _) in enumerate(counter.most_common(4)))
+        cls.word_to_id['UNK'] = len(cls.word_to_id)
+
+    def test_count_words(self):
+        for num_workers in [1, 2]:
+            for chunk_size in [7, 1000]:
+                counter = tl.nlp.count_words(self.words, num_workers=num_workers, chunk_size=chunk_size)
+                self.assertEqual(counter, collections.Counter(self.words))
+
+    def test_count_words_files(self):
+        self.assertIn('longerwordthanachunk', self.file_words)
+        for num_workers in [1, 2]:
+            # chunks shorter than some words and lines
+            for chunk_size in [5, 16, 2**22]:
+                counter = tl.nlp.count_words(filenames=self.filenames, num_workers=num_workers, chunk_size=chunk_size)
+                self.assertEqual(counter, collections.Counter(self.file_words))
+
+        counter = tl.nlp.count_words(filenames=self.filenames[0], replace=['\n', ' '], num_workers=1, chunk_size=5)
+        self.assertEqual(counter, collections.Counter(tl.nlp.read_words(self.filenames[0], replace=['\n', ' '])))
+
+    def test_encode_words(self):
+        expected = tl.nlp.words_to_word_ids(self.words, self.word_to_id)
+        for num_workers in [1, 2]:
+            ids = tl.nlp.encode_words(self.words, self.word_to_id, num_workers=num_workers, chunk_size=7)
+            self.assertEqual(ids.dtype, np.int32)
+            np.testing.assert_array_equal(ids, expected)
+
+        expected = tl.nlp.words_to_word_ids(self.file_words, self.word_to_id)
+        for num_workers in [1, 2]:
+            ids = tl.nlp.encode_words(
+                filenames=self.filenames, word_to_id=self.word_to_id, num_workers=num_workers, chunk_size=5
+            )
+            np.testing.assert_array_equal(ids, expected)
+
+    def test_encode_words_unknown(self):
+        with self.assertRaises(KeyError):
+            tl.nlp.encode_words(self.words, self.word_to_id, unk_key=None)
+
+        word_to_id = dict((word, idx) for idx, word in enumerate(set(self.words)))
+        ids = tl.nlp.encode_words(self.words, word_to_id, unk_key=None, num_workers=2, chunk_size=7)
+        np.testing.assert_array_equal(ids, [word_to_id[word] for word in self.words])
+
+        self.assertEqual(tl.nlp.encode_words([], self.word_to_id).shape, (0, ))
+
+    def test_build_words_dataset(self):
+        data, count, dictionary, reverse_dictionary = tl.nlp.build_words_dataset(self.words, 5, printable=False)
+        self.assertEqual(data, tl.nlp.words_to_word_ids(self.words, dictionary, unk_key='UNK'))
+        counter = collections.Counter(self.words)
+        self.assertEqual(count[1:], counter.most_common(4))
+        self.assertEqual(count[0], ['UNK', sum(n for _, n in counter.most_common()[4:])])
+        self.assertEqual(reverse_dictionary, dict((idx, word) for word, idx in dictionary.items()))
+
+
+class Nlp_Token_Ids_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        rng = np.random.RandomState(1)
+        # few distinct words, so that many of them have the same count
+        vocab = ['dog', 'cat', 'bird', 'fish', 'ant', 'bee', '12', '7.5', 'x1']
+        lines = []
+        for i in range(60):
+            if i % 11 == 3:
+                lines.append('')
+            else:
+                lines.append(' '.join(vocab[j] for j in rng.randint(len(vocab), size=rng.randint(1, 9))) + '.')
+        cls.n_lines = len(lines)
+
+        cls.save_dir = tempfile.mkdtemp()
+        cls.data_path = os.path.join(cls.save_dir, 'data.txt')
+        with open(cls.data_path, 'w') as f:
+            # the last line has no line break
+            f.write('\n'.join(lines))
+
+        cls.vocabulary_path = cls._path('vocab')
+        tl.nlp.create_vocabulary(cls.vocabulary_path, cls.data_path, 9)
+        cls.text_path = cls._path('ids.txt')
+        tl.nlp.data_to_token_ids(cls.data_path, cls.text_path, cls.vocabulary_path)
+        with open(cls.text_path) as f:
+            cls.sentences = [[int(i) for i in line.split()] for line in f]
+
+    @classmethod
+    def _path(cls, name):
+        return os.path.join(cls.save_dir, name)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_vocabulary(self):
+        vocabulary = self._read(self.vocabulary_path).split()
+        self.assertEqual(len(vocabulary), 9)
+        self.assertIn(b'0', vocabulary)  # the digits are normalized
+
+        for num_workers in [2, 3, 8, None]:
+            path = self._path('vocab_%s' % num_workers)
+            tl.nlp.create_vocabulary(path, self.data_path, 9, num_workers=num_workers)
+            # the same words, and the same order of the ties
+            self.assertEqual(self._read(path), self._read(self.vocabulary_path))
+
+            path = self._path('vocab_all_%s' % num_workers)
+            tl.nlp.create_vocabulary(path, self.data_path, 100, num_workers=num_workers)
+            tl.nlp.create_vocabulary(path + '_1', self.data_path, 100, num_workers=1)
+            self.assertEqual(self._read(path), self._read(path + '_1'))
+
+    def test_text(self):
+        self.assertEqual(len(self.sentences), self.n_lines)
+        self.assertEqual(self.sentences[3], [])
+        for num_workers in [2, 3, None]:
+            path = self._path('ids_%s.txt' % num_workers)
+            tl.nlp.data_to_token_ids(self.data_path, path, self.vocabulary_path, num_workers=num_workers)
+            self.assertEqual(self._read(path), self._read(self.text_path))
+
+    def test_npy(self):
+        for num_workers in [1, 2, 8]:
+            path = self._path('ids_%d.npy' % num_workers)
+            tl.nlp.data_to_token_ids(
+                self.data_path, path, self.vocabulary_path, num_workers=num_workers, file_format='npy'
+            )
+            self.assertFalse(os.path.exists(path + '.tmp'))
+            self.assertFalse(os.path.exists(path + '.npy.tmp'))
+
+            for mmap in [True, False]:
+                ids, offsets = tl.nlp.load_token_ids(path, mmap=mmap)
+                self.assertEqual(ids.dtype, np.int32)
+                self.assertEqual(offsets.dtype, np.int64)
+                self.assertEqual(isinstance(ids, np.memmap), mmap)
+                self.assertEqual(len(offsets), self.n_lines + 1)
+                self.assertEqual(offsets[-1], len(ids))
+                sentences = [ids[offsets[i]:offsets[i + 1]].tolist() for i in range(self.n_lines)]
+                self.assertEqual(sentences, self.sentences)
+
+    def test_npy_empty(self):
+        data_path = self._path('empty.txt')
+        open(data_path, 'w').close()
+        path = self._path('empty.npy')
+        tl.nlp.data_to_token_ids(data_path, path, self.vocabulary_path, num_workers=2, file_format='npy')
+        ids, offsets = tl.nlp.load_token_ids(path, mmap=False)
+        self.assertEqual(ids.shape, (0, ))
+        np.testing.assert_array_equal(offsets, [0])
+
+    def test_file_format(self):
+        with self.assertRaises(ValueError):
+            tl.nlp.data_to_token_ids(self.data_path, self._path('ids.csv'), self.vocabulary_path, file_format='csv')
+
+
+class Nlp_Compact_Vocabulary_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.words = ['the', 'cat', '', 'é', 'naïve', '日本語', 'a' * 40, 'UNK']
+        cls.vocab = tl.nlp.CompactVocabulary(cls.words, unk_word='UNK')
+
+    def test_words_to_ids(self):
+        self.assertEqual(len(self.vocab), len(self.words))
+        self.assertEqual(self.vocab.unk_id, 7)
+        ids = self.vocab.words_to_ids(self.words)
+        self.assertEqual(ids.dtype, np.int32)
+        np.testing.assert_array_equal(ids, np.arange(len(self.words)))
+        for word_id, word in enumerate(self.words):
+            self.assertEqual(self.vocab.word_to_id(word), word_id)
+            self.assertEqual(self.vocab.id_to_word(word_id), word)
+            self.assertIn(word, self.vocab)
+        self.assertEqual(self.vocab.ids_to_words(ids), self.words)
+
+    def test_unknown_words(self):
+        # prefixes, extensions and words differing in their non-ASCII bytes are unknown
+        unknown = ['th', 'thee', 'cats', 'e', 'naive', '日本', 'a' * 39, 'a' * 41, ' ']
+        for word in unknown:
+            self.assertNotIn(word, self.vocab)
+        np.testing.assert_array_equal(self.vocab.words_to_ids(unknown), [7] * len(unknown))
+        self.assertEqual(self.vocab.id_to_word(100), 'UNK')
+
+        vocab = tl.nlp.CompactVocabulary(self.words[:-1])
+        self.assertEqual(len(vocab), len(self.words) - 1)
+        self.assertEqual(vocab.unk_id, -1)
+        np.testing.assert_array_equal(vocab.words_to_ids(['cat', 'dog', '']), [1, -1, 2])
+        with self.assertRaises(IndexError):
+            vocab.id_to_word(len(vocab))
+
+        # the unknown word is not appended twice
+        self.assertEqual(len(tl.nlp.CompactVocabulary(self.words, unk_word='the')), len(self.words))
+
+    def test_2d(self):
+        words = [['the', 'dog', 'é'], ['', 'naïve', 'cat']]
+        ids = self.vocab.words_to_ids(words)
+        self.assertEqual(ids.shape, (2, 3))
+        np.testing.assert_array_equal(ids, [[0, 7, 3], [2, 4, 1]])
+        np.testing.assert_array_equal(self.vocab.words_to_ids(np.array(words)), ids)
+
+        back = self.vocab.ids_to_words(ids)
+        self.assertEqual(back.shape, (2, 3))
+        self.assertEqual(back.tolist(), [['the', 'UNK', 'é'], ['', 'naïve', 'cat']])
+
+    def test_bytes(self):
+        words = [word.encode('utf-8') for word in self.words]
+        vocab = tl.nlp.CompactVocabulary(words, unk_word=b'UNK')
+        np.testing.assert_array_equal(vocab.words_to_ids(words), np.arange(len(words)))
+        self.assertEqual(vocab.ids_to_words([4, 5]), [words[4], words[5]])
+        self.assertEqual(vocab.word_to_id(b'dog'), vocab.unk_id)
+        # the str and bytes vocabularies give the same IDs
+        np.testing.assert_array_equal(vocab.words_to_ids(self.words), np.arange(len(words)))
+
+    def test_save_load(self):
+        path = os.path.join(tempfile.mkdtemp(), 'vocab.bin')
+        self.vocab.save(path)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+        words = [['the', 'dog', 'é'], ['', 'naïve', 'cat']]
+        for mmap in [True, False]:
+            vocab = tl.nlp.CompactVocabulary.load(path, mmap=mmap)
+            self.assertEqual(len(vocab), len(self.vocab))
+            self.assertEqual(vocab.unk_id, self.vocab.unk_id)
+            self.assertEqual(isinstance(vocab._table, np.memmap), mmap)
+            np.testing.assert_array_equal(vocab.words_to_ids(words), self.vocab.words_to_ids(words))
+            self.assertEqual(vocab.ids_to_words(range(len(self.words))), self.words)
+
+        with open(path, 'wb') as f:
+            f.write(b'not a vocabulary')
+        with self.assertRaises(ValueError):
+            tl.nlp.CompactVocabulary.load(path)
+
+    def test_from_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'vocab.txt')
+        with open(path, 'w') as f:
+            f.write('the 10\ncat 5\n\nnaïve 1\n')
+        vocab = tl.nlp.CompactVocabulary.from_file(path, unk_word='<UNK>')
+        self.assertEqual(vocab.ids_to_words(range(len(vocab))), ['the', 'cat', 'naïve', '<UNK>'])
+
+    def test_probe_chains(self):
+        words = ['w%d' % i for i in range(20000)] + ['ü%d' % i for i in range(5000)]
+        vocab = tl.nlp.CompactVocabulary(words)
+
+        # the table is at most half full, many words are not in the slot of their hash
+        matrix, lengths = tl.nlp._words_to_byte_matrix(words)
+        slots = tl.nlp._fnv1a_hash(matrix, lengths) & np.uint64(len(vocab._table) - 1)
+        moved = vocab._table[slots.astype(np.int64)] != np.arange(len(words))
+        self.assertGreater(np.sum(moved), 1000)
+
+        np.testing.assert_array_equal(vocab._lookup(words, batch_size=4096), np.arange(len(words)))
+        unknown = ['x%d' % i for i in range(5000)] + ['w%d' % i for i in range(20000, 25000)]
+        np.testing.assert_array_equal(vocab.words_to_ids(unknown), -np.ones(len(unknown)))
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+def _scale(x, factor):
+    return (x * factor).astype(np.float32)
+
+
+def _ragged(x):
+    """Outputs of the same shape for the first samples only."""
+    return np.arange(max(2, int(x[0]) - 3), dtype=np.float32)
+
+
+class Prepro_Threading_Data_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = np.arange(37 * 3, dtype=np.float64).reshape(37, 3)
+
+    def test_order_and_preallocation(self):
+        for backend in ['thread', 'process']:
+            for chunk_size in [None, 1, 5, 100]:
+                results = tl.prepro.threading_data(
+                    self.data, _scale, thread_count=3, backend=backend, chunk_size=chunk_size, factor=2.
+                )
+                # a single array of the dtype of the outputs
+                self.assertIsInstance(results, np.ndarray)
+                self.assertEqual(results.dtype, np.float32)
+                np.testing.assert_array_equal(results, self.data * 2.)
+
+    def test_same_as_threads(self):
+        expected = tl.prepro.threading_data(self.data, _scale, factor=3.)
+        for backend in ['thread', 'process']:
+            results = tl.prepro.threading_data(self.data, _scale, backend=backend, factor=3.)
+            np.testing.assert_array_equal(results, expected)
+
+    def test_different_shapes(self):
+        expected = [_ragged(x) for x in self.data]
+        self.assertEqual(expected[0].shape, expected[1].shape)
+        for backend in ['thread', 'process']:
+            results = tl.prepro.threading_data(self.data, _ragged, thread_count=2, backend=backend, chunk_size=4)
+            self.assertEqual(len(results), len(expected))
+            for result, y in zip(results, expected):
+                np.testing.assert_array_equal(result, y)
+
+        # same shapes, different dtypes
+        data = [np.zeros(2, dtype=np.float32), np.zeros(2, dtype=np.int64)]
+        results = tl.prepro.threading_data(data, np.copy, backend='thread')
+        self.assertEqual(results.shape, (2, 2))
+        np.testing.assert_array_equal(results, np.zeros((2, 2)))
+
+    def test_not_arrays(self):
+        data = list(range(10))
+        for backend in ['thread', 'process']:
+            results = tl.prepro.threading_data(data, str, backend=backend)
+            self.assertEqual(list(results), [str(d) for d in data])
+
+    def test_pools_reused(self):
+        for backend in ['thread', 'process']:
+            tl.prepro.threading_data(self.data, _scale, thread_count=2, backend=backend, factor=1.)
+            pool = tl.prepro._worker_pools[(backend, 2)]
+            tl.prepro.threading_data(self.data, _scale, thread_count=2, backend=backend, factor=1.)
+            self.assertIs(tl.prepro._worker_pools[(backend, 2)], pool)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            tl.prepro.threading_data(self.data, _scale, backend='gpu', factor=1.)
+        self.assertEqual(len(tl.prepro.threading_data([], _scale, backend='thread', factor=1.)), 0)
+
+
+def _scipy_matrix(M):
+    """Convert an OpenCV matrix (x is width, input to output) to Scipy format (x is height, output to input)."""
+    swap = np.array([[0, 1, 0], [1, 0, 0], [0, 0, 1]], dtype=np.float64)
+    return swap.dot(np.linalg.inv(M)).dot(swap)
+
+
+class Prepro_Affine_Batch_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        np.random.seed(0)
+        cls.n, cls.h, cls.w = 6, 12, 17
+        cls.x = np.random.uniform(0, 1, (cls.n, cls.h, cls.w, 3)).astype(np.float32)
+        cls.M = tl.prepro.affine_batch_matrices(
+            cls.n, w=cls.w, h=cls.h, angle=(-30, 30), flip_prob=0.5, wrg=(-0.2, 0.2), hrg=(-0.2, 0.2),
+            x_shear=(-0.1, 0.1), zoom_range=(0.7, 1.3)
+        )
+
+    def test_batch_matrices(self):
+        M = tl.prepro.affine_batch_matrices(
+            2, w=self.w, h=self.h, angle=20, flip_prob=1., wrg=0.1, hrg=-0.2, x_shear=0.1, y_shear=0.05, zoom_range=0.8
+        )
+        # the same order as the single-image API
+        M_rotate = tl.prepro.affine_rotation_matrix(angle=20)
+        M_flip = tl.prepro.affine_horizontal_flip_matrix(prob=1.)
+        M_shift = tl.prepro.affine_shift_matrix(wrg=0.1, hrg=-0.2, w=self.w, h=self.h)
+        M_shear = tl.prepro.affine_shear_matrix(x_shear=0.1, y_shear=0.05)
+        M_zoom = tl.prepro.affine_zoom_matrix(zoom_range=0.8)
+        M_combined = M_shift.dot(M_zoom).dot(M_shear).dot(M_flip).dot(M_rotate)
+        expected = tl.prepro.transform_matrix_offset_center(M_combined, x=self.w, y=self.h)
+        for m in M:
+            np.testing.assert_allclose(m, expected, atol=1e-10)
+
+        # one random matrix per image, the arguments which are None are skipped
+        M = tl.prepro.affine_batch_matrices(500, w=self.w, h=self.h, angle=(-20, 20))
+        angles = np.degrees(np.arctan2(M[:, 0, 1], M[:, 0, 0]))
+        self.assertTrue(np.all(np.abs(angles) <= 20))
+        self.assertGreater(np.std(angles), 5)
+        np.testing.assert_allclose(
+            tl.prepro.affine_batch_matrices(3, w=self.w, h=self.h), np.tile(np.eye(3), (3, 1, 1))
+        )
+
+    def test_same_as_scipy(self):
+        for order in [0, 1]:
+            expected = [
+                tl.prepro.affine_transform(img, _scipy_matrix(m), fill_mode='nearest', order=order)
+                for img, m in zip(self.x, self.M)
+            ]
+            result = tl.prepro.affine_transform_batch(self.x, self.M, order=order, border_mode='replicate')
+            np.testing.assert_allclose(result, expected, atol=1e-4)
+
+            # with strict bounds, the points outside of the images are filled as scipy does
+            expected = [
+                tl.prepro.affine_transform(img, _scipy_matrix(m), fill_mode='constant', cval=0.5, order=order)
+                for img, m in zip(self.x, self.M)
+            ]
+            result = tl.prepro._affine_transform_batch(self.x, self.M, order, 'constant', cval=0.5, strict_bounds=True)
+            np.testing.assert_allclose(result, expected, atol=1e-4)
+            self.assertTrue(np.any(result == 0.5))
+
+    def test_same_as_cv2(self):
+        import cv2
+        for order, flags in [(0, cv2.INTER_NEAREST), (1, cv2.INTER_LINEAR)]:
+            for border_mode in ['constant', 'replicate']:
+                result = tl.prepro.affine_transform_batch(self.x, self.M, order=order, border_mode=border_mode)
+                expected = np.stack(
+                    [
+                        tl.prepro.affine_transform_cv2(img, m, flags=flags, border_mode=border_mode)
+                        for img, m in zip(self.x, self.M)
+                    ]
+                )
+                self.assertEqual(result.shape, expected.shape)
+                # OpenCV computes the coordinates and the bi-linear weights in fixed point
+                close = np.isclose(result, expected, atol=0.02)
+                self.assertGreater(np.mean(close), 0.99)
+
+    def test_chunks_and_dtypes(self):
+        expected = tl.prepro.affine_transform_batch(self.x, self.M)
+        np.testing.assert_array_equal(tl.prepro.affine_transform_batch(self.x, self.M, chunk_size=4), expected)
+
+        # grey images
+        grey = tl.prepro.affine_transform_batch(self.x[..., 1], self.M)
+        np.testing.assert_allclose(grey, expected[..., 1], atol=1e-6)
+
+        # integer images are rounded and keep their dtype
+        x = np.round(self.x * 255).astype(np.uint8)
+        result = tl.prepro.affine_transform_batch(x, self.M, border_mode='replicate')
+        self.assertEqual(result.dtype, np.uint8)
+        expected = tl.prepro.affine_transform_batch(x.astype(np.float32), self.M, border_mode='replicate')
+        np.testing.assert_array_equal(result, np.round(expected))
+
+        # a matrix shared by all images
+        result = tl.prepro.affine_transform_batch(self.x, self.M[0])
+        np.testing.assert_allclose(result, tl.prepro.affine_transform_batch(self.x, np.stack([self.M[0]] * self.n)))
+
+        with self.assertRaises(ValueError):
+            tl.prepro.affine_transform_batch(self.x, self.M, order=3)
+        with self.assertRaises(ValueError):
+            tl.prepro.affine_transform_batch(self.x, self.M, border_mode='reflect')
+
+    def test_keypoints(self):
+        coords = np.random.uniform(0, self.w, (self.n, 5, 2))
+        coords[1, 3:] = np.nan
+        result = tl.prepro.affine_transform_keypoints_batch(coords, self.M)
+        self.assertEqual(result.shape, coords.shape)
+        for points, transformed, m in zip(coords, result, self.M):
+            np.testing.assert_allclose(transformed, tl.prepro.affine_transform_keypoints([points], m)[0])
+        self.assertTrue(np.all(np.isnan(result[1, 3:])))
+
+    def test_boxes(self):
+        corners = np.sort(np.random.uniform(0, self.w, (self.n, 3, 2, 2)), axis=2)
+        boxes = corners.reshape(self.n, 3, 4)
+        boxes[2, 2] = np.nan
+        result = tl.prepro.affine_transform_boxes_batch(boxes, self.M)
+        self.assertEqual(result.shape, boxes.shape)
+        for i in range(self.n):
+            for j in range(3):
+                x_min, y_min, x_max, y_max = boxes[i, j]
+                points = [(x_min, y_min), (x_max, y_min), (x_min, y_max), (x_max, y_max)]
+                points = tl.prepro.affine_transform_keypoints([points], self.M[i])[0]
+                expected = np.concatenate([points.min(axis=0), points.max(axis=0)])
+                np.testing.assert_allclose(result[i, j], expected, equal_nan=True)
+        self.assertTrue(np.all(np.isnan(result[2, 2])))
+
+
+class Prepro_Compose_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        np.random.seed(1)
+        cls.x = np.random.uniform(0, 1, (4, 11, 14, 3)).astype(np.float32)
+        # odd square images are rotated by 90 degrees without interpolation
+        cls.square = np.random.uniform(0, 1, (3, 9, 9, 3)).astype(np.float32)
+        cls.uint8 = np.random.randint(0, 256, (3, 10, 12, 3)).astype(np.uint8)
+
+    def _per_image(self, x, fn, **kwargs):
+        return np.stack([fn(img, **kwargs) for img in x])
+
+    def test_single_steps(self):
+        steps = [
+            (tl.prepro.rotation, {
+                'rg': 25
+            }),
+            (tl.prepro.shift, {
+                'wrg': 0.13,
+                'hrg': -0.21
+            }),
+            (tl.prepro.shear, {
+                'intensity': 0.2
+            }),
+            (tl.prepro.shear2, {
+                'shear': (0.1, -0.15)
+            }),
+            (tl.prepro.zoom, {
+                'zoom_range': 0.8
+            }),
+            (tl.prepro.respective_zoom, {
+                'h_range': 1.2,
+                'w_range': 0.9
+            }),
+        ]
+        # the batched warp for order 0 and 1, scipy for the others
+        for fill_mode, order in [('nearest', 1), ('constant', 1), ('constant', 0), ('nearest', 3), ('reflect', 1)]:
+            for fn, kwargs in steps:
+                result = tl.prepro.Compose([(fn, kwargs)], fill_mode=fill_mode, cval=0.3, order=order)(self.x)
+                expected = self._per_image(self.x, fn, fill_mode=fill_mode, cval=0.3, order=order, **kwargs)
+                np.testing.assert_allclose(result, expected, atol=1e-4, err_msg='%s %s' % (fn.__name__, fill_mode))
+
+    def test_composition_order(self):
+        steps = [(tl.prepro.rotation, {'rg': 90}), (tl.prepro.flip_axis, {'axis': 0})]
+        result = tl.prepro.Compose(steps, order=0)(self.square)
+        expected = self._per_image(self._per_image(self.square, tl.prepro.rotation, rg=90, order=0), np.flipud)
+        np.testing.assert_array_equal(result, expected)
+
+        reversed_result = tl.prepro.Compose(steps[::-1], order=0)(self.square)
+        expected = self._per_image(np.flip(self.square, axis=1), tl.prepro.rotation, rg=90, order=0)
+        np.testing.assert_array_equal(reversed_result, expected)
+        self.assertFalse(np.allclose(result, reversed_result))
+
+        # the matrices are the ones of the functions applied one after the other
+        compose = tl.prepro.Compose([(tl.prepro.rotation, {'rg': 30}), (tl.prepro.zoom, {'zoom_range': 0.7})])
+        theta = np.pi / 180 * 30
+        rotation_matrix = np.array([[np.cos(theta), -np.sin(theta), 0], [np.sin(theta), np.cos(theta), 0], [0, 0, 1]])
+        expected = tl.prepro.transform_matrix_offset_center(rotation_matrix, 11, 14).dot(
+            tl.prepro.transform_matrix_offset_center(tl.prepro.affine_zoom_matrix(0.7), 11, 14)
+        )
+        for m in compose.transform_matrices(2, 11, 14):
+            np.testing.assert_allclose(m, expected)
+
+    def test_random_steps(self):
+        compose = tl.prepro.Compose(
+            [
+                (tl.prepro.rotation, {
+                    'rg': 20,
+                    'is_random': True
+                }), (tl.prepro.flip_axis, {
+                    'axis': 1,
+                    'is_random': True
+                })
+            ]
+        )
+        matrices = compose.transform_matrices(200, 11, 14)
+        # a rotation between -20 and 20 degrees and a flip of about half of the images
+        det = np.linalg.det(matrices[:, :2, :2])
+        np.testing.assert_allclose(np.abs(det), 1)
+        self.assertTrue(0.3 < np.mean(det < 0) < 0.7)
+        angles = np.degrees(np.arccos(np.clip(np.abs(matrices[:, 0, 0]), -1, 1)))
+        self.assertTrue(np.all(angles <= 20 + 1e-6))
+        self.assertGreater(np.std(angles), 3)
+
+    def test_grey(self):
+        steps = [(tl.prepro.rotation, {'rg': 15}), (tl.prepro.brightness, {'gamma': 0.5})]
+        grey = tl.prepro.Compose(steps)(self.x[..., 0])
+        self.assertEqual(grey.shape, self.x.shape[:3])
+        np.testing.assert_allclose(grey, tl.prepro.Compose(steps)(self.x[..., :1])[..., 0], atol=1e-6)
+
+        expected = self._per_image(self.uint8[..., 0], tl.prepro.brightness, gamma=0.5)
+        result = tl.prepro.Compose([(tl.prepro.brightness, {'gamma': 0.5})])(self.uint8[..., 0])
+        self.assertEqual(result.dtype, np.uint8)
+        self.assertLessEqual(np.max(np.abs(result.astype(int) - expected)), 1)
+
+    def test_pixel_steps(self):
+        for x in [self.uint8, self.x]:
+            result = tl.prepro.Compose([(tl.prepro.brightness, {'gamma': 0.6, 'gain': 0.9})])(x)
+            self.assertEqual(result.dtype, x.dtype)
+            expected = self._per_image(x, tl.prepro.brightness, gamma=0.6, gain=0.9)
+            np.testing.assert_allclose(result, expected, atol=1, rtol=1e-5)
+
+        result = tl.prepro.Compose([(tl.prepro.channel_shift, {'intensity': 0.1})])(self.x)
+        np.testing.assert_allclose(result, self._per_image(self.x, tl.prepro.channel_shift, intensity=0.1), atol=1e-6)
+
+        # PIL blends the rounded uint8 images
+        result = tl.prepro.Compose([(tl.prepro.illumination, {'gamma': 0.5, 'contrast': 0.6, 'saturation': 0.8})])
+        result = result(self.uint8)
+        expected = self._per_image(self.uint8, tl.prepro.illumination, gamma=0.5, contrast=0.6, saturation=0.8)
+        self.assertLessEqual(np.max(np.abs(result.astype(int) - expected)), 3)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            tl.prepro.Compose([tl.prepro.crop])
+        with self.assertRaises(ValueError):
+            tl.prepro.Compose([(tl.prepro.flip_axis, {'axis': 2})])(self.x)
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import os
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+def _discount_loop(rewards, gamma, mode, dones):
+    discounted = np.zeros(len(rewards))
+    running_add = 0.
+    for t in reversed(range(len(rewards))):
+        if (mode == 0 and rewards[t] != 0) or dones[t]:
+            running_add = 0.
+        running_add = running_add * gamma + rewards[t]
+        discounted[t] = running_add
+    return discounted
+
+
+def _gae_loop(rewards, values, last_value, dones, gamma, lam):
+    advantages = np.zeros(len(rewards))
+    advantage = 0.
+    for t in reversed(range(len(rewards))):
+        next_value = last_value if t == len(rewards) - 1 else values[t + 1]
+        not_done = 1. - dones[t]
+        delta = rewards[t] + gamma * not_done * next_value - values[t]
+        advantage = delta + gamma * lam * not_done * advantage
+        advantages[t] = advantage
+    return advantages
+
+
+class _CountEnv(object):
+    """A toy environment whose observation is the sum of the actions, the episode ends when it reaches the limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.total = 0
+
+    def reset(self):
+        self.total = 0
+        return np.array([self.total, self.limit], dtype=np.int32)
+
+    def step(self, action):
+        if action < 0:
+            raise ValueError("negative action")
+        self.total += action
+        done = self.total >= self.limit
+        return np.array([self.total, self.limit], dtype=np.int32), float(action), done, {'total': self.total}
+
+    def close(self):
+        pass
+
+
+def _broken_env():
+    raise ValueError("cannot create the environment")
+
+
+class Rein_Discount_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.n_envs = 3
+        cls.T = 37
+        cls.rewards = np.random.choice([0., 0., 0., 1., -1., 0.5], size=(cls.n_envs, cls.T))
+        cls.values = np.random.random((cls.n_envs, cls.T))
+        cls.last_values = np.random.random(cls.n_envs)
+        cls.dones = np.random.random((cls.n_envs, cls.T)) < 0.1
+        cls.no_dones = np.zeros((cls.n_envs, cls.T), dtype=bool)
+
+    def test_discount_example(self):
+        rewards = np.asarray([0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1])
+        np.testing.assert_allclose(
+            tl.rein.discount_episode_rewards(rewards, 0.9), [0.729, 0.81, 0.9, 1.] * 3, rtol=1e-6
+        )
+
+    def test_discount_modes(self):
+        for mode in [0, 1]:
+            for env in range(self.n_envs):
+                result = tl.rein.discount_episode_rewards(self.rewards[env], gamma=0.9, mode=mode)
+                self.assertEqual(result.dtype, np.float32)
+                expected = _discount_loop(self.rewards[env], 0.9, mode, self.no_dones[env])
+                np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6)
+
+    def test_discount_batched_dones(self):
+        for mode in [0, 1]:
+            result = tl.rein.discount_episode_rewards(self.rewards, gamma=0.95, mode=mode, dones=self.dones)
+            self.assertEqual(result.shape, (self.n_envs, self.T))
+            for env in range(self.n_envs):
+                expected = _discount_loop(self.rewards[env], 0.95, mode, self.dones[env])
+                np.testing.assert_allclose(result[env], expected, rtol=1e-5, atol=1e-6)
+
+    def test_gae(self):
+        for lam in [0., 0.95, 1.]:
+            advantages, returns = tl.rein.generalized_advantage_estimation(
+                self.rewards, self.values, last_values=self.last_values, dones=self.dones, gamma=0.99, lam=lam
+            )
+            self.assertEqual(advantages.shape, (self.n_envs, self.T))
+            for env in range(self.n_envs):
+                expected = _gae_loop(
+                    self.rewards[env], self.values[env], self.last_values[env], self.dones[env], 0.99, lam
+                )
+                np.testing.assert_allclose(advantages[env], expected, rtol=1e-5, atol=1e-5)
+                np.testing.assert_allclose(returns[env], expected + self.values[env], rtol=1e-5, atol=1e-5)
+
+    def test_gae_single_env(self):
+        advantages, _ = tl.rein.generalized_advantage_estimation(self.rewards[0], self.values[0], gamma=0.9, lam=0.8)
+        expected = _gae_loop(self.rewards[0], self.values[0], 0., self.no_dones[0], 0.9, 0.8)
+        np.testing.assert_allclose(advantages, expected, rtol=1e-5, atol=1e-5)
+
+
+class Rein_Replay_Buffer_Test(CustomTestCase):
+
+    def _fill(self, buffer, episode_lengths, frame_stack):
+        """Add episodes of frames numbered in order, the actions are the transition numbers."""
+        stacks = []
+        frame = 0
+        for length in episode_lengths:
+            stack = [frame] * frame_stack
+            for step in range(length):
+                frame += 1
+                next_stack = stack[1:] + [frame]
+                obs = np.full((2, frame_stack), stack, dtype=np.uint8)
+                next_obs = np.full((2, frame_stack), next_stack, dtype=np.uint8)
+                buffer.add(obs, len(stacks), 1., next_obs, step == length - 1)
+                stacks.append((stack, next_stack))
+                stack = next_stack
+            frame += 1
+        return np.array(stacks)
+
+    def test_frame_stack(self):
+        buffer = tl.rein.ReplayBuffer(100, obs_shape=(2, ), obs_dtype=np.uint8, frame_stack=4)
+        stacks = self._fill(buffer, [1, 2, 6, 3, 5], frame_stack=4)
+        self.assertEqual(len(buffer), len(stacks))
+
+        obs, actions, _, next_obs, dones = buffer.sample(200)
+        self.assertEqual(obs.shape, (200, 2, 4))
+        np.testing.assert_array_equal(obs[:, 0], stacks[actions, 0])
+        np.testing.assert_array_equal(obs[:, 1], stacks[actions, 0])
+        np.testing.assert_array_equal(next_obs[:, 0], stacks[actions, 1])
+        np.testing.assert_array_equal(dones, np.isin(actions, [0, 2, 8, 11, 16]))
+        # the transitions after a done start a new episode, their stacks repeat the first frame
+        firsts = np.isin(actions, [1, 3, 9, 12])
+        self.assertTrue(np.any(firsts))
+        self.assertTrue(np.all(obs[firsts] == obs[firsts][..., :1]))
+
+    def test_wrap_around(self):
+        capacity = 7
+        buffer = tl.rein.ReplayBuffer(capacity, obs_shape=(2, ), obs_dtype=np.uint8, frame_stack=3)
+        stacks = self._fill(buffer, [4, 12, 3], frame_stack=3)
+        self.assertEqual(len(buffer), capacity)
+
+        obs, actions, _, next_obs, _ = buffer.sample(200)
+        self.assertTrue(np.all(actions >= len(stacks) - capacity))
+        # the frames older than the oldest stored transition are replaced by its frame
+        oldest_frame = stacks[len(stacks) - capacity, 0, -1]
+        np.testing.assert_array_equal(obs[:, 0], np.maximum(stacks[actions, 0], oldest_frame))
+        np.testing.assert_array_equal(next_obs[:, 0], np.maximum(stacks[actions, 1], oldest_frame))
+
+    def test_prioritized_frequencies(self):
+        buffer = tl.rein.PrioritizedReplayBuffer(5, obs_shape=(3, ), alpha=0.5)
+        for idx in range(5):
+            buffer.add(np.zeros(3), idx, 0., np.zeros(3), False)
+        buffer.update_priorities(np.arange(5), np.arange(1, 6)**2)
+
+        counts = np.zeros(5)
+        for _ in range(200):
+            _, actions, _, _, _, _, indices = buffer.sample(50)
+            np.testing.assert_array_equal(actions, indices)
+            counts += np.bincount(indices, minlength=5)
+        np.testing.assert_allclose(counts / counts.sum(), np.arange(1, 6) / 15., atol=0.01)
+
+    def test_prioritized_weights(self):
+        priorities = np.array([0.5, 1., 2., 4.])
+        buffer = tl.rein.PrioritizedReplayBuffer(4, obs_shape=(3, ), alpha=1.)
+        for idx in range(4):
+            buffer.add(np.zeros(3), idx, 0., np.zeros(3), False)
+        buffer.update_priorities(np.arange(4), priorities)
+
+        probs = priorities / priorities.sum()
+        for beta in [0., 0.4, 1.]:
+            _, _, _, _, _, weights, indices = buffer.sample(64, beta=beta)
+            expected = (4 * probs[indices])**(-beta) / (4 * probs.min())**(-beta)
+            np.testing.assert_allclose(weights, expected, rtol=1e-5)
+
+        # a new transition gets the maximum priority
+        buffer.add(np.zeros(3), 0, 0., np.zeros(3), False)
+        self.assertAlmostEqual(buffer._sum_tree[1], priorities[1:].sum() + priorities.max())
+
+
+class Rein_Choice_Actions_Test(CustomTestCase):
+
+    def test_frequencies(self):
+        probs = np.array([[0.1, 0.2, 0.7], [0.5, 0.5, 0.], [0., 0., 1.]])
+        counts = np.zeros((3, 3))
+        for _ in range(5000):
+            actions = tl.rein.choice_actions_by_probs(probs)
+            self.assertEqual(actions.shape, (3, ))
+            counts[np.arange(3), actions] += 1
+        np.testing.assert_allclose(counts / 5000., probs, atol=0.03)
+        self.assertEqual(counts[1, 2], 0)
+
+    def test_action_list(self):
+        actions = tl.rein.choice_actions_by_probs([[0., 1.], [1., 0.]], action_list=['left', 'right'])
+        self.assertEqual(list(actions), ['right', 'left'])
+        with self.assertRaises(Exception):
+            tl.rein.choice_actions_by_probs([[0.5, 0.5]], action_list=[0, 1, 2])
+
+
+class Rein_Vector_Env_Test(CustomTestCase):
+
+    def _check(self, asynchronous):
+        limits = [3, 5]
+        envs = tl.rein.VectorEnv([functools.partial(_CountEnv, limit) for limit in limits], asynchronous=asynchronous)
+        try:
+            obs = envs.reset()
+            self.assertEqual(obs.dtype, np.int32)
+            np.testing.assert_array_equal(obs, [[0, 3], [0, 5]])
+
+            obs, rewards, dones, infos = envs.step([2, 2])
+            np.testing.assert_array_equal(obs, [[2, 3], [2, 5]])
+            np.testing.assert_array_equal(rewards, [2, 2])
+            self.assertEqual(rewards.dtype, np.float32)
+            np.testing.assert_array_equal(dones, [False, False])
+            self.assertEqual(infos, [{'total': 2}, {'total': 2}])
+
+            # the first environment is done and reset
+            obs, rewards, dones, infos = envs.step([1, 1])
+            np.testing.assert_array_equal(obs, [[0, 3], [3, 5]])
+            np.testing.assert_array_equal(dones, [True, False])
+            self.assertEqual(infos[0], {'total': 3})
+
+            with self.assertRaises((RuntimeError, ValueError)):
+                envs.step([1, -1])
+        finally:
+            envs.close()
+
+    def test_sync(self):
+        self._check(asynchronous=False)
+
+    def test_async(self):
+        self._check(asynchronous=True)
+
+    def test_async_creation_error(self):
+        envs = tl.rein.VectorEnv([_broken_env] * 2, asynchronous=True, obs_shape=(2, ), obs_dtype=np.int32)
+        try:
+            with self.assertRaises(RuntimeError) as context:
+                envs.reset()
+            self.assertIn("cannot create the environment", str(context.exception))
+        finally:
+            envs.close()
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
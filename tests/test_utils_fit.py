@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+import tensorflow as tf
+import tensorlayer as tl
+
+from tests.utils import CustomTestCase
+
+
+class _Network(object):
+    """The attributes of a network used by fit."""
+
+    def __init__(self, outputs, all_params, all_drop):
+        self.outputs = outputs
+        self.all_params = all_params
+        self.all_drop = all_drop
+
+
+def _dense(x, n_in, n_out, name):
+    W = tf.Variable(np.random.RandomState(n_out).normal(0, 0.1, (n_in, n_out)).astype(np.float32), name=name + '/W')
+    b = tf.Variable(tf.zeros([n_out]), name=name + '/b')
+    return tf.matmul(x, W) + b, [W, b]
+
+
+class Util_Fit_Test(CustomTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.x = tf.placeholder(tf.float32, shape=[None, 10], name='x')
+        cls.y_ = tf.placeholder(tf.int64, shape=[None], name='y_')
+        keep = tf.placeholder(tf.float32, name='keep')
+
+        # keep=1 so that both modes do the same steps, the noise layers are still fed
+        net = tf.nn.dropout(cls.x, keep_prob=keep)
+        net, params1 = _dense(net, 10, 16, 'relu')
+        net, params2 = _dense(tf.nn.relu(net), 16, 3, 'output')
+        cls.network = _Network(net, params1 + params2, {keep: 1.0})
+
+        y = cls.network.outputs
+        cls.cost = tl.cost.cross_entropy(y, cls.y_, name='cost')
+        cls.acc = tf.reduce_mean(tf.cast(tf.equal(tf.argmax(y, 1), cls.y_), tf.float32))
+        cls.train_op = tf.train.GradientDescentOptimizer(0.5).minimize(cls.cost, var_list=cls.network.all_params)
+
+        rng = np.random.RandomState(0)
+        X = rng.randn(192, 10).astype(np.float32)
+        y = (X[:, 0] > 0).astype(np.int64) + (X[:, 1] > 0)
+        cls.X_train, cls.y_train = X[:64], y[:64]
+        # a fixed evaluation set of several batches
+        cls.X_val, cls.y_val = X[64:], y[64:]
+
+        cls.sess = tf.Session()
+        tl.layers.initialize_global_variables(cls.sess)
+        cls.init_params = cls.sess.run(cls.network.all_params)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sess.close()
+        tf.reset_default_graph()
+
+    def _fit(self, fast_mode, n_epoch=3):
+        """Train from the same initial parameters and return the printed validation losses and accuracies."""
+        tl.files.assign_params(self.sess, self.init_params, self.network)
+        with self.assertLogs('tensorlayer', level='INFO') as logs:
+            # a single training batch, so that the shuffling does not change the steps
+            tl.utils.fit(
+                self.sess, self.network, self.train_op, self.cost, self.X_train, self.y_train, self.x, self.y_,
+                acc=self.acc, batch_size=64, n_epoch=n_epoch, print_freq=1, X_val=self.X_val, y_val=self.y_val,
+                eval_train=False, fast_mode=fast_mode
+            )
+        return [float(line.split(':')[-1]) for line in logs.output if 'val loss' in line or 'val acc' in line]
+
+    def test_fast_mode_same_metrics(self):
+        metrics = self._fit(fast_mode=False)
+        fast_metrics = self._fit(fast_mode=True)
+        self.assertEqual(len(metrics), 6)
+        np.testing.assert_allclose(fast_metrics, metrics, atol=1e-5)
+        # the network is trained
+        self.assertLess(metrics[-2], metrics[0])
+
+    def test_fast_mode_does_not_grow_graph(self):
+        self._fit(fast_mode=True, n_epoch=1)
+        n_ops = len(self.sess.graph.get_operations())
+        self._fit(fast_mode=True, n_epoch=1)
+        self.assertEqual(len(self.sess.graph.get_operations()), n_ops)
+
+
+if __name__ == '__main__':
+
+    tf.logging.set_verbosity(tf.logging.DEBUG)
+    tl.logging.set_verbosity(tl.logging.DEBUG)
+
+    unittest.main()
@@ -14,6 +14,13 @@ import tensorlayer as tl
 from tests.utils import CustomTestCase
 
 
+class _Network(object):
+    """The attribute of a network used by predict."""
+
+    def __init__(self, all_drop):
+        self.all_drop = all_drop
+
+
 class Util_Predict_Test(CustomTestCase):
 
     @classmethod
@@ -46,6 +53,26 @@ class Util_Predict_Test(CustomTestCase):
                 tl.utils.predict(sess, n, self.X2, self.x2, y_op, batch_size=self.batch_size)
                 sess.close()
 
+    def test_case3(self):
+        # a fixed batch size, the last batch of 5 inputs is padded to 8
+        X = np.random.random([21, 5, 5, 3]).astype(np.float32)
+        keep = tf.placeholder(tf.float32)
+        y_op = tf.nn.softmax(tf.nn.dropout(self.x2, keep_prob=keep))
+        n = _Network({keep: 0.5})
+
+        expected = np.exp(X) / np.exp(X).sum(axis=-1, keepdims=True)
+        with tf.Session() as sess:
+            for prefetch in [False, True]:
+                result = tl.utils.predict(
+                    sess, n, X, self.x2, y_op, batch_size=self.batch_size, prefetch=prefetch, pad_last_batch=True
+                )
+                self.assertEqual(result.shape, X.shape)
+                np.testing.assert_allclose(result, expected, rtol=1e-5)
+
+            # without padding the last batch does not fit the placeholder
+            with self.assertRaises(ValueError):
+                tl.utils.predict(sess, n, X, self.x2, y_op, batch_size=self.batch_size, prefetch=True)
+
 
 if __name__ == '__main__':
 